@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; in version 2 of the license
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+"""
+Throughput benchmark for ``Duofern.parse`` and ``DuofernStick.process_message``.
+
+Feeds the frames received in the recordings in ``tests/replaydata`` and synthetic frames of every supported message
+type through the parser and reports frames per second, latency percentiles and memory allocated per frame for every
+message type. Results can be saved as json and compared against an earlier run::
+
+    python benchmarks/bench_parser.py --output benchmark.json
+    python benchmarks/bench_parser.py --compare benchmark.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyduofern.duofern import Duofern  # noqa: E402
+from pyduofern.duofern_stick import DuofernStick  # noqa: E402
+
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "replaydata")
+
+# message type -> (frame prefix, device codes), the rest of the payload is random
+SYNTHETIC = {
+    "status21": ("0fff0f21", ("409b21", "41aa01", "61aa02")),
+    "status22": ("0fff0f22", ("430011", "460012", "710013")),
+    "status23": ("0fff0f23", ("420021", "4b0022", "470023")),
+    "status24": ("0fff0f24", ("490031", "4e0032")),
+    "status25": ("0fff0f25", ("480041",)),
+    "status27": ("0fff0f27", ("730051",)),
+    "sensor": (("0f..0701", "0f..0703", "0f..0713", "0f..071e", "0f..0e03"), ("a50061", "690062", "ab0063")),
+    "weather": ("0f011322", ("690071",)),
+    "time": ("0fff1020", ("690072",)),
+    "battery": ("0fff1323", ("ab0081",)),
+}
+
+
+def replay_frames(directory=REPLAY_DIR):
+    """
+    :return: all frames received in the recordings in ``directory``
+    """
+    frames = []
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename)) as recording:
+            for line in recording:
+                if line.startswith("received "):
+                    frames.append(bytes.fromhex(line.split()[1]))
+    return frames
+
+
+def synthetic_frames(count, seed=0):
+    """
+    :return: dict message type -> list of ``count`` frames with random payload
+    """
+    rng = random.Random(seed)
+    frames = {}
+    for kind, (prefixes, codes) in SYNTHETIC.items():
+        if isinstance(prefixes, str):
+            prefixes = (prefixes,)
+        frames[kind] = []
+        for i in range(count):
+            prefix = prefixes[i % len(prefixes)]
+            frame = bytearray(rng.getrandbits(8) for _ in range(22))
+            for position in range(len(prefix) // 2):
+                pair = prefix[2 * position:2 * position + 2]
+                if pair != "..":
+                    frame[position] = int(pair, 16)
+            frame[15:18] = bytes.fromhex(codes[i % len(codes)])
+            frame[18:21] = b'\xff\xff\xff'
+            frames[kind].append(bytes(frame))
+    return frames
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(handler, frames, repeat):
+    """
+    Feed ``frames`` through ``handler`` ``repeat`` times.
+
+    :return: dict of results for this message type
+    """
+    for frame in frames:  # warm up, adds the devices
+        handler(frame)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            begin = time.perf_counter_ns()
+            handler(frame)
+            latencies.append(time.perf_counter_ns() - begin)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    # allocations are measured in a separate pass, tracing slows everything down considerably
+    tracemalloc.start()
+    peak = 0
+    for frame in frames:
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        handler(frame)
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        "frames": len(latencies),
+        "frames_per_second": len(latencies) / elapsed,
+        "latency_ns": {
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1],
+        },
+        "allocated_bytes_per_frame": peak / len(frames),
+    }
+
+
+def parser_handler(**options):
+    parser = Duofern(send_hook=lambda message: None, changes_callback=lambda *args: None, **options)
+    return parser.parse
+
+
+class BenchmarkStick(DuofernStick):
+    """
+    Stick without serial connection, only its receive path is benchmarked.
+    """
+
+    def add_serial_and_send(self, message):
+        pass
+
+
+def stick_handler(directory, **options):
+    stick = BenchmarkStick(system_code="ffff", config_file_json=os.path.join(directory, "duofern.json"),
+                         ephemeral=True, changes_callback=lambda *args: None, **options)
+    return stick.process_message
+
+
+def run_benchmark(frame_count=200, repeat=20, seed=0, options=None):
+    """
+    :param frame_count: number of synthetic frames per message type
+    :param repeat: how often every frame is parsed
+    :param options: keyword arguments for the parser, e.g. ``{'lazy_status': True}``
+    :return: dict of results, keyed by target and message type
+    """
+    options = options or {}
+    workload = {"replay": replay_frames()}
+    workload.update(synthetic_frames(frame_count, seed))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for target in ("parse", "process_message"):
+            for kind, frames in workload.items():
+                if not frames:
+                    continue
+                if target == "parse":
+                    handler = parser_handler(**options)
+                else:
+                    handler = stick_handler(directory, **options)
+                results["{}/{}".format(target, kind)] = measure(handler, frames, repeat)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    :return: list of descriptions of the message types whose throughput dropped by more than ``max_regression``
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["frames_per_second"]
+        after = result["frames_per_second"]
+        if after < before * (1 - max_regression):
+            regressions.append("{}: {:.0f} -> {:.0f} frames/s ({:+.0%})".format(name, before, after,
+                                                                                  after / before - 1))
+    return regressions
+
+
+def print_results(results):
+    print("{:<28} {:>12} {:>9} {:>9} {:>9} {:>12}".format("target/type", "frames/s", "p50 us", "p90 us", "p99 us",
+                                                          "bytes/frame"))
+    for name, result in results.items():
+        latency = result["latency_ns"]
+        print("{:<28} {:>12.0f} {:>9.1f} {:>9.1f} {:>9.1f} {:>12.0f}".format(
+            name, result["frames_per_second"], latency["p50"] / 1000, latency["p90"] / 1000, latency["p99"] / 1000,
+            result["allocated_bytes_per_frame"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--frames', type=int, default=200, help='synthetic frames per message type')
+    parser.add_argument('--repeat', type=int, default=20, help='how often every frame is parsed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lazy', action='store_true', help='benchmark the parser with lazy_status')
+    parser.add_argument('--batch', action='store_true', help='benchmark the parser with batch_changes')
+    parser.add_argument('--output', metavar='JSON', help='save the results to this file')
+    parser.add_argument('--compare', metavar='JSON', help='compare against the results saved in this file')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='fail if throughput drops by more than this fraction compared to --compare')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    options = {'lazy_status': args.lazy, 'batch_changes': args.batch}
+    results = run_benchmark(args.frames, args.repeat, args.seed, options)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"python": platform.python_version(), "options": options, "results": results}, output,
+                      indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        for regression in regressions:
+            print("regression {}".format(regression))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,10 +23,10 @@
 #   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 __version__ = "0.36.2"
 
-__all__ = ['DuofernException', 'DuofernStick', 'DuofernStickAsync', 'duoACK']
+__all__ = ['CommandResult', 'DuofernException', 'DuofernStick', 'DuofernStickAsync', 'duoACK']
 
 try:
-    from .duofern_stick import DuofernStick, DuofernStickAsync, duoACK
+    from .duofern_stick import CommandResult, DuofernStick, DuofernStickAsync, duoACK
     from .exceptions import DuofernException
 except ImportError:
     # do not raise when called from setup.py
@@ -0,0 +1,144 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import asyncio
+import logging
+from collections import deque
+
+from .exceptions import DuofernTimeoutException
+
+logger = logging.getLogger(__name__)
+
+
+def frame_code(frame):
+    """
+    :return: device code of a received frame as hex, acknowledgements carry it behind the system code
+    """
+    if frame[0] == 0x81:
+        return bytes(frame[18:21]).hex()
+    return bytes(frame[15:18]).hex()
+
+
+class _Expectation(object):
+    __slots__ = ('keys', 'future', 'timer')
+
+    def __init__(self, keys, future):
+        self.keys = keys
+        self.future = future
+        self.timer = None
+
+
+class ReplyCorrelator(object):
+    """
+    Matches frames received from the stick to the requests waiting for them.
+
+    A request waits for the first frame starting with one of its ``reply`` prefixes and, if it names one, carrying
+    its device code (see :func:`frame_code`). Any number of requests may be outstanding, requests waiting for the same
+    kind of frame are answered in the order they were made. A request not answered within its timeout fails with
+    :class:`~pyduofern.exceptions.DuofernTimeoutException`.
+    """
+
+    def __init__(self):
+        # (prefix, code or None) -> expectations in the order they were made
+        self._pending = {}
+        self._prefixes = []
+
+    def __len__(self):
+        return len({expectation for waiting in self._pending.values() for expectation in waiting
+                    if not expectation.future.done()})
+
+    def expect(self, reply, code=None, timeout=None):
+        """
+        :param reply: leading bytes of the awaited frame as hex string, or an iterable of them
+        :param code: device code the frame has to carry, any if None
+        :param timeout: seconds to wait for the frame, forever if None
+        :return: future resolved with the frame as ``bytes``
+        """
+        loop = asyncio.get_event_loop()
+        if isinstance(reply, str):
+            reply = (reply,)
+        code = code.lower() if code is not None else None
+        expectation = _Expectation(tuple((bytes.fromhex(prefix), code) for prefix in reply), loop.create_future())
+        for key in expectation.keys:
+            self._pending.setdefault(key, deque()).append(expectation)
+            if key[0] not in self._prefixes:
+                self._prefixes.append(key[0])
+                # longer prefixes are more specific and get the frame first
+                self._prefixes.sort(key=len, reverse=True)
+        if timeout is not None:
+            expectation.timer = loop.call_later(timeout, self._timed_out, expectation, "/".join(reply))
+        expectation.future.add_done_callback(lambda future: self._discard(expectation))
+        return expectation.future
+
+    def _timed_out(self, expectation, reply):
+        if not expectation.future.done():
+            expectation.future.set_exception(DuofernTimeoutException("no reply {} received".format(reply)))
+
+    def _discard(self, expectation):
+        if expectation.timer is not None:
+            expectation.timer.cancel()
+        for key in expectation.keys:
+            waiting = self._pending.get(key)
+            if waiting is None:
+                continue
+            try:
+                waiting.remove(expectation)
+            except ValueError:
+                pass
+            if not waiting:
+                del self._pending[key]
+                if not any(other[0] == key[0] for other in self._pending):
+                    self._prefixes.remove(key[0])
+
+    def match(self, frame):
+        """
+        Hand ``frame`` to the oldest request waiting for it.
+
+        :return: True if a request took the frame
+        """
+        if not self._pending:
+            return False
+        code = None
+        for prefix in self._prefixes:
+            if frame[0:len(prefix)] != prefix:
+                continue
+            if code is None:
+                code = frame_code(frame)
+            for key in ((prefix, code), (prefix, None)):
+                waiting = self._pending.get(key, ())
+                while waiting:
+                    expectation = waiting.popleft()
+                    # cancelled or timed out requests leave once their done callback ran
+                    if not expectation.future.done():
+                        expectation.future.set_result(bytes(frame))
+                        return True
+        return False
+
+    def cancel(self):
+        """
+        Cancel all outstanding requests.
+        """
+        for waiting in list(self._pending.values()):
+            for expectation in list(waiting):
+                expectation.future.cancel()
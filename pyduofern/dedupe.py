@@ -0,0 +1,80 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+
+import time
+
+
+class FrameDeduplicator(object):
+    """
+    Drops exact repeats of a frame received within a short time window.
+
+    Actors often send the same status frame several times in a row and frames of neighbouring installations are
+    repeated, too. The frame contains the device code, so a repeat is a frame identical to one seen less than
+    ``window`` seconds ago. Every repeat restarts the window.
+    """
+
+    def __init__(self, window=1.0, clock=time.monotonic):
+        """
+        :param window: seconds during which an identical frame counts as a repeat
+        :param clock: monotonic clock returning seconds
+        """
+        self.window = window
+        self.clock = clock
+        self.passed = 0
+        self.dropped = 0
+        self._seen = {}
+        self._next_prune = 0
+
+    def is_duplicate(self, frame):
+        """
+        :param frame: received frame as ``bytes``
+        :return: True if ``frame`` repeats a frame seen within the window and should be dropped
+        """
+        now = self.clock()
+        last = self._seen.get(frame)
+        self._seen[frame] = now
+        if last is not None and now - last < self.window:
+            self.dropped += 1
+            return True
+
+        self.passed += 1
+        if now >= self._next_prune:
+            self._prune(now)
+        return False
+
+    def _prune(self, now):
+        self._seen = {frame: seen for frame, seen in self._seen.items() if now - seen < self.window}
+        self._next_prune = now + self.window
+
+    def stats(self):
+        """
+        :return: dict with the number of ``passed`` and ``dropped`` frames and the number of frames ``tracked``
+        """
+        return {'passed': self.passed, 'dropped': self.dropped, 'tracked': len(self._seen)}
+
+    def reset(self):
+        self._seen.clear()
+        self.passed = 0
+        self.dropped = 0
@@ -116,6 +116,200 @@ openSpeeds = {
     0x30: "19",
 }
 
+onOff = ("off", "on")
+downUp = ("up", "down")
+zeroOne = ("0", "1")
+
+
+def _temperature(raw):
+    return "%0.1f" % ((raw - 400) / 10)
+
+
+def _threshold(raw):
+    return "%0.1f" % ((raw - 80) / 2)
+
+
+def _level_state(values):
+    level = values["level"]
+    if level == 0:
+        return "off"
+    if level == 100:
+        return "on"
+    return level
+
+
+# Layout of the actor status frames 0fff0fXX, XX being the format. Every field is
+#   (reading, byte offset, byte count, mask, shift, value map)
+# the raw value is ((bytes at offset) & mask) >> shift, the value map is either None (raw value),
+# a tuple/dict indexed by the raw value or a callable applied to it.
+# Readings with offset None are derived from the readings decoded before them, the value map is
+# then called with the dict of those readings.
+statusFormats = {
+    # RolloTron
+    "21": {
+        "fields": (
+            ("ventilatingPosition", 6, 1, 0x7F, 0, None),
+            ("ventilatingMode", 6, 1, 0x80, 7, onOff),
+            ("sunPosition", 10, 1, 0x7F, 0, None),
+            ("sunMode", 10, 1, 0x80, 7, onOff),
+            ("timeAutomatic", 4, 1, 0x01, 0, onOff),
+            ("sunAutomatic", 4, 1, 0x04, 2, onOff),
+            ("dawnAutomatic", 5, 1, 0x08, 3, onOff),
+            ("duskAutomatic", 4, 1, 0x08, 3, onOff),
+            ("manualMode", 4, 1, 0x80, 7, onOff),
+            ("position", 11, 1, 0x7F, 0, None),
+            ("state", None, 0, 0, 0, lambda values: "closed" if values["position"] == 100 else values["position"]),
+            ("moving", None, 0, 0, 0, lambda values: "stop"),
+        ),
+    },
+    # Universal Aktor, Steckdosenaktor, Troll Comfort DuoFern (Lichtmodus)
+    "22": {
+        "fields": (
+            ("sunMode", 7, 1, 0x10, 4, onOff),
+            ("timeAutomatic", 7, 1, 0x01, 0, onOff),
+            ("sunAutomatic", 7, 1, 0x04, 2, onOff),
+            ("dawnAutomatic", 7, 1, 0x40, 6, onOff),
+            ("duskAutomatic", 7, 1, 0x02, 1, onOff),
+            ("manualMode", 7, 1, 0x20, 5, onOff),
+            ("modeChange", 11, 1, 0x80, 7, onOff),
+            ("stairwellFunction", 8, 2, 0x8000, 15, onOff),
+            ("stairwellTime", 8, 2, 0x7FFF, 0, lambda raw: raw / 10),
+            ("level", 11, 1, 0x7F, 0, None),
+            ("state", None, 0, 0, 0, _level_state),
+        ),
+        # second channel of the Universalaktor
+        "channel2": (
+            ("sunMode", 6, 1, 0x10, 4, onOff),
+            ("timeAutomatic", 6, 1, 0x01, 0, onOff),
+            ("sunAutomatic", 6, 1, 0x04, 2, onOff),
+            ("dawnAutomatic", 6, 1, 0x40, 6, onOff),
+            ("duskAutomatic", 6, 1, 0x02, 1, onOff),
+            ("manualMode", 6, 1, 0x20, 5, onOff),
+            ("modeChange", 10, 1, 0x80, 7, onOff),
+            ("stairwellFunction", 4, 2, 0x8000, 15, onOff),
+            ("stairwellTime", 4, 2, 0x7FFF, 0, lambda raw: raw / 10),
+            ("level", 10, 1, 0x7F, 0, None),
+            ("state", None, 0, 0, 0, _level_state),
+        ),
+    },
+    # Troll Basis, Troll Comfort, Rohrmotor-Aktor, Connect-Aktor
+    "23": {
+        "fields": (
+            ("ventilatingPosition", 8, 1, 0x7F, 0, None),
+            ("ventilatingMode", 8, 1, 0x80, 7, onOff),
+            ("sunPosition", 9, 1, 0x7F, 0, None),
+            ("sunMode", 7, 1, 0x10, 4, onOff),
+            ("timeAutomatic", 7, 1, 0x01, 0, onOff),
+            ("sunAutomatic", 7, 1, 0x04, 2, onOff),
+            ("dawnAutomatic", 6, 1, 0x02, 1, onOff),
+            ("duskAutomatic", 7, 1, 0x02, 1, onOff),
+            ("manualMode", 7, 1, 0x20, 5, onOff),
+            ("windAutomatic", 7, 1, 0x40, 6, onOff),
+            ("windMode", 7, 1, 0x08, 3, onOff),
+            ("windDirection", 6, 1, 0x04, 2, downUp),
+            ("rainAutomatic", 7, 1, 0x80, 7, onOff),
+            ("rainMode", 6, 1, 0x01, 0, onOff),
+            ("rainDirection", 6, 1, 0x08, 3, downUp),
+            ("runningTime", 10, 1, 0xFF, 0, None),
+            ("motorDeadTime", 6, 1, 0x30, 0, deadTimes),
+            ("position", 11, 1, 0x7F, 0, None),
+            ("reversal", 11, 1, 0x80, 7, onOff),
+            ("blindsMode", 13, 1, 0x80, 7, onOff),
+            ("moving", None, 0, 0, 0, lambda values: "stop"),
+            ("state", None, 0, 0, 0, lambda values: {0: "opened", 100: "closed"}.get(values["position"],
+                                                                                       values["position"])),
+        ),
+        # only reported while blindsMode is on, removed otherwise
+        "blinds": (
+            ("tiltInSunPos", 9, 1, 0x80, 7, onOff),
+            ("tiltInVentPos", 4, 1, 0x80, 7, onOff),
+            ("tiltAfterMoveLevel", 4, 1, 0x40, 6, onOff),
+            ("tiltAfterStopDown", 5, 1, 0x80, 7, onOff),
+            ("defaultSlatPos", 5, 1, 0x7F, 0, None),
+            ("slatRunTime", 4, 1, 0x3F, 0, None),
+            ("slatPosition", 13, 1, 0x7F, 0, None),
+        ),
+    },
+    # Rohrmotor, SX5
+    "24": {
+        "fields": (
+            ("manualMode", 7, 1, 0x20, 5, onOff),
+            ("timeAutomatic", 7, 1, 0x01, 0, onOff),
+            ("ventilatingPosition", 8, 1, 0x7F, 0, None),
+            ("ventilatingMode", 8, 1, 0x80, 7, onOff),
+            ("position", 11, 1, 0x7F, 0, None),
+            ("obstacle", 6, 1, 0x10, 4, zeroOne),
+            ("block", 6, 1, 0x40, 6, zeroOne),
+            ("state", None, 0, 0, 0, lambda values: "block" if values["block"] == "1" else values["position"]),
+            ("moving", None, 0, 0, 0, lambda values: "stop"),
+        ),
+        # readings depending on the device type (first two digits of the code)
+        "variants": {
+            "4e": (
+                ("10minuteAlarm", 13, 1, 0x02, 1, onOff),
+                ("automaticClosing", 5, 1, 0x0F, 0, closingTimes),
+                ("2000cycleAlarm", 5, 1, 0x80, 7, onOff),
+                ("openSpeed", 5, 1, 0x30, 0, openSpeeds),
+                ("backJump", 13, 1, 0x01, 0, onOff),
+                ("lightCurtain", 4, 1, 0x80, 7, zeroOne),
+            ),
+            None: (
+                ("sunPosition", 9, 1, 0x7F, 0, None),
+                ("sunMode", 7, 1, 0x10, 4, onOff),
+                ("sunAutomatic", 7, 1, 0x04, 2, onOff),
+                ("dawnAutomatic", 6, 1, 0x02, 1, onOff),
+                ("duskAutomatic", 7, 1, 0x02, 1, onOff),
+                ("windAutomatic", 7, 1, 0x40, 6, onOff),
+                ("windMode", 7, 1, 0x08, 3, onOff),
+                ("windDirection", 6, 1, 0x04, 2, downUp),
+                ("rainAutomatic", 7, 1, 0x80, 7, onOff),
+                ("rainMode", 6, 1, 0x01, 0, onOff),
+                ("rainDirection", 6, 1, 0x08, 3, downUp),
+                ("reversal", 11, 1, 0x80, 7, onOff),
+            ),
+        },
+    },
+    # Dimmaktor
+    "25": {
+        "fields": (
+            ("stairwellFunction", 5, 2, 0x8000, 15, onOff),
+            ("stairwellTime", 5, 2, 0x7FFF, 0, lambda raw: raw / 10),
+            ("timeAutomatic", 7, 1, 0x01, 0, onOff),
+            ("duskAutomatic", 7, 1, 0x02, 1, onOff),
+            ("sunAutomatic", 7, 1, 0x04, 2, onOff),
+            ("sunMode", 7, 1, 0x08, 3, onOff),
+            ("manualMode", 7, 1, 0x20, 5, onOff),
+            ("dawnAutomatic", 7, 1, 0x40, 6, onOff),
+            ("saveIntermediateOnStop", 7, 1, 0x80, 7, onOff),
+            ("runningTime", 9, 1, 0xFF, 0, None),
+            ("intermediateValue", 10, 1, 0x7F, 0, None),
+            ("intermediateMode", 10, 1, 0x80, 7, onOff),
+            ("level", 11, 1, 0x7F, 0, None),
+            ("modeChange", 11, 1, 0x80, 7, onOff),
+            ("state", None, 0, 0, 0, _level_state),
+        ),
+    },
+    # Raumthermostat
+    "27": {
+        "fields": (
+            ("measured-temp", 4, 2, 0x07FF, 0, _temperature),
+            ("measured-temp2", 6, 2, 0x07FF, 0, _temperature),
+            ("temperatureThreshold1", 8, 1, 0xFF, 0, _threshold),
+            ("temperatureThreshold2", 9, 1, 0xFF, 0, _threshold),
+            ("temperatureThreshold3", 10, 1, 0xFF, 0, _threshold),
+            ("temperatureThreshold4", 11, 1, 0xFF, 0, _threshold),
+            ("desired-temp", 13, 1, 0xFF, 0, _threshold),
+            ("output", 4, 1, 0x08, 3, onOff),
+            ("manualOverride", 4, 1, 0x10, 4, onOff),
+            ("actTempLimit", 4, 1, 0x60, 5, None),
+            ("timeAutomatic", 6, 1, 0x08, 3, onOff),
+            ("manualMode", 6, 1, 0x10, 4, onOff),
+            ("state", None, 0, 0, 0,
+             lambda values: "T: {} desired: {}".format(values["measured-temp"], values["desired-temp"])),
+        ),
+    },
+}
+
 commands = {
     "remotePair": {"noArg": "06010000000000000000"},
     "remoteUnpair": {"noArg": "06020000000000000000"},
@@ -0,0 +1,99 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import operator
+
+
+def _key_function(positions):
+    if positions == tuple(range(len(positions))):
+        length = len(positions)
+        return lambda frame: bytes(frame[0:length])
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda frame: bytes((frame[position],))
+    getter = operator.itemgetter(*positions)
+    return lambda frame: bytes(getter(frame))
+
+
+class MessageDispatcher(object):
+    """
+    Routes frames to handlers by their leading bytes.
+
+    Prefixes are hex strings, every byte is either two hex digits or ``..`` which matches any value, e.g.
+    ``"0fff0f"`` or ``"0f..07"``. Prefixes sharing the same byte positions ("shape") live in one dict, so a lookup
+    costs one dict access per shape no matter how many message types are registered. If several prefixes match a
+    frame the one with more fixed bytes wins.
+    """
+
+    def __init__(self, default=None):
+        """
+        :param default: handler for frames not matching any registered prefix
+        """
+        self.default = default
+        self._shapes = []
+
+    def register(self, prefix, handler):
+        """
+        :param prefix: hex prefix (see class docstring) or an iterable of them
+        :param handler: callable invoked with the frame and any extra arguments passed to :meth:`dispatch`
+        """
+        if not isinstance(prefix, str):
+            for single_prefix in prefix:
+                self.register(single_prefix, handler)
+            return
+        assert len(prefix) % 2 == 0, "prefix must consist of whole bytes"
+        pairs = [prefix[i:i + 2] for i in range(0, len(prefix), 2)]
+        positions = tuple(i for i, pair in enumerate(pairs) if pair != "..")
+        key = bytes(int(pairs[i], 16) for i in positions)
+
+        for shape_positions, key_function, handlers in self._shapes:
+            if shape_positions == positions:
+                handlers[key] = handler
+                return
+        self._shapes.append((positions, _key_function(positions), {key: handler}))
+        self._shapes.sort(key=lambda shape: len(shape[0]), reverse=True)
+
+    def unregister(self, prefix):
+        pairs = [prefix[i:i + 2] for i in range(0, len(prefix), 2)]
+        positions = tuple(i for i, pair in enumerate(pairs) if pair != "..")
+        key = bytes(int(pairs[i], 16) for i in positions)
+        for shape_positions, key_function, handlers in self._shapes:
+            if shape_positions == positions:
+                handlers.pop(key, None)
+
+    def lookup(self, frame):
+        """
+        :return: the handler registered for ``frame`` or the default handler
+        """
+        for positions, key_function, handlers in self._shapes:
+            handler = handlers.get(key_function(frame))
+            if handler is not None:
+                return handler
+        return self.default
+
+    def dispatch(self, frame, *args):
+        handler = self.lookup(frame)
+        if handler is None:
+            return None
+        return handler(frame, *args)
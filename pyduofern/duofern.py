@@ -25,8 +25,12 @@
 import asyncio
 import logging
 import time
+from types import MappingProxyType
 
 from .definitions import *
+from .dedupe import FrameDeduplicator
+from .dispatch import MessageDispatcher
+from .state import DeviceState, channelSuffixes
 
 # regexe for replacing:
 # hash->\{([^\}]+)\}\{([^\}]+)\}
@@ -83,21 +87,355 @@ def DUOFERN_DecodeWeatherSensorConfig(*args):
     pass
 
 
+class HexFrame(object):
+    """
+    Wraps a frame for logging, the hex representation is only built if the message is actually emitted.
+    """
+    __slots__ = ('frame',)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __str__(self):
+        if isinstance(self.frame, str):
+            return self.frame
+        return bytes(self.frame).hex()
+
+
+def compile_status_field(key, offset, size, mask, shift, values):
+    """
+    Turn one entry of ``statusFormats`` into a ``(key, getter)`` pair. The getter is called with the frame
+    (as ``bytes``) and the readings decoded so far and returns the value of the reading.
+    """
+    if offset is None:
+        return key, lambda frame, readings: values(readings)
+
+    if size == 1:
+        def raw(frame):
+            return (frame[offset] & mask) >> shift
+    elif size == 2:
+        def raw(frame):
+            return ((frame[offset] << 8 | frame[offset + 1]) & mask) >> shift
+    else:  # pragma: no cover
+        raise ValueError("status field {} has unsupported size {}".format(key, size))
+
+    if values is None:
+        return key, lambda frame, readings: raw(frame)
+    if callable(values):
+        return key, lambda frame, readings: values(raw(frame))
+    lookup = values.__getitem__
+    return key, lambda frame, readings: lookup(raw(frame))
+
+
+class StatusDecoder(object):
+    """
+    Decoder for one status frame format, compiled from its ``statusFormats`` entry.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.fields = tuple(compile_status_field(*field) for field in spec['fields'])
+        self.optional = tuple(compile_status_field(*field) for field in spec.get('blinds', ()))
+        self.variants = {prefix: tuple(compile_status_field(*field) for field in fields)
+                         for prefix, fields in spec.get('variants', {}).items()}
+        self.channel2 = StatusDecoder({'fields': spec['channel2']}) if 'channel2' in spec else None
+        self._layouts = {}
+
+    def layout(self, code):
+        """
+        :return: the :class:`StatusLayout` for devices with ``code``, used for lazy decoding
+        """
+        variant = code[0:2].lower() if code[0:2].lower() in self.variants else None
+        try:
+            return self._layouts[variant]
+        except KeyError:
+            fields = self.spec['fields']
+            if self.variants:
+                fields = fields + self.spec['variants'][variant]
+            layout = self._layouts[variant] = StatusLayout(fields, self.spec.get('blinds', ()))
+            return layout
+
+    def decode(self, frame, code):
+        """
+        :param frame: the status frame as ``bytes``
+        :param code: device code, selects device type specific readings
+        :return: tuple of dict with the decoded readings and tuple of readings that no longer apply
+        """
+        readings = {}
+        for key, getter in self.fields:
+            readings[key] = getter(frame, readings)
+
+        removed = ()
+        if self.optional:
+            if readings['blindsMode'] == "on":
+                for key, getter in self.optional:
+                    readings[key] = getter(frame, readings)
+            else:
+                removed = tuple(key for key, getter in self.optional)
+
+        if self.variants:
+            variant = self.variants.get(code[0:2].lower(), self.variants[None])
+            for key, getter in variant:
+                readings[key] = getter(frame, readings)
+
+        return readings, removed
+
+
+class StatusLayout(object):
+    """
+    The readings contained in a status frame and the bytes each of them is decoded from. Lets
+    :class:`~pyduofern.state.Readings` decode single readings on access and tell which readings a new frame
+    invalidates.
+    """
+
+    def __init__(self, fields, optional=()):
+        """
+        :param fields: ``statusFormats`` field entries
+        :param optional: field entries only present while ``blindsMode`` is on
+        """
+        self.getters = dict(compile_status_field(*field) for field in fields)
+        self.optional = dict(compile_status_field(*field) for field in optional)
+        self.keys = tuple(self.getters) + tuple(self.optional)
+
+        dependencies = {}
+        for key, offset, size, mask, shift, values in fields + optional:
+            if offset is not None:
+                dependencies[key] = set(range(offset, offset + size))
+        for key, offset, size, mask, shift, values in optional:
+            dependencies[key] |= dependencies['blindsMode']
+        used = set().union(*dependencies.values())
+
+        # derived readings are invalidated by any change
+        derived = tuple(field[0] for field in fields + optional if field[1] is None)
+        self.fields_by_byte = tuple(
+            (position, tuple(key for key, positions in dependencies.items() if position in positions) + derived)
+            for position in sorted(used))
+
+    def changed(self, old, new):
+        """
+        :return: the readings that may differ between frames ``old`` and ``new``
+        """
+        if old == new:
+            return ()
+        keys = set()
+        for position, dependent in self.fields_by_byte:
+            if old[position] != new[position]:
+                keys.update(dependent)
+        return keys
+
+
+# keyed by the format byte of the frame
+statusDecoders = {int(format, 16): StatusDecoder(spec) for format, spec in statusFormats.items()}
+
+
+class CommandTemplate(object):
+    """
+    One entry of ``commands`` compiled into the bytes of a ``duoCommand`` frame and the positions of its arguments.
+    """
+    __slots__ = ('frame', 'timer', 'value', 'word')
+
+    def __init__(self, command):
+        frame = bytearray(22)
+        frame[0] = 0x0D
+        self.timer = self.value = self.word = None
+        for index in range(0, len(command), 2):
+            pair = command[index:index + 2].lower()
+            position = 2 + index // 2
+            if pair == "tt":
+                self.timer = position
+            elif pair == "nn":
+                self.value = position
+            elif pair == "ww":
+                if self.word is None:
+                    self.word = position
+            else:
+                frame[position] = int(pair, 16)
+        self.frame = bytes(frame)
+
+    def encode(self, system_code, code, channel=1, timer=0, value=0, word=0):
+        """
+        :param system_code: 3 bytes, ``6f`` followed by the system code
+        :param code: device code, 3 bytes
+        :return: the frame as ``bytes``
+        """
+        frame = bytearray(self.frame)
+        frame[1] = channel
+        if self.timer is not None:
+            frame[self.timer] = timer
+        if self.value is not None:
+            frame[self.value] = value
+        if self.word is not None:
+            frame[self.word] = word >> 8
+            frame[self.word + 1] = word & 0xFF
+        frame[15:18] = system_code
+        frame[18:21] = code
+        return bytes(frame)
+
+
+commandTemplates = {cmd: {subCmd: CommandTemplate(command) for subCmd, command in subCmds.items()}
+                    for cmd, subCmds in commands.items()}
+
+statusRequestFrames = {cmd: bytes.fromhex(duoStatusRequest.replace("nn", request).replace("yyyyyy", "000000"))
+                       for cmd, request in commandsStatus.items()}
+
+
+def _masked(frame, positions):
+    command = bytearray(frame[2:12])
+    for position in positions:
+        command[position - 2] = 0
+    return bytes(command)
+
+
+def _argument_positions(template):
+    positions = tuple(position for position in (template.timer, template.value) if position is not None)
+    if template.word is not None:
+        positions += (template.word, template.word + 1)
+    return positions
+
+
+# argument positions -> command bytes (arguments zeroed) of all commands taking a value, e.g. position
+_valueCommands = {}
+# argument positions -> command bytes (timer zeroed) of all commands without value, e.g. up or sunMode on
+_fixedCommands = {}
+for _subCmds in commandTemplates.values():
+    for _template in _subCmds.values():
+        _positions = _argument_positions(_template)
+        _table = _fixedCommands if _template.value is None and _template.word is None else _valueCommands
+        _table.setdefault(_positions, set()).add(_masked(_template.frame, _positions))
+
+
+def value_command_kind(frame):
+    """
+    :param frame: frame to be sent as ``bytes``
+    :return: for frames of commands that set a value (``position``, ``level``, ``sunPosition``, ...) the command
+     bytes with the arguments zeroed, identifying the command. None for every other frame.
+    """
+    if len(frame) != 22 or frame[0] != 0x0D:
+        return None
+    for positions, fixed in _fixedCommands.items():
+        if _masked(frame, positions) in fixed:
+            return None
+    for positions, signatures in _valueCommands.items():
+        signature = _masked(frame, positions)
+        if signature in signatures:
+            return signature
+    return None
+
+
+def _capability_sets(code):
+    """
+    The FHEM set list for ``code``, optionally followed by two digits for a channel. Only used to build
+    ``deviceCapabilities``.
+    """
+    sets = {}
+    if code[0:2] == "49":
+        sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsRolloTube)
+    if code[0:2] in ("42", "4b", "4c", "70"):
+        sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsTroll, {"blindsMode:on,off": ""})
+    if code[0:2] == "47":
+        sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsTroll)
+    if code[0:2] in ("40", "41", "61"):
+        sets = merge_dicts(setsBasic, setsDefaultRollerShutter)  # if (code =~ /^(40|41|61)..../)
+    if code[0:2] == "69":
+        sets = merge_dicts(setsBasic, setsUmweltsensor)  # if (code =~ /^69..../)
+    if code[0:2] == "69" and len(code) >= 8 and code[6:8] == "00":
+        sets = merge_dicts(setsUmweltsensor00)  # if (code =~ /^69....00/)
+    if code[0:2] == "69" and len(code) >= 8 and code[6:8] == "01":
+        sets = merge_dicts(setsDefaultRollerShutter, setsUmweltsensor01)  # if (code =~ /^69....01/)
+    if code[0:2] == "43" and len(code) >= 8 and code[6:8] in ("01", "02"):
+        sets = merge_dicts(setsSwitchActor)  # if (code =~ /^43....(01|02)/)
+    if code[0:2] in ("43", "65", "74"):
+        sets = merge_dicts(setsBasic, {"getStatus:noArg": ""})  # if (code =~ /^(43|65|74)..../)
+    if code[0:2] in ("46", "71"):
+        sets = merge_dicts(setsBasic, setsSwitchActor)  # if (code =~ /^(46|71)..../)
+    if code[0:2] == "4e":
+        sets = merge_dicts(setsBasic, setsSX5)  # if (code =~ /^4E..../)
+    if code[0:2] == "48":
+        sets = merge_dicts(setsBasic, setsDimmer)  # if (code =~ /^48..../)
+    if code[0:2] == "73":
+        sets = merge_dicts(setsBasic, setsThermostat)  # if (code =~ /^73..../)
+    if code[0:2] in ("65", "74") and len(code) >= 8 and code[6:8] == "01":
+        sets = merge_dicts(setsSwitchActor)  # if (code =~ /^(65|74)....01/)
+    return sets
+
+
+def _capability_map(sets):
+    return MappingProxyType({key.partition(":")[0]: key.partition(":")[2] for key in sets})
+
+
+# (device type, channel, blindsMode) -> read only dict command -> FHEM argument spec, e.g. "position": "slider,0,1,100"
+deviceCapabilities = {}
+for _prefix in ("40", "41", "42", "43", "46", "47", "48", "49", "4b", "4c", "4e", "61", "65", "69", "70", "71", "73",
+                "74"):
+    for _channel in (None, 0, 1, 2):
+        _sets = _capability_sets(_prefix + "0000" + ("" if _channel is None else "{:02x}".format(_channel)))
+        deviceCapabilities[(_prefix, _channel, False)] = _capability_map(_sets)
+        deviceCapabilities[(_prefix, _channel, True)] = _capability_map(merge_dicts(_sets, setsBlinds))
+
+_noCapabilities = MappingProxyType({})
+
+
+def capabilities(code, channel=None, blinds=False):
+    """
+    The commands a device supports, as used by :meth:`Duofern.set`.
+
+    :param code: device code (6 hex digits)
+    :param channel: channel of multichannel devices
+    :param blinds: whether the device is in blinds mode
+    :return: read only dict mapping command names to the FHEM argument spec, e.g. ``noArg``, ``on,off`` or
+     ``slider,0,1,100``
+    """
+    prefix = code[0:2].lower()
+    found = deviceCapabilities.get((prefix, channel, blinds))
+    if found is None:
+        found = deviceCapabilities.get((prefix, None, blinds), _noCapabilities)
+    return found
+
+
 class Duofern(object):
-    def __init__(self, send_hook=None, asyncio=False, changes_callback=None):
+    def __init__(self, send_hook=None, asyncio=False, changes_callback=None, batch_changes=False,
+                 lazy_status=False, dedupe_window=None):
+        """
+        :param send_hook: called with every message that should be sent to the stick
+        :param changes_callback: called whenever a reading is updated. By default it is called as
+         ``changes_callback(code, key, value)`` for every updated reading.
+        :param batch_changes: if True ``changes_callback`` is instead called once per received frame as
+         ``changes_callback(code, {key: value, ...})`` with only the readings whose value actually changed.
+        :param lazy_status: default for :attr:`DeviceState.lazy` of new devices. Status frames of lazy devices are
+         stored undecoded, readings are decoded when accessed. Only readings that changed are reported to
+         ``changes_callback``.
+        :param dedupe_window: if set, actor status frames (``0fff0f``) repeating one received less than this many
+         seconds ago are dropped before they are parsed. The counters are available from :attr:`deduplicator`.
+        """
         self.asyncio = asyncio
         self.modules = {'by_code': {}}  # i guess this is supposed to be a hash of self.modules...
         self.ignore_devices = {}  # should replace attrValrel
         assert send_hook is not None, "Must define send callback"
         self.send_hook = send_hook
+        self.system_code = None
         self.changes_callback = changes_callback
-        pass
+        self.batch_changes = batch_changes
+        self.lazy_status = lazy_status
+        self._pending_changes = None
+        self.deduplicator = FrameDeduplicator(dedupe_window) if dedupe_window else None
+
+        self.dispatcher = MessageDispatcher(default=self._parse_unknown)
+        self.dispatcher.register("0602", self._parse_paired)
+        self.dispatcher.register("0603", self._parse_unpaired)
+        self.dispatcher.register("0fff0f", self._parse_status)
+        self.dispatcher.register(["0f..07", "0f..0e"], self._parse_sensor)
+        self.dispatcher.register("0f011322", self._parse_weather)
+        self.dispatcher.register("0fff1020", self._parse_time)
+        self.dispatcher.register(["0fff1b2{}".format(digit) for digit in range(9)], self._parse_weather_config)
+        self.dispatcher.register("0fff1323", self._parse_battery)
+        self.dispatcher.register("810003cc", self._parse_ack)
+        self.dispatcher.register("810108aa", self._parse_nack)
 
     def add_device(self, code, name=None):
         if name is None:
             name = len(self.modules['by_code'])
         logger.debug("adding {}".format(code))
-        self.modules['by_code'][code] = {'name': name, 'channels': {None}}
+        self.modules['by_code'][code] = DeviceState(code, name, lazy=self.lazy_status)
 
     def del_device(self, code, name=None):
         if name is None:
@@ -116,55 +454,98 @@ class Duofern(object):
         :param channel: if this is a multichannel actor: The channel the key should be set for
         :return:
         """
-        if channel is not None:
-            channel_str = "{:02x}".format(channel)
-            key = key + "_" + channel_str
-            self.modules['by_code'][code]['channels'].add(channel_str)
+        readings = self.modules['by_code'][code].channel(channel)
 
-        self.modules['by_code'][code][key] = value
+        if self.batch_changes and key in readings and readings.get(key) == value:
+            return
+        readings.set(key, value)
 
         if self.changes_callback and trigger:
+            self._report_change(code, key, value, channel)
+
+    def _report_change(self, code, key, value, channel=None):
+        if channel is not None:
+            key = key + channelSuffixes[channel]
+        if not self.batch_changes:
             self.changes_callback(code, key, value)
+        elif self._pending_changes is None:
+            self.changes_callback(code, {key: value})
+        else:
+            self._pending_changes.setdefault(code, {})[key] = value
+
+    def _begin_update(self):
+        # readingsBeginUpdate
+        if self.batch_changes:
+            self._pending_changes = {}
+
+    def _end_update(self):
+        # readingsEndUpdate
+        pending = self._pending_changes
+        self._pending_changes = None
+        if pending and self.changes_callback:
+            for code, changes in pending.items():
+                self.changes_callback(code, changes)
+
+    def _update_status(self, code, readings, removed=(), channel: int = None):
+        for key, value in readings.items():
+            self.update_state(code, key, value, "1", channel=channel)
+        for key in removed:
+            self.delete_state(code, key, channel=channel)
+
+    def _store_status(self, code, decoder, frame, channel: int = None):
+        readings = self.modules['by_code'][code].channel(channel)
+        changes = readings.store_status(frame, decoder.layout(code), report=self.changes_callback is not None)
+        if changes:
+            for key, value in changes.items():
+                self._report_change(code, key, value, channel)
 
     def delete_state(self, code, key, channel: int = None):
-        if channel is not None:
-            channel_str = "{:02x}".format(channel)
-            key = key + "_" + channel_str
-        if key in self.modules['by_code'][code]:
-            del self.modules['by_code'][code][key]
+        self.modules['by_code'][code].del_reading(key, channel)
 
     def get_state(self, code, key, channel=None, default=None):
-        if channel is not None:
-            channel_str = "{:02x}".format(channel)
-            key = key + "_" + channel_str
+        return self.modules['by_code'][code].get_reading(key, channel, default)
 
-        if not key in self.modules['by_code'][code]:
-            return default
+    def register_handler(self, prefix, handler):
+        """
+        Register a handler for a message type not (or differently) handled by :meth:`parse`.
 
-        return self.modules['by_code'][code][key]
+        :param prefix: leading bytes of the frame as hex string, ``..`` matches any byte, e.g. ``"0f..07"``.
+         May also be a list of such prefixes.
+        :param handler: called with the frame (``bytes``) and the device code
+        """
+        self.dispatcher.register(prefix, handler)
 
     def parse(self, msg):
-        code = msg[30:36]
-        if msg[0:2] == '81':
-            code = msg[36:42]
+        """
+        Parse a frame received from the stick.
+
+        :param msg: the 22 byte frame as ``bytes``, ``bytearray`` or ``memoryview``. A string of 44 hex digits is
+         accepted, too.
+        :return: name of the device the frame belongs to
+        """
+        if isinstance(msg, str):
+            frame = bytes.fromhex(msg)
+        else:
+            frame = bytes(msg)
 
-        if code.lower() == 'ffffff':
+        if frame[0] == 0x81:
+            code_bytes = frame[18:21]
+        else:
+            code_bytes = frame[15:18]
+
+        if code_bytes == b'\xff\xff\xff':
             return
         # return hash->{NAME} if (code == "FFFFFF")
+        code = code_bytes.hex()
 
         try:
             # module_definition = self.modules['by_code'][code]
-            name = self.modules['by_code'][code]['name']
+            name = self.modules['by_code'][code].name
 
         except KeyError:
             self.add_device(code)
             logger.info("detected unknown device, ID={}".format(code))
-            name = self.modules['by_code'][code]['name']
-
-        #hash="asdf"
-        # module_definition01 = None
-        # module_definition02 = None
-        channel2 = None
+            name = self.modules['by_code'][code].name
 
         #        if not module_definition:
         #            DoTrigger("global", "Undefined code {}".format(code))
@@ -172,549 +553,270 @@ class Duofern(object):
         #            logger.warning("Undefined code {}".format(code))
         #            raise DuofernException("Undefined code {}".format(code))
 
-        # hash = module_definition
-        # name = hash['name']
-        channel = None
-
         if name in self.ignore_devices:
             return name
 
-        # Device paired
-        if msg[0:4] == "0602":
-            self.update_state(code, "state", "paired", "1", channel=channel)
-            # del hash['READINGS']['unpaired']
-            logger.info("DUOFERN device paired, ID {}".format(code))
-
-        # Device unpaired
-        elif (msg[0:4] == "0603"):
-            # readingsBeginUpdate(hash)
-            self.update_state(code, "unpaired", 1, "1", channel=channel)
-            self.update_state(code, "state", "unpaired", "1", channel=channel)
-            self.del_device(code)
-            # # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-            logger.warning("DUOFERN device unpaired, code {}".format(code))
-
-        # Status Nachricht Aktor
-        elif msg[0:6] == "0fff0f":
-            format = msg[6:6 + 2]
-            ver = msg[24:24 + 1] + msg[25:25 + 1]
-
-            self.update_state(code, "version", ver, "0", channel=channel)
-
-            # RemoveInternalTimer(hash)
-            # del hash['helper']['timeout']
-
-            # Bewegungsmelder, Wettersensor, Mehrfachwandtaster not tested yet
-            if code[0:2] in ("65", "69", "74"):  # pragma: no cover
-                #self.update_state(code, "state", "OK", "1", channel=channel)
-                #module_definition01 = self.modules['by_code'][code + "01"]
-                channel = 1
-                #if not module_definition01:
-                    #DoTrigger("global", "UNDEFINED DUOFERN_code_actor DUOFERN code01")
-                    #module_definition01 = self.modules['by_code'][code + "01"]
-
-            # Universalaktor -- not tested yet
-            elif code[0:2] == "43":  # pragma: no cover
-                self.update_state(code, "state", "OK", "1", channel=channel)
-                #module_definition01 = self.modules['by_code'][code]
-                channel = 1
-                #if not module_definition01:
-                #    DoTrigger("global", "UNDEFINED DUOFERN_code+_01 DUOFERN code+01")
-
-                #module_definition02 = None
-                channel2 = 2
-
-            #if module_definition01:
-                # it seems that sometimes "module_definition01" corresponts to channel "01", at other times
-                # channel="00". I am trying to stick with what module_definition was set to.
-                #hash = module_definition01
-                #channel = 1
-
-            # RolloTron
-            if format == "21":
-                pos = int(msg[22:22 + 2], 16) & 0x7F
-                ventPos = int(msg[12:12 + 2], 16) & 0x7F
-                ventMode = "on" if int(msg[12:12 + 2], 16) & 0x80 else "off"
-                sunPos = int(msg[20:20 + 2], 16) & 0x7F
-                sunMode = "on" if int(msg[20:20 + 2], 16) & 0x80 else "off"
-                timerAuto = "on" if int(msg[8:8 + 2], 16) & 0x01 else "off"
-                sunAuto = "on" if int(msg[8:8 + 2], 16) & 0x04 else "off"
-                dawnAuto = "on" if int(msg[10:10 + 2], 16) & 0x08 else "off"
-                duskAuto = "on" if int(msg[8:8 + 2], 16) & 0x08 else "off"
-                manualMode = "on" if int(msg[8:8 + 2], 16) & 0x80 else "off"
-
-                state = pos
-                state = "opened" if (pos == 0) else pos
-                state = "closed" if (pos == 100) else pos
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "ventilatingPosition", ventPos, "1", channel=channel)
-                self.update_state(code, "ventilatingMode", ventMode, "1", channel=channel)
-                self.update_state(code, "sunPosition", sunPos, "1", channel=channel)
-                self.update_state(code, "sunMode", sunMode, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel)
-                self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel)
-                self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-                self.update_state(code, "position", pos, "1", channel=channel)
-                self.update_state(code, "state", state, "1", channel=channel)
-                self.update_state(code, "moving", "stop", "1", channel=channel)
-                # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-
-            # Universal Aktor, Steckdosenaktor, Troll Comfort DuoFern (Lichtmodus) not tested yet
-            elif format == "22":  # pragma: no cover
-                level = int(msg[22:22 + 2], 16) & 0x7F
-                modeChange = "on" if int(msg[22:22 + 2], 16) & 0x80 else "off"
-                sunMode = "on" if int(msg[14:14 + 2], 16) & 0x10 else "off"
-                timerAuto = "on" if int(msg[14:14 + 2], 16) & 0x01 else "off"
-                sunAuto = "on" if int(msg[14:14 + 2], 16) & 0x04 else "off"
-                dawnAuto = "on" if int(msg[14:14 + 2], 16) & 0x40 else "off"
-                duskAuto = "on" if int(msg[14:14 + 2], 16) & 0x02 else "off"
-                manualMode = "on" if int(msg[14:14 + 2], 16) & 0x20 else "off"
-                stairwellFunction = "on" if int(msg[16:16 + 4], 16) & 0x8000 else "off"
-                stairwellTime = (int(msg[16:16 + 4], 16) & 0x7FFF) / 10
-
-                state = level
-                if level == 0:
-                    state = "off"
-                if level == 100:
-                    state = "on"
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "sunMode", sunMode, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel)
-                self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel)
-                self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-                self.update_state(code, "modeChange", modeChange, "1", channel=channel)
-                self.update_state(code, "stairwellFunction", stairwellFunction, "1", channel=channel)
-                self.update_state(code, "stairwellTime", stairwellTime, "1", channel=channel)
-                self.update_state(code, "level", level, "1", channel=channel)
-                self.update_state(code, "state", state, "1", channel=channel)
-                # readingsEndUpdate(hash, 1)
-
-                if channel2 is not None:
-                    level = int(msg[20:20 + 2], 16) & 0x7F
-                    modeChange = "on" if int(msg[20:20 + 2], 16) & 0x80 else "off"
-                    sunMode = "on" if int(msg[12:12 + 2], 16) & 0x10 else "off"
-                    timerAuto = "on" if int(msg[12:12 + 2], 16) & 0x01 else "off"
-                    sunAuto = "on" if int(msg[12:12 + 2], 16) & 0x04 else "off"
-                    dawnAuto = "on" if int(msg[12:12 + 2], 16) & 0x40 else "off"
-                    duskAuto = "on" if int(msg[12:12 + 2], 16) & 0x02 else "off"
-                    manualMode = "on" if int(msg[12:12 + 2], 16) & 0x20 else "off"
-                    stairwellFunction = "on" if int(msg[8:8 + 4], 16) & 0x8000 else "off"
-                    stairwellTime = (int(msg[8:8 + 4], 16) & 0x7FFF) / 10
-
-                    state = level
-                    if level == 0:
-                        state = "off"
-                    if level == 100:
-                        state = "on"
-
-                    # readingsBeginUpdate(hash)
-                    self.update_state(code, "sunMode", sunMode, "1", channel=channel2)
-                    self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel2)
-                    self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel2)
-                    self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel2)
-                    self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel2)
-                    self.update_state(code, "manualMode", manualMode, "1", channel=channel2)
-                    self.update_state(code, "modeChange", modeChange, "1", channel=channel2)
-                    self.update_state(code, "stairwellFunction", stairwellFunction, "1", channel=channel2)
-                    self.update_state(code, "stairwellTime", stairwellTime, "1", channel=channel2)
-                    self.update_state(code, "level", level, "1", channel=channel2)
-                    self.update_state(code, "state", state, "1", channel=channel2)
-                    # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-            elif format == "23":
-                pos = int(msg[22:22 + 2], 16) & 0x7F
-                reversal = "on" if int(msg[22:22 + 2], 16) & 0x80 else "off"
-                ventPos = int(msg[16:16 + 2], 16) & 0x7F
-                ventMode = "on" if int(msg[16:16 + 2], 16) & 0x80 else "off"
-                sunPos = int(msg[18:18 + 2], 16) & 0x7F
-                sunMode = "on" if int(msg[14:14 + 2], 16) & 0x10 else "off"
-                timerAuto = "on" if int(msg[14:14 + 2], 16) & 0x01 else "off"
-                sunAuto = "on" if int(msg[14:14 + 2], 16) & 0x04 else "off"
-                dawnAuto = "on" if int(msg[12:12 + 2], 16) & 0x02 else "off"
-                duskAuto = "on" if int(msg[14:14 + 2], 16) & 0x02 else "off"
-                manualMode = "on" if int(msg[14:14 + 2], 16) & 0x20 else "off"
-                windAuto = "on" if int(msg[14:14 + 2], 16) & 0x40 else "off"
-                windMode = "on" if int(msg[14:14 + 2], 16) & 0x08 else "off"
-                windDir = "down" if int(msg[12:12 + 2], 16) & 0x04 else "up"
-                rainAuto = "on" if int(msg[14:14 + 2], 16) & 0x80 else "off"
-                rainMode = "on" if int(msg[12:12 + 2], 16) & 0x01 else "off"
-                rainDir = "down" if int(msg[12:12 + 2], 16) & 0x08 else "up"
-                runningTime = int(msg[20:20 + 2], 16)
-                deadTime = int(msg[12:12 + 2], 16) & 0x30
-                blindsMode = "on" if int(msg[26:26 + 2], 16) & 0x80 else "off"
-                tiltInSunPos = "on" if int(msg[18:18 + 2], 16) & 0x80 else "off"
-                tiltInVentPos = "on" if int(msg[8:8 + 2], 16) & 0x80 else "off"
-                tiltAfterMoveLevel = "on" if int(msg[8:8 + 2], 16) & 0x40 else "off"
-                tiltAfterStopDown = "on" if int(msg[10:10 + 2], 16) & 0x80 else "off"
-                defaultSlatPos = int(msg[10:10 + 2], 16) & 0x7F
-                slatRunTime = int(msg[8:8 + 2], 16) & 0x3F
-                slatPosition = int(msg[26:26 + 2], 16) & 0x7F
-
-                state = "opened" if (pos == 0) else pos
-                state = "closed" if (pos == 100) else state
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "ventilatingPosition", ventPos, "1", channel=channel)
-                self.update_state(code, "ventilatingMode", ventMode, "1", channel=channel)
-                self.update_state(code, "sunPosition", sunPos, "1", channel=channel)
-                self.update_state(code, "sunMode", sunMode, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel)
-                self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel)
-                self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-                self.update_state(code, "windAutomatic", windAuto, "1", channel=channel)
-                self.update_state(code, "windMode", windMode, "1", channel=channel)
-                self.update_state(code, "windDirection", windDir, "1", channel=channel)
-                self.update_state(code, "rainAutomatic", rainAuto, "1", channel=channel)
-                self.update_state(code, "rainMode", rainMode, "1", channel=channel)
-                self.update_state(code, "rainDirection", rainDir, "1", channel=channel)
-                self.update_state(code, "runningTime", runningTime, "1", channel=channel)
-                self.update_state(code, "motorDeadTime", deadTimes[deadTime], "1", channel=channel)
-                self.update_state(code, "position", pos, "1", channel=channel)
-                self.update_state(code, "reversal", reversal, "1", channel=channel)
-                self.update_state(code, "blindsMode", blindsMode, "1", channel=channel)
-
-                # not tested yet
-                if blindsMode == "on":  # pragma: no cover
-                    self.update_state(code, "tiltInSunPos", tiltInSunPos, "1", channel=channel)
-                    self.update_state(code, "tiltInVentPos", tiltInVentPos, "1", channel=channel)
-                    self.update_state(code, "tiltAfterMoveLevel", tiltAfterMoveLevel, "1", channel=channel)
-                    self.update_state(code, "tiltAfterStopDown", tiltAfterStopDown, "1", channel=channel)
-                    self.update_state(code, "defaultSlatPos", defaultSlatPos, "1", channel=channel)
-                    self.update_state(code, "slatRunTime", slatRunTime, "1", channel=channel)
-                    self.update_state(code, "slatPosition", slatPosition, "1", channel=channel)
-                else:
-                    self.delete_state(code, 'tiltInSunPos', channel=channel)
-                    self.delete_state(code, 'tiltInVentPos', channel=channel)
-                    self.delete_state(code, 'tiltAfterMoveLevel', channel=channel)
-                    self.delete_state(code, 'tiltAfterStopDown', channel=channel)
-                    self.delete_state(code, 'defaultSlatPos', channel=channel)
-                    self.delete_state(code, 'slatRunTime', channel=channel)
-                    self.delete_state(code, 'slatPosition', channel=channel)
-
-                self.update_state(code, "moving", "stop", "1", channel=channel)
-                self.update_state(code, "state", state, "1", channel=channel)
-                # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-            # Rohrmotor, SX5  -- not tested yet
-            elif format == "24":  # pragma: no cover
-
-                pos = int(msg[22:22 + 2], 16) & 0x7F
-                reversal = "on" if int(msg[22:22 + 2], 16) & 0x80 else "off"
-                ventPos = int(msg[16:16 + 2], 16) & 0x7F
-                ventMode = "on" if int(msg[16:16 + 2], 16) & 0x80 else "off"
-                sunPos = int(msg[18:18 + 2], 16) & 0x7F
-                sunMode = "on" if int(msg[14:14 + 2], 16) & 0x10 else "off"
-                timerAuto = "on" if int(msg[14:14 + 2], 16) & 0x01 else "off"
-                sunAuto = "on" if int(msg[14:14 + 2], 16) & 0x04 else "off"
-                dawnAuto = "on" if int(msg[12:12 + 2], 16) & 0x02 else "off"
-                duskAuto = "on" if int(msg[14:14 + 2], 16) & 0x02 else "off"
-                manualMode = "on" if int(msg[14:14 + 2], 16) & 0x20 else "off"
-                windAuto = "on" if int(msg[14:14 + 2], 16) & 0x40 else "off"
-                windMode = "on" if int(msg[14:14 + 2], 16) & 0x08 else "off"
-                windDir = "down" if int(msg[12:12 + 2], 16) & 0x04 else "up"
-                rainAuto = "on" if int(msg[14:14 + 2], 16) & 0x80 else "off"
-                rainMode = "on" if int(msg[12:12 + 2], 16) & 0x01 else "off"
-                rainDir = "down" if int(msg[12:12 + 2], 16) & 0x08 else "up"
-                obstacle = "1" if int(msg[12:12 + 2], 16) & 0x10 else "0"
-                block = "1" if int(msg[12:12 + 2], 16) & 0x40 else "0"
-                lightCurtain = "1" if int(msg[8:8 + 2], 16) & 0x80 else "0"
-                autoClose = int(msg[10:10 + 2], 16) & 0x0F
-                openSpeed = int(msg[10:10 + 2], 16) & 0x30
-                alert2000 = "on" if int(msg[10:10 + 2], 16) & 0x80 else "off"
-                backJump = "on" if int(msg[26:26 + 2], 16) & 0x01 else "off"
-                alert10 = "on" if int(msg[26:26 + 2], 16) & 0x02 else "off"
-
-                state = pos
-                state = "opened" if (pos == 0) else pos
-                state = "closed" if (pos == 100) else pos
-                state = "light curtain" if (lightCurtain == "1") else pos
-                state = "obstacle" if (obstacle == "1") else pos
-                state = "block" if (block == "1") else pos
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "ventilatingPosition", ventPos, "1", channel=channel)
-                self.update_state(code, "ventilatingMode", ventMode, "1", channel=channel)
-                self.update_state(code, "position", pos, "1", channel=channel)
-                self.update_state(code, "state", state, "1", channel=channel)
-                self.update_state(code, "obstacle", obstacle, "1", channel=channel)
-                self.update_state(code, "block", block, "1", channel=channel)
-                self.update_state(code, "moving", "stop", "1", channel=channel)
-
-                if code[0:2] == "4E":  # SX5
-                    self.update_state(code, "10minuteAlarm", alert10, "1", channel=channel)
-                    self.update_state(code, "automaticClosing", closingTimes['autoClose'], "1", channel=channel)
-                    self.update_state(code, "2000cycleAlarm", alert2000, "1", channel=channel)
-                    self.update_state(code, "openSpeed", openSpeeds['openSpeed'], "1", channel=channel)
-                    self.update_state(code, "backJump", backJump, "1", channel=channel)
-                    self.update_state(code, "lightCurtain", lightCurtain, "1", channel=channel)
-                else:
-                    self.update_state(code, "sunPosition", sunPos, "1", channel=channel)
-                    self.update_state(code, "sunMode", sunMode, "1", channel=channel)
-                    self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel)
-                    self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel)
-                    self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel)
-                    self.update_state(code, "windAutomatic", windAuto, "1", channel=channel)
-                    self.update_state(code, "windMode", windMode, "1", channel=channel)
-                    self.update_state(code, "windDirection", windDir, "1", channel=channel)
-                    self.update_state(code, "rainAutomatic", rainAuto, "1", channel=channel)
-                    self.update_state(code, "rainMode", rainMode, "1", channel=channel)
-                    self.update_state(code, "rainDirection", rainDir, "1", channel=channel)
-                    self.update_state(code, "reversal", reversal, "1", channel=channel)
-
-                # readingsEndUpdate(hash, 1)
-
-                # Dimmaktor -- not tested yet
-            elif format == "25":  # pragma: no cover
-                stairwellFunction = "on" if int(msg[10:10 + 4], 16) & 0x8000 else "off"
-                stairwellTime = (int(msg[10:10 + 4], 16) & 0x7FFF) / 10
-                timerAuto = "on" if int(msg[14:14 + 2], 16) & 0x01 else "off"
-                duskAuto = "on" if int(msg[14:14 + 2], 16) & 0x02 else "off"
-                sunAuto = "on" if int(msg[14:14 + 2], 16) & 0x04 else "off"
-                sunMode = "on" if int(msg[14:14 + 2], 16) & 0x08 else "off"
-                manualMode = "on" if int(msg[14:14 + 2], 16) & 0x20 else "off"
-                dawnAuto = "on" if int(msg[14:14 + 2], 16) & 0x40 else "off"
-                intemedSave = "on" if int(msg[14:14 + 2], 16) & 0x80 else "off"
-                runningTime = int(msg[18:18 + 2], 16)
-                intemedVal = int(msg[20:20 + 2], 16) & 0x7F
-                intermedMode = "on" if int(msg[20:20 + 2], 16) & 0x80 else "off"
-                level = int(msg[22:22 + 2], 16) & 0x7F
-                modeChange = "on" if int(msg[22:22 + 2], 16) & 0x80 else "off"
-
-                state = level
-
-                if level == 0:
-                    state = "off"
-                if level == 100:
-                    state = "on"
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "stairwellFunction", stairwellFunction, "1", channel=channel)
-                self.update_state(code, "stairwellTime", stairwellTime, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "duskAutomatic", duskAuto, "1", channel=channel)
-                self.update_state(code, "sunAutomatic", sunAuto, "1", channel=channel)
-                self.update_state(code, "sunMode", sunMode, "1", channel=channel)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-                self.update_state(code, "dawnAutomatic", dawnAuto, "1", channel=channel)
-                self.update_state(code, "saveIntermediateOnStop", intemedSave, "1", channel=channel)
-                self.update_state(code, "runningTime", runningTime, "1", channel=channel)
-                self.update_state(code, "intermediateValue", intemedVal, "1", channel=channel)
-                self.update_state(code, "intermediateMode", intermedMode, "1", channel=channel)
-                self.update_state(code, "level", level, "1", channel=channel)
-                self.update_state(code, "modeChange", modeChange, "1", channel=channel)
-                self.update_state(code, "state", state, "1", channel=channel)
-                # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-
-            # Thermostat -- not tested yet
-            elif format == "27":  # pragma: no cover
-                temperature1 = "%0.1f" % (((int(msg[8:8 + 4], 16) & 0x07FF) - 400) / 10)
-                temperature2 = "%0.1f" % (((int(msg[12:12 + 4], 16) & 0x07FF) - 400) / 10)
-                tempThreshold1 = "%0.1f" % ((int(msg[16:16 + 2], 16) - 80) / 2)
-                tempThreshold2 = "%0.1f" % ((int(msg[18:18 + 2], 16) - 80) / 2)
-                tempThreshold3 = "%0.1f" % ((int(msg[20:20 + 2], 16) - 80) / 2)
-                tempThreshold4 = "%0.1f" % ((int(msg[22:22 + 2], 16) - 80) / 2)
-                desiredTemp = "%0.1f" % ((int(msg[26:26 + 2], 16) - 80) / 2)
-                output = "on" if int(msg[8:8 + 2], 16) & 0x08 else "off"
-                manualOverride = "on" if int(msg[8:8 + 2], 16) & 0x10 else "off"
-                actTempLimit = (int(msg[8:8 + 2], 16) & 0x60) >> 5
-                timerAuto = "on" if int(msg[12:12 + 2], 16) & 0x08 else "off"
-                manualMode = "on" if int(msg[12:12 + 2], 16) & 0x10 else "off"
-
-                state = "T: temperature1 desired: desiredTemp"
-
-                # readingsBeginUpdate(hash)
-                self.update_state(code, "measured-temp", temperature1, "1", channel=channel)
-                self.update_state(code, "measured-temp2", temperature2, "1", channel=channel)
-                self.update_state(code, "temperatureThreshold1", tempThreshold1, "1", channel=channel)
-                self.update_state(code, "temperatureThreshold2", tempThreshold2, "1", channel=channel)
-                self.update_state(code, "temperatureThreshold3", tempThreshold3, "1", channel=channel)
-                self.update_state(code, "temperatureThreshold4", tempThreshold4, "1", channel=channel)
-                self.update_state(code, "desired-temp", desiredTemp, "1", channel=channel)
-                self.update_state(code, "output", output, "1", channel=channel)
-                self.update_state(code, "manualOverride", manualOverride, "1", channel=channel)
-                self.update_state(code, "actTempLimit", actTempLimit, "1", channel=channel)
-                self.update_state(code, "timeAutomatic", timerAuto, "1", channel=channel)
-                self.update_state(code, "manualMode", manualMode, "1", channel=channel)
-
-                self.update_state(code, "state", state, "1", channel=channel)
-                # readingsEndUpdate(hash, 1)
-
-            else:
-                logger.info("DUOFERN unknown msg: {}".format(msg))
-
+        # only status replies of actors are repeated, two button presses or sensor events are two events
+        if self.deduplicator is not None and frame[0] == 0x0F and frame[1] == 0xFF and frame[2] == 0x0F and \
+                self.deduplicator.is_duplicate(frame):
+            return name
 
-        # Wandtaster, Funksender UP, Handsender, Sensoren
-        elif msg[0:2] == "0f" and msg[4:6] in ['07', '0e']:  # pragma: no cover
-            id = msg[4:4 + 4]
+        self._begin_update()
+        try:
+            self.dispatcher.dispatch(frame, code)
+        finally:
+            self._end_update()
 
-            if id not in sensorMsg:
-                logger.warning("unknown message {}".format(msg))
-                return
+#        if module_definition01:
+#            DoTrigger(module_definition01['name'], None)
+#        if module_definition02:
+#            DoTrigger(module_definition02['name'], None)
 
-            chan = msg[sensorMsg[id]['chan'] * 2 + 2:sensorMsg[id]['chan'] * 2 + 4]
-            if code[0:2] in ("61", "70", "71"):
-                chan = "01"
+        return name
 
-            chans = []
-            if (sensorMsg[id]["chan"] == 5):
-                chanCount = 4 if (code[0:2] == "73") else 5
-                for x in range(0, chanCount):
-                    if ((0x01 << x) & int(chan, 16)):
-                        chans.append(x + 1)
+    # Device paired
+    def _parse_paired(self, frame, code):
+        self.update_state(code, "state", "paired", "1")
+        # del hash['READINGS']['unpaired']
+        logger.info("DUOFERN device paired, ID {}".format(code))
+
+    # Device unpaired
+    def _parse_unpaired(self, frame, code):
+        # readingsBeginUpdate(hash)
+        self.update_state(code, "unpaired", 1, "1")
+        self.update_state(code, "state", "unpaired", "1")
+        self.del_device(code)
+        # # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
+        logger.warning("DUOFERN device unpaired, code {}".format(code))
+
+    # Status Nachricht Aktor
+    def _parse_status(self, frame, code):
+        channel = None
+        channel2 = None
+        ver = "{:02x}".format(frame[12])
 
+        self.update_state(code, "version", ver, "0", channel=channel)
 
-            else:
-                chans.append(chan)
+        # RemoveInternalTimer(hash)
+        # del hash['helper']['timeout']
 
-            if code[0:2] in ("65", "69", "74"):
-                # module_definition01 = self.modules['by_code'][code + "00"]
-                channel = 0
+        # Bewegungsmelder, Wettersensor, Mehrfachwandtaster not tested yet
+        if code[0:2] in ("65", "69", "74"):  # pragma: no cover
+            #self.update_state(code, "state", "OK", "1", channel=channel)
+            #module_definition01 = self.modules['by_code'][code + "01"]
+            channel = 1
             #if not module_definition01:
-                #DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
-                #module_definition01 = self.modules['by_code'][code + "00"]
-
-            #if (module_definition01):
-            #    hash = module_definition01
-            #    channel = 0
-
-            for chan in chans:
-                if id[2:4] in ("1a", "18", "19", "01", "02", "03"):
-                    if (id[2:4] == "1a") or (id[0:2] == "0e") or (code[0:2] in ("a0", "a2")):
-                        self.update_state(code, "state", sensorMsg[id]['state'] + "." + chan, "1", channel=channel)
-                    else:
-                        self.update_state(code, "state", sensorMsg[id]['state'], "1", channel=channel)
-
-                    self.update_state(code, "channelchan", sensorMsg[id]['name'], "1", channel=channel)
-                else:
-                    if (code[0:2] not in ("69", "73")) or (id[2:4] in ("11", "12")):
-                        chan = ""
-                    if code[0:2] in ("65", "a5", "aa", "ab"):
-                        self.update_state(code, "state", sensorMsg[id]['state'], "1", channel=channel)
-
-                    self.update_state(code, "event", sensorMsg[id]['name'] + "." + chan, "1", channel=channel)
-                    # DoTrigger(hash["name"], sensorMsg[id][name] + "." + chan)
+                #DoTrigger("global", "UNDEFINED DUOFERN_code_actor DUOFERN code01")
+                #module_definition01 = self.modules['by_code'][code + "01"]
 
+        # Universalaktor -- not tested yet
+        elif code[0:2] == "43":  # pragma: no cover
+            self.update_state(code, "state", "OK", "1", channel=channel)
+            #module_definition01 = self.modules['by_code'][code]
+            channel = 1
+            #if not module_definition01:
+            #    DoTrigger("global", "UNDEFINED DUOFERN_code+_01 DUOFERN code+01")
+
+            #module_definition02 = None
+            channel2 = 2
+
+        #if module_definition01:
+            # it seems that sometimes "module_definition01" corresponts to channel "01", at other times
+            # channel="00". I am trying to stick with what module_definition was set to.
+            #hash = module_definition01
+            #channel = 1
+
+        decoder = statusDecoders.get(frame[3])
+        if decoder is None:
+            logger.info("DUOFERN unknown msg: %s", HexFrame(frame))
+        elif self.modules['by_code'][code].lazy:
+            self._store_status(code, decoder, frame, channel=channel)
+            if channel2 is not None and decoder.channel2 is not None:
+                self._store_status(code, decoder.channel2, frame, channel=channel2)
+        else:
+            self._update_status(code, *decoder.decode(frame, code), channel=channel)
+            if channel2 is not None and decoder.channel2 is not None:
+                self._update_status(code, *decoder.channel2.decode(frame, code), channel=channel2)
 
+    # Wandtaster, Funksender UP, Handsender, Sensoren
+    def _parse_sensor(self, frame, code):  # pragma: no cover
+        channel = None
+        id = frame[2:4].hex()
 
-        # Umweltsensor Wetter -- not tested yet
-        elif msg[0:8] == "0f011322":  # pragma: no cover
-            # module_definition01 = self.modules['by_code'][code + "00"]
-            # if not module_definition01:
-            #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
-            #     module_definition01 = self.modules['by_code'][code + "00"]
-            #
-            # hash = module_definition01
-            channel = 0
+        if id not in sensorMsg:
+            logger.warning("unknown message %s", HexFrame(frame))
+            return
 
-            brightnessExp = 1000 if int(msg[8:8 + 4], 16) & 0x0400 else 1
-            brightness = (int(msg[8:8 + 4], 16) & 0x01FF) * brightnessExp
-            sunDirection = int(msg[14:14 + 2], 16) * 1.5
-            sunHeight = int(msg[16:16 + 2], 16) - 90
-            temperature = ((int(msg[18:18 + 4], 16) & 0x7FFF) - 400) / 10
-            isRaining = 1 if int(msg[18:18 + 4], 16) & 0x8000 else 0
-            wind = (int(msg[22:22 + 4], 16) & 0x03FF) / 10
-
-            state = "T: {}".format(temperature)
-            state += " W: {}".format(wind)
-            state += " IR: ".format(isRaining)
-            state += " B: ".format(brightness)
-
-            # readingsBeginUpdate(hash)
-            self.update_state(code, "brightness", brightness, "1", channel=channel)
-            self.update_state(code, "sunDirection", sunDirection, "1", channel=channel)
-            self.update_state(code, "sunHeight", sunHeight, "1", channel=channel)
-            self.update_state(code, "temperature", temperature, "1", channel=channel)
-            self.update_state(code, "isRaining", isRaining, "1", channel=channel)
-            self.update_state(code, "state", state, "1", channel=channel)
-            self.update_state(code, "wind", wind, "1", channel=channel)
-            # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-
-        # Umweltsensor Zeit
-        elif msg[0:8] == "0fff1020":  # pragma: no cover
-            # module_definition01 = self.modules['by_code'][code + "00"]
-            # if (not module_definition01):
-            #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
-            #     module_definition01 = self.modules['by_code'][code + "00"]
-            #
-            # hash = module_definition01
-            channel = 0
+        chan = "{:02x}".format(frame[sensorMsg[id]['chan'] + 1])
+        if code[0:2] in ("61", "70", "71"):
+            chan = "01"
 
-            year = msg[12:12 + 2]
-            month = msg[14:14 + 2]
-            day = msg[18:18 + 2]
-            hour = msg[20:20 + 2]
-            minute = msg[22:22 + 2]
-            second = msg[24:24 + 2]
+        chans = []
+        if (sensorMsg[id]["chan"] == 5):
+            chanCount = 4 if (code[0:2] == "73") else 5
+            for x in range(0, chanCount):
+                if ((0x01 << x) & int(chan, 16)):
+                    chans.append(str(x + 1))
 
-            # readingsBeginUpdate(hash)
-            self.update_state(code, "date", "20" + str(year) + "-" + str(month) + "-" + str(day), "1", channel=channel)
-            self.update_state(code, "time", str(hour) + ":" + str(minute) + ":" + str(second), "1", channel=channel)
-            # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
 
-        # Umweltsensor Konfiguration
-        elif msg[0:7] == "0fff1b2" and msg[7] in ["0", "1", "2", "3", "4", "5", "6", "7", "8"]:  # pragma: no cover
-            reg = msg[6:6 + 2] - 21
-            regVal = msg[8:8 + 20]
+        else:
+            chans.append(chan)
 
+        if code[0:2] in ("65", "69", "74"):
             # module_definition01 = self.modules['by_code'][code + "00"]
-            # if not module_definition01:
-            #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN {}00".format(code))
-            #     module_definition01 = self.modules['by_code'][code + "00"]
-
-            # hash = module_definition01
             channel = 0
+        #if not module_definition01:
+            #DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
+            #module_definition01 = self.modules['by_code'][code + "00"]
+
+        #if (module_definition01):
+        #    hash = module_definition01
+        #    channel = 0
+
+        for chan in chans:
+            if id[2:4] in ("1a", "18", "19", "01", "02", "03"):
+                if (id[2:4] == "1a") or (id[0:2] == "0e") or (code[0:2] in ("a0", "a2")):
+                    self.update_state(code, "state", sensorMsg[id]['state'] + "." + chan, "1", channel=channel)
+                else:
+                    self.update_state(code, "state", sensorMsg[id]['state'], "1", channel=channel)
 
-            logger.warning("Weather sensor not supported yet")
-            #del hash['READINGS']['configModified']
-            self.update_state(code, ".regreg", "regVal", "1", channel=channel)
-            # self.update_state(code, "regreg", "regVal", "1", channel=channel)
-
-            #DUOFERN_DecodeWeatherSensorConfig(hash)
-
-            # Rauchmelder Batterie
-        elif msg[0:8] == "0fff1323":  # pragma: no cover
-            battery = "low" if int(msg[8:8 + 2], 16) <= 10 else "ok"
-            batteryLevel = int(msg[8:8 + 2], 16)
-
-            # readingsBeginUpdate(hash)
-            self.update_state(code, "battery", battery, "1", channel=channel)
-            self.update_state(code, "batteryLevel", batteryLevel, "1", channel=channel)
-            # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
-
-            # ACK, Befehl vom Aktor empfangen
-        elif msg[0:8] == "810003cc":
-            logger.debug("ack received {}".format(self.modules['by_code'][code]))
-            #hash['helper']['timeout']['t'] = hash['name']["timeout"]["60"]
-            ##InternalTimer(gettimeofday()+hash['helper']['timeout']{t}, "DUOFERN_StatusTimeout", hash, 0)
-            #hash['helper']['timeout']['count'] = 4
-
-        # NACK, Befehl nicht vom Aktor empfangen
-        elif msg[0:8] == "810108aa":
-            logger.info("missing ack for {}".format(self.modules['by_code'][code]))
-            # self.update_state(code, "state", "MISSING ACK", "1", channel=channel)
-            # foreach (grep (/^channel_/, keys%{hash})){
-            #   chnHash = module_definitions{hash->{_}}
-            #   readingsSingleUpdate(chnHash, "state", "MISSING ACK", 1)
-            # }
-            # Log3 hash, 3, "DUOFERN error: name MISSING ACK"
-
-        else:
-            logger.info("Unknown msg: {}".format(msg))
+                self.update_state(code, "channelchan", sensorMsg[id]['name'], "1", channel=channel)
+            else:
+                if (code[0:2] not in ("69", "73")) or (id[2:4] in ("11", "12")):
+                    chan = ""
+                if code[0:2] in ("65", "a5", "aa", "ab"):
+                    self.update_state(code, "state", sensorMsg[id]['state'], "1", channel=channel)
+
+                self.update_state(code, "event", sensorMsg[id]['name'] + "." + chan, "1", channel=channel)
+                # DoTrigger(hash["name"], sensorMsg[id][name] + "." + chan)
+
+    # Umweltsensor Wetter -- not tested yet
+    def _parse_weather(self, frame, code):  # pragma: no cover
+        # module_definition01 = self.modules['by_code'][code + "00"]
+        # if not module_definition01:
+        #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
+        #     module_definition01 = self.modules['by_code'][code + "00"]
+        #
+        # hash = module_definition01
+        channel = 0
+
+        brightnessRaw = frame[4] << 8 | frame[5]
+        temperatureRaw = frame[9] << 8 | frame[10]
+        brightnessExp = 1000 if brightnessRaw & 0x0400 else 1
+        brightness = (brightnessRaw & 0x01FF) * brightnessExp
+        sunDirection = frame[7] * 1.5
+        sunHeight = frame[8] - 90
+        temperature = ((temperatureRaw & 0x7FFF) - 400) / 10
+        isRaining = 1 if temperatureRaw & 0x8000 else 0
+        wind = ((frame[11] << 8 | frame[12]) & 0x03FF) / 10
+
+        state = "T: {}".format(temperature)
+        state += " W: {}".format(wind)
+        state += " IR: ".format(isRaining)
+        state += " B: ".format(brightness)
+
+        # readingsBeginUpdate(hash)
+        self.update_state(code, "brightness", brightness, "1", channel=channel)
+        self.update_state(code, "sunDirection", sunDirection, "1", channel=channel)
+        self.update_state(code, "sunHeight", sunHeight, "1", channel=channel)
+        self.update_state(code, "temperature", temperature, "1", channel=channel)
+        self.update_state(code, "isRaining", isRaining, "1", channel=channel)
+        self.update_state(code, "state", state, "1", channel=channel)
+        self.update_state(code, "wind", wind, "1", channel=channel)
+        # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
+
+    # Umweltsensor Zeit
+    def _parse_time(self, frame, code):  # pragma: no cover
+        # module_definition01 = self.modules['by_code'][code + "00"]
+        # if (not module_definition01):
+        #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN code00")
+        #     module_definition01 = self.modules['by_code'][code + "00"]
+        #
+        # hash = module_definition01
+        channel = 0
+
+        year = frame[6:7].hex()
+        month = frame[7:8].hex()
+        day = frame[9:10].hex()
+        hour = frame[10:11].hex()
+        minute = frame[11:12].hex()
+        second = frame[12:13].hex()
+
+        # readingsBeginUpdate(hash)
+        self.update_state(code, "date", "20" + str(year) + "-" + str(month) + "-" + str(day), "1", channel=channel)
+        self.update_state(code, "time", str(hour) + ":" + str(minute) + ":" + str(second), "1", channel=channel)
+        # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
+
+    # Umweltsensor Konfiguration
+    def _parse_weather_config(self, frame, code):  # pragma: no cover
+        reg = frame[3] - 0x21
+        regVal = frame[4:14].hex()
+
+        # module_definition01 = self.modules['by_code'][code + "00"]
+        # if not module_definition01:
+        #     DoTrigger("global", "UNDEFINED DUOFERN_code_sensor DUOFERN {}00".format(code))
+        #     module_definition01 = self.modules['by_code'][code + "00"]
+
+        # hash = module_definition01
+        channel = 0
+
+        logger.warning("Weather sensor not supported yet")
+        #del hash['READINGS']['configModified']
+        self.update_state(code, ".regreg", "regVal", "1", channel=channel)
+        # self.update_state(code, "regreg", "regVal", "1", channel=channel)
+
+        #DUOFERN_DecodeWeatherSensorConfig(hash)
+
+    # Rauchmelder Batterie
+    def _parse_battery(self, frame, code):  # pragma: no cover
+        channel = None
+        battery = "low" if frame[4] <= 10 else "ok"
+        batteryLevel = frame[4]
+
+        # readingsBeginUpdate(hash)
+        self.update_state(code, "battery", battery, "1", channel=channel)
+        self.update_state(code, "batteryLevel", batteryLevel, "1", channel=channel)
+        # readingsEndUpdate(hash, 1)  # Notify is done by Dispatch
+
+    # ACK, Befehl vom Aktor empfangen
+    def _parse_ack(self, frame, code):
+        logger.debug("ack received {}".format(self.modules['by_code'][code]))
+        #hash['helper']['timeout']['t'] = hash['name']["timeout"]["60"]
+        ##InternalTimer(gettimeofday()+hash['helper']['timeout']{t}, "DUOFERN_StatusTimeout", hash, 0)
+        #hash['helper']['timeout']['count'] = 4
+
+    # NACK, Befehl nicht vom Aktor empfangen
+    def _parse_nack(self, frame, code):
+        logger.info("missing ack for {}".format(self.modules['by_code'][code]))
+        # self.update_state(code, "state", "MISSING ACK", "1", channel=channel)
+        # foreach (grep (/^channel_/, keys%{hash})){
+        #   chnHash = module_definitions{hash->{_}}
+        #   readingsSingleUpdate(chnHash, "state", "MISSING ACK", 1)
+        # }
+        # Log3 hash, 3, "DUOFERN error: name MISSING ACK"
+
+    def _parse_unknown(self, frame, code):
+        logger.info("Unknown msg: %s", HexFrame(frame))
+
+    @property
+    def system_code(self):
+        """
+        System code (4 hex digits) written into command frames. The sticks set it, without it the system code bytes
+        of the frames are left zero.
+        """
+        return self._system_code
 
-#        if module_definition01:
-#            DoTrigger(module_definition01['name'], None)
-#        if module_definition02:
-#            DoTrigger(module_definition02['name'], None)
+    @system_code.setter
+    def system_code(self, system_code):
+        self._system_code = system_code
+        self._system_code_bytes = bytes(3) if system_code is None else bytes.fromhex("6f" + system_code)
 
-        return name
+    def capabilities(self, code, channel=None):
+        """
+        :return: read only dict of the commands device ``code`` supports, see :func:`capabilities`
+        """
+        blinds = self.get_state(code, "blindsMode", channel) == "on" if code in self.modules['by_code'] else False
+        return capabilities(code, channel, blinds)
 
     def send(self, cmd):
         self.send_hook(cmd)
@@ -731,81 +833,40 @@ class Duofern(object):
         arg2 = args[1] if len(args) > 1 else None
         assert len(code) == 6, "code should be 6 hex digits"
         # code = code[0:0 + 6]
-        name = self.modules['by_code'][code]['name']
-
-        sets = {}
-
-        if code[0:2] == "49":
-            sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsRolloTube)
-        if code[0:2] in ("42", "4b", "4c", "70"):
-            sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsTroll, {"blindsMode:on,off": ""})
-        if code[0:2] == "47":
-            sets = merge_dicts(setsBasic, setsDefaultRollerShutter, setsTroll)
-        if code[0:2] in ("40", "41", "61"):
-            sets = merge_dicts(setsBasic, setsDefaultRollerShutter)  # if (code =~ /^(40|41|61)..../)
-        if code[0:2] == "69":
-            sets = merge_dicts(setsBasic, setsUmweltsensor)  # if (code =~ /^69..../)
-        if code[0:2] == "69" and len(code) >= 8 and code[6:8] == "00":
-            sets = merge_dicts(setsUmweltsensor00)  # if (code =~ /^69....00/)
-        if code[0:2] == "69" and len(code) >= 8 and code[6:8] == "01":
-            sets = merge_dicts(setsDefaultRollerShutter, setsUmweltsensor01)  # if (code =~ /^69....01/)
-        if code[0:2] == "43" and len(code) >= 8 and code[6:8] in ("01", "02"):
-            sets = merge_dicts(*setsSwitchActor)  # if (code =~ /^43....(01|02)/)
-        if code[0:2] in ("43", "65", "74"):
-            sets = merge_dicts(setsBasic, {"getStatus:noArg": ""})  # if (code =~ /^(43|65|74)..../)
-        if code[0:2] in ("46", "71"):
-            sets = merge_dicts(setsBasic, setsSwitchActor)  # if (code =~ /^(46|71)..../)
-        if code[0:2] == "4e":
-            sets = merge_dicts(setsBasic, setsSX5)  # if (code =~ /^4E..../)
-        if code[0:2] == "48":
-            sets = merge_dicts(setsBasic, setsDimmer)  # if (code =~ /^48..../)
-        if code[0:2] == "73":
-            sets = merge_dicts(setsBasic, setsThermostat)  # if (code =~ /^73..../)
-        if code[0:2] in ("65", "74") and len(code) >= 8 and code[6:8] == "01":
-            sets = merge_dicts(setsSwitchActor)  # if (code =~ /^(65|74)....01/)
-
-        blindsMode = "off" if not "blindsMode" in self.modules['by_code'][code] else self.modules['by_code'][code]
-        if (blindsMode == "on"):
-            sets = merge_dicts(sets, setsBlinds)
+        state = self.modules['by_code'][code]
+        name = state.name
+        sets = self.capabilities(code, channel)
 
         logger.debug(sets.keys())  # join(" ", sort keys sets)
+        code_bytes = bytes.fromhex(code)
         if cmd in commandsStatus:
-            buf = duoStatusRequest
-            buf = buf.replace("nn", commandsStatus[cmd])
-            buf = buf.replace("yyyyyy", code)
-            self.send(buf)
+            frame = bytearray(statusRequestFrames[cmd])
+            frame[18:21] = code_bytes
+            self.send(bytes(frame))
             return None
 
         elif cmd == "clear":
-            keys = self.modules['by_code'][code].keys()
-            for key in keys:
-                if key != 'name':
-                    self.modules['by_code'][code].__delitem__(key)
+            state.clear_readings()
             return None
             # cH = (hash)
             # delete _->{READINGS} foreach (@cH)
             # return undef
 
         elif cmd == "getConfig":
-            buf = duoWeatherConfig
-            buf = buf.replace("yyyyyy", code)
-            self.send(buf)
+            self.send(bytes.fromhex(duoWeatherConfig.replace("yyyyyy", code)))
             return None
 
         elif cmd == "writeConfig":
             for x in range(0, 8):
                 # for(my x=0; x<8; x++)    {
-                regV = "00000000000000000000" if not ".reg{}".format(x) in self.modules['by_code'][code] else \
-                    self.modules['by_code'][code][".reg{}".format(x)]
-                reg = "%02x" % (x + 0x81)
-                buf = duoWeatherWriteConfig
-                buf = buf.replace("yyyyyy", code)
-                buf = buf.replace("rr", reg)
-                buf = buf.replace("nnnnnnnnnnnnnnnnnnnn", regV)
-                self.send(buf)
-
-            if "configModified" in self.modules['by_code'][code]:
-                self.modules['by_code'][code].__delitem__("configModified")
+                regV = state.get_reading(".reg{}".format(x), default="00000000000000000000")
+                frame = bytearray.fromhex(duoWeatherWriteConfig.replace("rr", "00").replace("nn", "00")
+                                          .replace("yyyyyy", code))
+                frame[3] = x + 0x81
+                frame[4:14] = bytes.fromhex(regV)
+                self.send(bytes(frame))
+
+            state.del_reading("configModified")
 
             # delete hash->{READINGS}{configModified}
             return None
@@ -817,14 +878,16 @@ class Duofern(object):
 
             year, month, mday, hour, min, sec, wday, yday, isdst, = time.localtime()
 
+            # python counts weekdays from monday = 0, perl from sunday = 0
+            wday = (wday + 1) % 7
             wday = wday - 1 if wday != 0 else 7  # wday = (wday==0 ? 7 : wday-1)
-            m = "%02d%02d%02d%02d" % (year - 100, month + 1, wday, mday)
+            m = "%02d%02d%02d%02d" % (year % 100, month, wday, mday)
             n = "%02d%02d%02d" % (hour, min, sec)
 
             buf = buf.replace("mmmmmmmm", m)
             buf = buf.replace("nnnnnn", n)
             buf = buf.replace("yyyyyy", code)
-            self.send(buf)
+            self.send(bytes.fromhex(buf))
             return None
 
         elif cmd in wCmds:
@@ -969,31 +1032,27 @@ class Duofern(object):
         elif cmd in commands:
             logger.info("command valid")
             subCmd = None
-            if channel is None:
-                chanNo = "01"
-            else:
-                chanNo = "{:02x}".format(channel)
-            argV = "00"
-            argW = "0000"
-            timer = "00"
-            buf = duoCommand
+            chanNo = 1 if channel is None else channel
+            argV = 0
+            argW = 0
+            timer = 0
             command = None
 
             if 'noArg' in commands[cmd]:
                 if (arg and (arg == "timer")):
-                    timer = "01"
+                    timer = 1
                 subCmd = "noArg"
-                argV = "00"
+                argV = 0
 
             elif 'value' in commands[cmd]:
                 if (arg2 and (arg2 == "timer")):
-                    timer = "01"
+                    timer = 1
                 if arg is None:
                     return "Missing argument"
                 if (int(arg) < 0 or int(arg) > 100):
                     raise Exception("Wrong argument arg")
                 subCmd = "value"
-                argV = "%02x" % arg
+                argV = int(arg)
 
             elif 'value2' in commands[cmd]:
                 if arg is None:
@@ -1001,31 +1060,31 @@ class Duofern(object):
                 if int(arg) < 0 or int(arg) > 3200:
                     raise Exception("Wrong argument arg")
                 subCmd = "value2"
-                argW = "%04x" % (arg * 10)
+                argW = int(arg * 10)
 
             elif 'value3' in commands[cmd]:
                 maxArg = 150
                 if code[0:2] == "48":
                     maxArg = 255
                 if arg2 and (arg2 == "timer"):
-                    timer = "01"
+                    timer = 1
                 if arg is None:
                     return "Missing argument"
                 if int(arg) < 0 or int(arg) > maxArg:
                     raise Exception("Wrong argument arg")
                 subCmd = "value3"
-                argV = "%02x" % arg
+                argV = int(arg)
 
             elif 'value4' in commands[cmd]:
                 if arg2 and (arg2 == "timer"):
-                    timer = "01"
+                    timer = 1
                 if arg is None:
                     return "Missing argument"
                 if int(arg) < 0 or int(arg) > 5000:
                     raise Exception("Wrong argument arg")
                 arg = arg / 100
                 subCmd = "value4"
-                argV = "%02x" % arg
+                argV = int(arg)
 
             elif 'temp1' in commands[cmd]:
                 if arg is None:
@@ -1036,7 +1095,7 @@ class Duofern(object):
                 # return "Missing argument" if (!defined(arg))
                 # return "Wrong argument arg" if (arg !~ m/^\d+(\.\d+|)/ || arg < -40 || arg > 80)
                 subCmd = "temp1"
-                argW = "%04x" % ((arg * 10) + 400)
+                argW = int((arg * 10) + 400)
 
             elif 'temp2' in commands[cmd]:
                 if arg is None:
@@ -1044,36 +1103,26 @@ class Duofern(object):
                 if int(arg) < -40 or int(arg) > 80:
                     return "Wrong argument {}".format(arg)
                 subCmd = "temp2"
-                argV = "%02x" % ((arg * 2) + 80)
+                argV = int((arg * 2) + 80)
 
             else:
                 if arg is None:
                     return "Missing Argument"
                 if (arg2 and (arg2 == "timer")):
-                    timer = "01"
+                    timer = 1
                 subCmd = arg
-                argV = "00"
+                argV = 0
 
             if subCmd not in commands[cmd]:
                 raise Exception("Wrong argument {}, {}".format(arg, subCmd))
 
-            channel_suffix = ""
-            if channel is not None:
-                channel_suffix = "_" + chanNo
-
-            position = -1 if "position"+channel_suffix not in self.modules['by_code'][code] else \
-                self.modules['by_code'][code]["position"+channel_suffix]
+            position = state.get_reading("position", channel, -1)
             # toggleUpDown    = AttrVal(name, "toggleUpDown", "0")
-            toggleUpDown = self.modules['by_code'][code]['toggleUpDown'+channel_suffix] \
-                if 'toggleUpDown'+channel_suffix in self.modules['by_code'][code] else 0
-            moving = "stop" if "moving"+channel_suffix not in self.modules['by_code'][code] else \
-                self.modules['by_code'][code]["moving"+channel_suffix]
-            timeAutomatic = "on" if "timeAutomatic"+channel_suffix not in self.modules['by_code'][code] else \
-                self.modules['by_code'][code]["timeAutomatic"+channel_suffix]
-            dawnAutomatic = "on" if "dawnAutomatic"+channel_suffix not in self.modules['by_code'][code] else \
-                self.modules['by_code'][code]["dawnAutomatic"+channel_suffix]
-            duskAutomatic = "on" if "duskAutomatic"+channel_suffix not in self.modules['by_code'][code] else \
-                self.modules['by_code'][code]["duskAutomatic"+channel_suffix]
+            toggleUpDown = state.get_reading("toggleUpDown", channel, 0)
+            moving = state.get_reading("moving", channel, "stop")
+            timeAutomatic = state.get_reading("timeAutomatic", channel, "on")
+            dawnAutomatic = state.get_reading("dawnAutomatic", channel, "on")
+            duskAutomatic = state.get_reading("duskAutomatic", channel, "on")
 
             if moving != "stop":
                 if cmd in ('up', 'down', 'toggle'):
@@ -1088,7 +1137,7 @@ class Duofern(object):
             if ((cmd == "dusk") and (duskAutomatic == "on") and (position < 100) and (position > -1)):
                 self.update_state(code, "moving", "down", 1, channel=channel)
 
-            if timer == "00" or timeAutomatic == "on":
+            if timer == 0 or timeAutomatic == "on":
                 if ((cmd == "up") and (position > 0)):
                     self.update_state(code, "moving", "up", 1, channel=channel)
                 if ((cmd == "down") and (position < 100) and (position > -1)):
@@ -1102,16 +1151,11 @@ class Duofern(object):
                 else:
                     self.update_state(code, "moving", "stop", 1, channel=channel)
 
-            command = commands[cmd][subCmd]
+            command = commandTemplates[cmd][subCmd]
 
-            buf = buf.replace("yyyyyy", code)
-            buf = buf.replace("nnnnnnnnnnnnnnnnnnnn", command)
-            buf = buf.replace("nn", argV)
-            buf = buf.replace("tt", timer)
-            buf = buf.replace("wwww", argW)
-            buf = buf.replace("kk", chanNo)
-            logger.debug("trying to send {}".format(buf))
-            self.send(buf)
+            frame = command.encode(self._system_code_bytes, code_bytes, chanNo, timer, argV, argW)
+            logger.debug("trying to send %s", HexFrame(frame))
+            self.send(frame)
             #            if ('device' in self.modules['by_code'][code]):
             # hash = defs{hash->{device}}
 
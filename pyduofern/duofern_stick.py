@@ -24,30 +24,47 @@
 
 import asyncio
 import codecs
-import datetime
+import functools
 import json
 import logging
 import os
 import os.path
-import random
+import selectors
 import tempfile
 import threading
 import time
 from dataclasses import dataclass
+from collections import deque
 from queue import Queue, Empty
-from typing import Dict
+from typing import Optional
 
 import serial
 import serial.tools.list_ports
 
-from .duofern import Duofern
+from .correlation import ReplyCorrelator
+from .dispatch import MessageDispatcher
+from .duofern import Duofern, HexFrame
+from .framing import FrameAssembler
 from .exceptions import DuofernTimeoutException, DuofernException
+from .queues import AsyncCoalescingQueue, CoalescingQueue, OutgoingFrame
+from .recording import RecordingSink
+from .retransmission import RetransmissionEngine
 
 
 def hex(stuff):
     return codecs.getencoder('hex')(stuff)[0].decode("utf-8")
 
 
+def to_frame(message):
+    """
+    :param message: frame as ``bytes``-like object or as hex string (spaces are ignored)
+    :return: the frame as ``bytes``
+    """
+    if isinstance(message, str):
+        return bytes.fromhex(message)
+    return bytes(message)
+
+
 logger = logging.getLogger(__name__)
 
 duoInit1 = "01000000000000000000000000000000000000000000"
@@ -64,9 +81,21 @@ duoStartUnpair = "07000000000000000000000000000000000000000000"
 duoStopUnpair = "08000000000000000000000000000000000000000000"
 duoRemotePair = "0D0006010000000000000000000000000000yyyyyy01"
 
+duoACKBytes = bytes.fromhex(duoACK)
+
 
 MIN_MESSAGE_INTERVAL_MILLIS = 50
-RESEND_SECONDS = (2,4)
+
+COMMAND_TIMEOUT_SECONDS = 10
+
+# the stick is ready for the handshake once it sent nothing for HANDSHAKE_QUIET_SECONDS, waiting at most
+# HANDSHAKE_SETTLE_SECONDS. A handshake step is repeated if the stick did not answer within HANDSHAKE_TIMEOUT_SECONDS.
+HANDSHAKE_QUIET_SECONDS = 0.1
+HANDSHAKE_SETTLE_SECONDS = 2
+HANDSHAKE_TIMEOUT_SECONDS = 2
+HANDSHAKE_RETRIES = 3
+# number of SetPairs frames sent ahead of the stick's answers
+HANDSHAKE_WINDOW = 8
 
 def refresh_serial_connection(function):
     def new_funtion(*args, **kwargs):
@@ -82,13 +111,22 @@ def refresh_serial_connection(function):
 
 class DuofernStick(object):
     def __init__(self, system_code=None, config_file_json=None, duofern_parser=None, recording=None,
-                 changes_callback=None, ephemeral=None, *args, **kwargs):
+                 changes_callback=None, ephemeral=None, batch_changes=False, lazy_status=False,
+                 dedupe_window=None, message_interval_millis=None, retransmission=None, *args, **kwargs):
         """
         :param device: path to com port opened by usb stick (e.g. /dev/ttyUSB0)
         :param system_code: system code
         :param config_file_json: path to config file. use the same one to conveniently update info about your system
         :param duofern_parser: parser object. Unless you hacked your own one just leave None and it
          defaults to pyduofern.duofern.Duofern()
+        :param batch_changes: passed on to the default parser, call ``changes_callback`` once per frame with a dict of
+         the readings that actually changed
+        :param lazy_status: passed on to the default parser, decode status readings only when they are accessed
+        :param dedupe_window: passed on to the default parser, drop repeated frames received within this many seconds
+        :param message_interval_millis: minimum gap between two frames sent to the stick, defaults to
+         ``MIN_MESSAGE_INTERVAL_MILLIS``
+        :param retransmission: ``RetransmissionEngine`` resending unacknowledged frames, pass one to change retries,
+         backoff, in-flight limit or to get a callback for frames given up on
         """
         super().__init__(*args, **kwargs)
         self.config_file = None
@@ -97,14 +135,34 @@ class DuofernStick(object):
         self.config_file = config_file_json
 
         if duofern_parser is None:
-            duofern_parser = Duofern(send_hook=self.add_serial_and_send, changes_callback=changes_callback)
+            duofern_parser = Duofern(send_hook=self.add_serial_and_send, changes_callback=changes_callback,
+                                     batch_changes=batch_changes, lazy_status=lazy_status,
+                                     dedupe_window=dedupe_window)
 
         self.duofern_parser = duofern_parser
+
+        self.framing = FrameAssembler()
+
+        self.dispatcher = MessageDispatcher(default=self._parse_message)
+        # every frame from the stick starting with 81 is an acknowledgement
+        self.dispatcher.register("81", self._handle_ack)
+        self.dispatcher.register("810003cc", self._handle_command_reply)
+        self.dispatcher.register("810108aa", self._handle_command_reply)
+        self.dispatcher.register("0602", self._handle_pairing_reply)
+        self.dispatcher.register("0603", self._handle_unpairing_reply)
+        self.dispatcher.register("0fff11", self._ignore_message)
+
         self.running = False
         self.pairing = False
         self.unpairing = False
 
         self.updating_interval = 30
+        if message_interval_millis is None:
+            message_interval_millis = MIN_MESSAGE_INTERVAL_MILLIS
+        self.message_interval_millis = message_interval_millis
+        if retransmission is None:
+            retransmission = RetransmissionEngine()
+        self.retransmission = retransmission
 
         self.system_code = None
         if system_code is not None:
@@ -126,7 +184,8 @@ class DuofernStick(object):
 
         self.pairing = False
         self.unpairing = False
-        self.write_queue = Queue()
+        self.write_queue = CoalescingQueue()
+        self.duofern_parser.system_code = self.system_code
         if not ephemeral:
             self.config['system_code'] = self.system_code
         self._dump_config()
@@ -165,6 +224,10 @@ class DuofernStick(object):
             record_filename = tempfile.mktemp(prefix="duofern_record_")
             print("recording to  {}".format(record_filename))
         self.record_filename = record_filename
+        self.recorder = RecordingSink(record_filename, max_bytes=self.config.get('recording_max_bytes'),
+                                      max_age=self.config.get('recording_max_age'),
+                                      backup_count=self.config.get('recording_backup_count', 5),
+                                      format=self.config.get('recording_format', "text"))
 
     def _initialize(self, **kwargs):  # pragma: no cover
         raise NotImplementedError("need to use an implementation of the Duofernstick")
@@ -182,23 +245,39 @@ class DuofernStick(object):
         with open(self.config_file, "w") as config_fh:
             json.dump(self.config, config_fh, indent=4)
 
+    def register_handler(self, prefix, handler):
+        """
+        Register a handler for frames received from the stick, replacing the default of handing them to the parser.
+
+        :param prefix: leading bytes of the frame as hex string, ``..`` matches any byte. May be a list of prefixes.
+        :param handler: called with the frame
+        """
+        self.dispatcher.register(prefix, handler)
+
     def process_message(self, message):
-        logger.debug(message)
+        """
+        :param message: received frame as ``bytes``, ``bytearray`` or ``memoryview`` (or as string of hex digits).
+         Frames received by the sticks are ``memoryview`` slices of the receive buffer, valid only during the call.
+        """
+        if isinstance(message, str):
+            message = bytes.fromhex(message)
+        logger.debug("%s", HexFrame(message))
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("received {}\n".format(message))
-                recorder.flush()
-        if message[0:2] == '81':
-            if hasattr(self, "unacknowledged"):
-                if message[-14:-2] in self.unacknowledged:
-                    del self.unacknowledged[message[-14:-2]]
-            return
-        if message[0:4] == '0602':
-            logger.info("got pairing reply")
-            self.pairing = False
-            self.duofern_parser.parse(message)
-            self.sync_devices()
-            return
+            self.recorder.record("received", message)
+        self.dispatcher.dispatch(message)
+
+    def _handle_ack(self, message):
+        self.retransmission.acknowledge(message)
+
+    def _handle_command_reply(self, message):
+        # 810003cc: the actor acknowledged the command, 810108aa: it did not
+        self._handle_ack(message)
+
+    def _handle_pairing_reply(self, message):
+        logger.info("got pairing reply")
+        self.pairing = False
+        self.duofern_parser.parse(message)
+        self.sync_devices()
         # if ($rmsg =~ m / 0602.{40} / ) {
         #    my %addvals = (RAWMSG => $rmsg);
         #    Dispatch($hash, $rmsg, \%addvals) if ($hash->{pair});
@@ -206,12 +285,12 @@ class DuofernStick(object):
         #    RemoveInternalTimer($hash);
         #    return undef;
         #
-        elif message[0:4] == '0603':
-            logger.info("got unpairing reply")
-            self.unpairing = False
-            self.duofern_parser.parse(message)
-            self.sync_devices()
-            return
+
+    def _handle_unpairing_reply(self, message):
+        logger.info("got unpairing reply")
+        self.unpairing = False
+        self.duofern_parser.parse(message)
+        self.sync_devices()
         # } elsif ($rmsg =~ m/0603.{40}/) {
         #    my %addvals = (RAWMSG => $rmsg);
         #    Dispatch($hash, $rmsg, \%addvals) if ($hash->{unpair});
@@ -219,22 +298,20 @@ class DuofernStick(object):
         #    RemoveInternalTimer($hash);
         #    return undef;
         #
-        elif message[0:6] == '0FFF11':
-            return
 
-        elif message[0:8] == '81000000':
-            return
-            #  } elsif ($rmsg =~ m/0FFF11.{38}/) {
-            #    return undef;
-            #
-            #  } elsif ($rmsg =~ m/81000000.{36}/) {
-            #    return undef;
-            #
-            #  }
-            #
-            #  my %addvals = (RAWMSG => $rmsg);
-            #  Dispatch($hash, $rmsg, \%addvals);
-        #        logger.info("got {}".format(message))
+    def _ignore_message(self, message):
+        #  } elsif ($rmsg =~ m/0FFF11.{38}/) {
+        #    return undef;
+        #
+        #  } elsif ($rmsg =~ m/81000000.{36}/) {
+        #    return undef;
+        #
+        #  }
+        pass
+
+    def _parse_message(self, message):
+        #  my %addvals = (RAWMSG => $rmsg);
+        #  Dispatch($hash, $rmsg, \%addvals);
         self.duofern_parser.parse(message)
 
     def clean_config(self):
@@ -290,23 +367,30 @@ class DuofernStick(object):
         self.duofern_parser.parse(arg)
 
 
-def one_time_callback(protocol, _message, name, future):
-    logger.info("{} answer for {}".format(_message, name))
-    if not future.cancelled():
-        future.set_result(_message)
-        future.done()
-        protocol.callback = None
+@dataclass
+class CommandResult:
+    """Outcome of a command sent with :meth:`DuofernStickAsync.command`."""
+    code: str
+    status: str  # "ack", "nack", "timeout", "superseded" (dropped unsent in favour of a stop) or "cancelled" (closed)
+    latency: Optional[float] = None  # seconds from writing the frame to the reply
+    frame: Optional[bytes] = None
+
+    @property
+    def acknowledged(self):
+        return self.status == "ack"
+
 
+class _PendingCommand(object):
+    __slots__ = ('future', 'code', 'written', 'reply', 'group')
 
-async def send_and_await_reply(protocol, message, message_identifier):
-    future = asyncio.Future()
-    protocol.callback = lambda message: one_time_callback(protocol, message, message_identifier, future)
-    protocol.send(message)
-    try:
-        result = await future
-        logger.info("got reply {}".format(result))
-    except asyncio.CancelledError:
-        logger.info("future was cancelled waiting for reply")
+    def __init__(self, future, code):
+        self.future = future
+        self.code = code
+        self.written = None
+        # correlator future for the reply of the actor
+        self.reply = None
+        # commands coalesced into the same frame, set once it is written
+        self.group = ()
 
 
 class DuofernStickAsync(DuofernStick, asyncio.Protocol):
@@ -315,18 +399,29 @@ class DuofernStickAsync(DuofernStick, asyncio.Protocol):
         self.duofern_parser.asyncio = True
         self.initialization_step = 0
         self.loop = loop
-        self.write_queue = asyncio.Queue()
+        self.write_queue = AsyncCoalescingQueue(superseded_callback=self._command_superseded)
         self._ready = asyncio.Event()
         self.transport = None
-        self.buffer = bytearray(b'')
 
         self.last_packet = 0.0
-        self.callback = None
+        self.correlator = ReplyCorrelator()
+        self.command_timeout = COMMAND_TIMEOUT_SECONDS
+        self.handshake_timeout = HANDSHAKE_TIMEOUT_SECONDS
+        self.handshake_retries = HANDSHAKE_RETRIES
+        self.handshake_window = HANDSHAKE_WINDOW
+        self.handshake_timings = {}
+        self._command = None
 
         if loop == None:
             loop = asyncio.get_event_loop()
 
-        self.send_loop = asyncio.ensure_future(self._send_messages(), loop=loop)
+        self._next_send = 0.0
+        self._pending_acks = 0
+        self._ack_timer = None
+        self._write_lock = asyncio.Lock()
+        self._resend_waiter = None
+        self._closed = False
+        self._start_tasks(loop)
 
         self.available = asyncio.Future()
 
@@ -336,43 +431,145 @@ class DuofernStickAsync(DuofernStick, asyncio.Protocol):
     #        self.running = False
 
     def command(self, *args, **kwargs):
+        """
+        Send a command, arguments are passed on to :meth:`pyduofern.duofern.Duofern.set`.
+
+        :return: future resolved with a :class:`CommandResult` once the actor acknowledged the command (or reported it
+         missed it), or ``command_timeout`` seconds passed without a reply. Resolved with ``None`` right away for
+         commands that do not send a frame to an actor.
+
+        Replies are matched through :attr:`correlator`, several commands for the same device are answered in the order
+        they were sent.
+        """
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("sending_command {} {}\n".format(args, kwargs))
-                recorder.flush()
-        self.duofern_parser.set(*args, **kwargs)
+            self.recorder.record("sending_command", "{} {}".format(args, kwargs))
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._command = _PendingCommand(future, args[0].lower())
+        try:
+            self.duofern_parser.set(*args, **kwargs)
+        finally:
+            pending, self._command = self._command, None
+        if pending.reply is None:
+            future.set_result(None)
+        return future
+
+    def request(self, message, reply="81", code=None, timeout=None):
+        """
+        Send ``message`` and wait for the stick's reply. Frames received meanwhile which are no reply go to
+        :meth:`process_message` as usual once the stick is initialized.
 
-    async def add_serial_and_send(self, msg):
-        message = msg.replace("zzzzzz", "6f" + self.system_code)
-        logger.info("sending {}".format(message))
+        :param reply: leading bytes of the reply as hex string, or an iterable of them
+        :param code: device code the reply has to carry, any if None
+        :param timeout: seconds to wait for the reply, forever if None
+        :return: future resolved with the reply, failing with ``DuofernTimeoutException`` after ``timeout``
+        """
+        future = self.correlator.expect(reply, code, timeout)
         self.send(message)
-        logger.info("added {} to write queue".format(message))
+        return future
+
+    def _command_superseded(self, frame):
+        # a stop for the device took the place of the frame, it will never be written
+        for pending in getattr(frame, 'waiters', ()):
+            if not pending.future.done():
+                pending.future.set_result(CommandResult(pending.code, "superseded"))
+            pending.reply.cancel()
+
+    def _command_replied(self, pending, reply):
+        if reply.cancelled():
+            # superseded and coalesced commands are resolved before their reply is cancelled, what is left was
+            # cancelled by close()
+            if not pending.future.done():
+                pending.future.set_result(CommandResult(pending.code, "cancelled"))
+            return
+        if reply.exception() is not None:
+            if not pending.future.done():
+                pending.future.set_result(CommandResult(pending.code, "timeout"))
+            return
+        frame = reply.result()
+        # 810003cc: the actor acknowledged the command, 810108aa: it did not
+        status = "ack" if frame[2] == 0x03 else "nack"
+        now = asyncio.get_event_loop().time()
+        for member in pending.group or (pending,):
+            if not member.future.done():
+                latency = None if member.written is None else now - member.written
+                member.future.set_result(CommandResult(member.code, status, latency, frame))
+            if member is not pending:
+                member.reply.cancel()
+
+    def _handle_ack(self, message):
+        super()._handle_ack(message)
+        self._wake_resend_loop()
+
+    def _wake_resend_loop(self):
+        if self._resend_waiter is not None and not self._resend_waiter.done():
+            self._resend_waiter.set_result(None)
+
+    def add_serial_and_send(self, msg):
+        if isinstance(msg, str):
+            msg = msg.replace("zzzzzz", "6f" + self.system_code)
+        logger.info("sending %s", HexFrame(msg))
+        self.send(msg)
+
+    def _start_tasks(self, loop=None):
+        self.send_loop = asyncio.ensure_future(self._send_messages(), loop=loop)
+        self.resend_loop = asyncio.ensure_future(self._resend_messages(), loop=loop)
 
     def connection_made(self, transport):
         self.transport = transport
         logger.info('port opened {}')
-        transport.serial.rts = False
-        self.buffer = bytearray(b'')
-        self.last_packet = time.time()
+        if self._closed:
+            # reconnected after close(), frames queued meanwhile are written once the tasks run again
+            self._closed = False
+            self._start_tasks()
+            if self.recording:
+                self._initialize_recording()
+        try:
+            transport.serial.rts = False
+        except OSError:
+            # ports without modem control lines, e.g. a pseudo-terminal
+            logger.debug("could not clear RTS")
+        self.framing.discard_partial()
+        self.last_packet = time.monotonic()
         self._ready.set()
 
+    def connection_lost(self, exc):
+        logger.info("port closed %s", exc)
+        self.close()
+
+    def close(self):
+        """
+        Stop the send and resend tasks, cancel outstanding requests and flush the recording. Called when the
+        connection to the stick is lost. The stick can be connected again afterwards, which starts the tasks and a new
+        recording file.
+        """
+        self._closed = True
+        self._ready.clear()
+        self.send_loop.cancel()
+        self.resend_loop.cancel()
+        self.correlator.cancel()
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+        if self.recording:
+            self.recorder.close()
+
     def data_received(self, data):
-        if self.last_packet + 0.05 < time.time() and not hasattr(self.transport, 'unittesting'):
-            self.buffer = bytearray(b'')
-        self.last_packet = time.time()
-        self.buffer += bytearray(data)
-        while len(self.buffer) >= 22:
+        # bytes of a frame arrive together, a frame interrupted by a gap is lost
+        if self.last_packet + 0.05 < time.monotonic() and not hasattr(self.transport, 'unittesting'):
+            self.framing.discard_partial()
+        self.last_packet = time.monotonic()
+        for frame in self.framing.feed(data):
             if self.recording:
-                with open(self.record_filename, "a") as recorder:
-                    recorder.write("received {}\n".format(hex(self.buffer[0:22])))
-                    recorder.flush()
-            if not hex(self.buffer[0:22]) == duoACK:
-                self.send(duoACK)
-            if hasattr(self, 'callback') and self.callback is not None:
-                self.callback(hex(self.buffer[0:22]))
+                self.recorder.record("received", frame)
+            if frame != duoACKBytes:
+                self._acknowledge()
+            if self.correlator.match(frame):
+                # a claimed reply of the stick still acknowledges what it answers
+                if frame[0] == 0x81:
+                    self._handle_ack(frame)
             elif self.initialized:
-                self.process_message(hex(self.buffer[0:22]))
-            self.buffer = self.buffer[22:]
+                self.process_message(frame)
 
     def pause_writing(self):  # pragma: no cover
         logger.info('pause writing')
@@ -386,73 +583,214 @@ class DuofernStickAsync(DuofernStick, asyncio.Protocol):
         logger.info(packet)
 
     def send(self, data, **kwargs):
-        """ Feed a message to the sender coroutine. """
-        tosend = bytearray.fromhex(data)
+        """ Feed a message (hex string or bytes) to the sender coroutine. """
+        tosend = OutgoingFrame(to_frame(data))
+        pending = self._command
+        if pending is not None and tosend[0] == 0x0D and tosend[1] != 0xFF and pending.reply is None:
+            pending.reply = self.correlator.expect(("810003cc", "810108aa"), pending.code, self.command_timeout)
+            pending.reply.add_done_callback(functools.partial(self._command_replied, pending))
+            tosend.waiters.append(pending)
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("sent {}\n".format(data))
-                recorder.flush()
+            self.recorder.record("sent", tosend)
         self.write_queue.put_nowait(tosend)
 
     async def _send_messages(self):
-        """ Send messages to the server as they become available. """
+        """
+        Send messages to the server as they become available.
+
+        A frame arriving while the line is idle is written right away, only consecutive frames are spaced by
+        ``message_interval_millis``. The next frame is taken from the queue once that gap has passed, so frames queued
+        meanwhile are still coalesced and ordered by priority.
+        """
         await self._ready.wait()
         logger.debug("Starting async send loop!")
+        loop = asyncio.get_event_loop()
+        self._next_send = loop.time()
         while True:
             try:
-                logger.info("sending from stack")
-                await asyncio.sleep(MIN_MESSAGE_INTERVAL_MILLIS/1000.)
+                delay = self._next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
                 data = await self.write_queue.get()
-                self.transport.write(data)
+                if self.initialized and not self.retransmission.admit(data):
+                    logger.debug("holding back %s until earlier frames are acknowledged", HexFrame(data))
+                    continue
+                logger.info("sending from stack")
+                waiters = getattr(data, 'waiters', None)
+                if waiters:
+                    now = loop.time()
+                    group = tuple(waiters)
+                    for pending in waiters:
+                        pending.written = now
+                        pending.group = group
+                await self._write(data)
+                if self.initialized:
+                    self.retransmission.sent(data)
+                    self._wake_resend_loop()
             except asyncio.CancelledError:
                 logger.info("Got CancelledError, stopping send loop")
                 break
             except Exception as exc:
                 raise
 
+    async def _write(self, data):
+        async with self._write_lock:
+            loop = asyncio.get_event_loop()
+            # acknowledgements may take the slot while sleeping, see _acknowledge
+            delay = self._next_send - loop.time()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._next_send - loop.time()
+            self.transport.write(data)
+            self._next_send = loop.time() + self.message_interval_millis / 1000.
+
+    def _acknowledge(self):
+        """
+        Acknowledge a received frame. Acknowledgements bypass the write queue, they are written right away or as soon
+        as the minimum gap to the previous frame has passed, ahead of queued frames.
+        """
+        self._pending_acks += 1
+        if self._ack_timer is None:
+            self._write_acks()
+
+    def _write_acks(self):
+        self._ack_timer = None
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        if now < self._next_send:
+            self._ack_timer = loop.call_at(self._next_send, self._write_acks)
+            return
+        self._pending_acks -= 1
+        if self.recording:
+            self.recorder.record("sent", duoACKBytes)
+        self.transport.write(duoACKBytes)
+        self._next_send = now + self.message_interval_millis / 1000.
+        if self._pending_acks:
+            self._ack_timer = loop.call_at(self._next_send, self._write_acks)
+
+    async def _resend_messages(self):
+        """ Resend frames the stick did not acknowledge, see :class:`pyduofern.retransmission.RetransmissionEngine`. """
+        await self._ready.wait()
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                self._resend_waiter = loop.create_future()
+                deadline = self.retransmission.next_deadline()
+                timer = None
+                if deadline is not None:
+                    timer = loop.call_later(max(deadline - self.retransmission.clock(), 0), self._wake_resend_loop)
+                try:
+                    await self._resend_waiter
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                for frame in self.retransmission.due():
+                    logger.info("resending %s", HexFrame(frame))
+                    await self._write(frame)
+                for frame in self.retransmission.pop_released():
+                    self.write_queue.put_nowait(frame)
+            except asyncio.CancelledError:
+                logger.info("Got CancelledError, stopping resend loop")
+                break
+
     def parse_regular(self, packet):
         logger.info(packet)
 
+    async def _settle(self):
+        """
+        Wait until the stick sent nothing for ``HANDSHAKE_QUIET_SECONDS``. What it sends meanwhile is dropped, as is
+        every frame received before the handshake is done which answers no request.
+        """
+        await self._ready.wait()
+        deadline = time.monotonic() + HANDSHAKE_SETTLE_SECONDS
+        while True:
+            now = time.monotonic()
+            quiet_at = self.last_packet + HANDSHAKE_QUIET_SECONDS
+            if quiet_at <= now or deadline <= now:
+                return
+            await asyncio.sleep(min(quiet_at, deadline) - now)
+
+    async def _exchange(self, messages, name, acknowledge=True):
+        """
+        Send handshake ``messages``, each of which the stick answers with an ``81`` frame, keeping up to
+        ``handshake_window`` of them unanswered. Messages still unanswered after ``handshake_timeout`` seconds are sent
+        again, up to ``handshake_retries`` times.
+
+        :param acknowledge: acknowledge every answer of the stick
+        :return: list of the answers
+        """
+        replies = []
+        for attempt in range(self.handshake_retries + 1):
+            if attempt:
+                logger.warning("no answer for %s, sending it again", name)
+            in_flight = deque()
+            sent = len(replies)
+            try:
+                while len(replies) < len(messages):
+                    while sent < len(messages) and len(in_flight) < self.handshake_window:
+                        in_flight.append(self.request(messages[sent], timeout=self.handshake_timeout))
+                        sent += 1
+                    reply = await in_flight.popleft()
+                    logger.info("%s answer for %s", HexFrame(reply), name)
+                    replies.append(reply)
+                    if acknowledge:
+                        self.send(duoACK)
+                return replies
+            except DuofernTimeoutException:
+                for future in in_flight:
+                    if not future.cancel():
+                        # answered or timed out already
+                        future.exception()
+        raise DuofernTimeoutException("stick did not answer {}".format(name))
+
     async def handshake(self):
-        if not hasattr(self.transport, 'unittesting'):
-            await asyncio.sleep(2)
+        """
+        Initialize the stick and send it the paired devices. The time spent in each phase is stored in
+        ``handshake_timings``.
+
+        :raises DuofernTimeoutException: if the stick does not answer a step, ``available`` fails with it, too
+        """
+        timings = self.handshake_timings = {}
+        start = phase = time.monotonic()
+
+        def finished(name):
+            nonlocal phase
+            now = time.monotonic()
+            timings[name] = now - phase
+            phase = now
+
+        try:
+            await self._settle()
+            finished("settle")
             logger.info("now handshaking")
-        await send_and_await_reply(self, duoInit1, "init 1")
-        await send_and_await_reply(self, duoInit2, "init 2")
-        await send_and_await_reply(self, duoSetDongle.replace("zzzzzz", "6f" + self.system_code), "SetDongle")
-        self.send(duoACK)
-        await send_and_await_reply(self, duoInit3, "init 3")
-        self.send(duoACK)
-        if 'devices' in self.config and self.config['devices']:
-            counter = 0
-            for device in self.config['devices']:
-                # devices with id other than 6 characters
-                # were previously sub-devices of another device with 6 characters
-                # (i.e. devices representing a single channel)
-                # but are no longer relevant
-                if len(device['id']) != 6:
-                    continue
-                hex_to_write = duoSetPairs.replace('nn', '{:02X}'.format(counter)).replace('yyyyyy', device['id'])
-                await send_and_await_reply(self, hex_to_write, "SetPairs")
-                self.send(duoACK)
-                counter += 1
+            await self._exchange([duoInit1], "init 1", acknowledge=False)
+            await self._exchange([duoInit2], "init 2", acknowledge=False)
+            await self._exchange([duoSetDongle.replace("zzzzzz", "6f" + self.system_code)], "SetDongle")
+            await self._exchange([duoInit3], "init 3")
+            finished("init")
+
+            # devices with id other than 6 characters were previously sub-devices of another device with 6
+            # characters (i.e. devices representing a single channel) but are no longer relevant
+            devices = [device for device in self.config.get('devices', ()) if len(device['id']) == 6]
+            pairs = [duoSetPairs.replace('nn', '{:02X}'.format(counter)).replace('yyyyyy', device['id'])
+                     for counter, device in enumerate(devices)]
+            await self._exchange(pairs, "SetPairs")
+            for device in devices:
                 self.duofern_parser.add_device(device['id'], device['name'])
-
-        await send_and_await_reply(self, duoInitEnd, "duoInitEnd")
-        self.send(duoACK)
-        await send_and_await_reply(self, duoStatusRequest, "duoInitEnd")
-        self.send(duoACK)
+            finished("pairs")
+
+            await self._exchange([duoInitEnd], "duoInitEnd")
+            await self._exchange([duoStatusRequest], "status request")
+            finished("status")
+        except DuofernTimeoutException as exception:
+            self.available.set_exception(exception)
+            raise
+        timings["total"] = time.monotonic() - start
+        logger.info("handshake took %.3f s %s", timings["total"], timings)
         self.available.set_result(True)
         self.initialized = True
 
 
-@dataclass
-class WaitingMessage:
-    """Class for keeping track of an item in inventory."""
-    message: str
-    next: datetime.datetime
-    retries: int = 5
-
 class DuofernStickThreaded(DuofernStick, threading.Thread):
     def __init__(self, serial_port=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -470,25 +808,24 @@ class DuofernStickThreaded(DuofernStick, threading.Thread):
         # DuofernStick.__init__(self, device, system_code, config_file_json, duofern_parser)
         self.serial_connection = serial.Serial(self.port, baudrate=115200, timeout=1)
         self.running = False
-        self.last_send = datetime.datetime.now()
+        self.last_send = time.monotonic()
+        self._wakeup_write = None
 
         self.rewrite_queue = Queue()
-        self.unacknowledged: Dict[str,WaitingMessage] = {}
 
     def _read_answer(self, some_string):  # ReadAnswer
         """read an answer..."""
         logger.debug("should read {}".format(some_string))
         self.serial_connection.timeout = 1
-        response = bytearray(self.serial_connection.read(22))
+        response = bytes(self.serial_connection.read(22))
         if len(response) < 22:
             raise DuofernTimeoutException
-        logger.debug("response {}".format(hex(response)))
+        logger.debug("response %s", HexFrame(response))
 
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("received {}\n".format(hex(response)))
+            self.recorder.record("received", response)
 
-        return hex(response)
+        return response
 
     def _initialize(self):  # DoInit
         for i in range(0, 4):
@@ -576,104 +913,175 @@ class DuofernStickThreaded(DuofernStick, threading.Thread):
     @refresh_serial_connection
     def _simple_write(self, string_to_write):  # SimpleWrite
         """Just write data"""
-        self.last_send = datetime.datetime.now()
-        logger.debug("writing  {}".format(string_to_write))
-        hex_to_write = string_to_write.replace(" ", '')
+        self.last_send = time.monotonic()
+        data_to_write = to_frame(string_to_write)
+        logger.debug("writing  %s", HexFrame(data_to_write))
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("sent {}\n".format(hex_to_write))
+            self.recorder.record("sent", data_to_write)
 
-        data_to_write = bytearray.fromhex(hex_to_write)
         if not self.serial_connection.isOpen():
             self.serial_connection.open()
         self.serial_connection.write(data_to_write)
 
     def handle_write_queue(self):
         try:
-            tosend = self.write_queue.get(block=False, timeout=None)
-            logger.debug("sending {} from write queue, {} msgs left in queue".format(tosend, self.write_queue.qsize()))
+            tosend = to_frame(self.write_queue.get(block=False, timeout=None))
+            if not self.retransmission.admit(tosend):
+                logger.debug("holding back %s until earlier frames are acknowledged", HexFrame(tosend))
+                return
+            logger.debug("sending %s from write queue, %s msgs left in queue", HexFrame(tosend), self.write_queue.qsize())
             self._simple_write(tosend)
-            self.unacknowledged[tosend[-14:-2]] = WaitingMessage(tosend, datetime.datetime.now()+datetime.timedelta(seconds=random.uniform(*RESEND_SECONDS)))
+            self.retransmission.sent(tosend)
         except Empty:
             pass
 
     def handle_rewrite_queue(self):
         try:
             tosend = self.rewrite_queue.get(block=False, timeout=None)
-            logger.info("SENDING {} from REwrite queue, {} msgs left in queue".format(tosend, self.rewrite_queue.qsize()))
+            logger.info("SENDING %s from REwrite queue, %s msgs left in queue", HexFrame(tosend), self.rewrite_queue.qsize())
             self._simple_write(tosend)
         except Empty:
             pass
 
     def command(self, *args, **kwargs):
         if self.recording:
-            with open(self.record_filename, "a") as recorder:
-                recorder.write("sending_command {} {}\n".format(args,kwargs))
+            self.recorder.record("sending_command", "{} {}".format(args,kwargs))
 
         self.duofern_parser.set(*args, **kwargs)
 
     def add_serial_and_send(self, msg):
-        message = msg.replace("zzzzzz", "6f" + self.system_code)
-        logger.debug("sending {}".format(message))
-        self.send(message)
+        if isinstance(msg, str):
+            msg = msg.replace("zzzzzz", "6f" + self.system_code)
+        self.send(msg)
 
     def run(self):
         self.running = True
         self._initialize()
-        last_resend_check = datetime.datetime.now()
-        last_periodic_update = datetime.datetime.now()
-        toggle = False
-        while self.running:
-            toggle = not toggle
+        self._next_status_request = time.monotonic() + (self.updating_interval or 0)
+        self._toggle = False
+        try:
+            fileno = self.serial_connection.fileno()
+        except Exception:
+            fileno = None
+        try:
+            if isinstance(fileno, int):
+                self._run_selector(fileno)
+            else:
+                # no file descriptor to wait on (e.g. on windows), poll the port
+                self._run_polling()
+        finally:
+            self.serial_connection.close()
+            if self.recording:
+                self.recorder.close()
 
-            self.serial_connection.timeout = .05
+    def _run_selector(self, fileno):
+        """
+        Sleep until the stick sends data, a frame is queued or the next timer (pacing of writes, resends, periodic
+        status requests) is due.
+        """
+        wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        selector = selectors.DefaultSelector()
+        selector.register(fileno, selectors.EVENT_READ, "serial")
+        selector.register(wakeup_read, selectors.EVENT_READ, "wakeup")
+        self.serial_connection.timeout = 0
+        try:
+            while self.running:
+                for key, _ in selector.select(self._time_to_next_event()):
+                    if key.data == "wakeup":
+                        try:
+                            os.read(wakeup_read, 512)
+                        except BlockingIOError:  # pragma: no cover
+                            pass
+                    elif self.running:
+                        self._received(bytes(self.serial_connection.read(self.serial_connection.in_waiting or 1)))
+                if self.running:
+                    self._handle_timers()
+        finally:
+            selector.close()
+            wakeup_write, self._wakeup_write = self._wakeup_write, None
+            os.close(wakeup_read)
+            os.close(wakeup_write)
+
+    def _run_polling(self):
+        while self.running:
+            timeout = self._time_to_next_event()
+            self.serial_connection.timeout = .05 if timeout is None else min(.05, timeout)
             if not self.serial_connection.isOpen():
                 self.serial_connection.open()
             try:
-                in_data = hex(self.serial_connection.read(22))
+                self._received(bytes(self.serial_connection.read(22)))
             except TypeError:
                 continue
-            if len(in_data) == 44:
-                try:
-                    self.process_message(in_data)
-                except Exception as exc:
-                    logger.exception(exc)
-                if in_data != duoACK:
-                    self._simple_write(duoACK)
-            self.serial_connection.timeout = 1
-            if not self.write_queue.empty() or not self.rewrite_queue.empty() and (
-                    (datetime.datetime.now() - self.last_send) >= datetime.timedelta(milliseconds=MIN_MESSAGE_INTERVAL_MILLIS)):
-                if toggle and self.rewrite_queue:
-                    self.handle_rewrite_queue()
-                else:
-                    self.handle_write_queue()
-
-            if self.updating_interval and datetime.datetime.now() - last_periodic_update > datetime.timedelta(seconds=self.updating_interval):
-                last_periodic_update = datetime.datetime.now()
-                self.status_request()
-
-            if datetime.datetime.now() - last_resend_check > datetime.timedelta(seconds=0.1):
-                self.handle_resends()
-                last_resend_check = datetime.datetime.now()
+            self._handle_timers()
+
+    def _wake_up(self):
+        if self._wakeup_write is not None:
+            try:
+                os.write(self._wakeup_write, b"\0")
+            except (BlockingIOError, OSError):  # pragma: no cover
+                pass
+
+    def _received(self, data):
+        for frame in self.framing.feed(data):
+            try:
+                self.process_message(frame)
+            except Exception as exc:
+                logger.exception(exc)
+            if frame != duoACKBytes:
+                self._simple_write(duoACK)
+
+    def _time_to_next_event(self):
+        """
+        :return: seconds until the next write, resend or status request is due, None if nothing is scheduled
+        """
+        now = time.monotonic()
+        deadlines = []
+        if not self.write_queue.empty() or not self.rewrite_queue.empty():
+            deadlines.append(self.last_send + self.message_interval_millis / 1000.)
+        if self.updating_interval:
+            deadlines.append(self._next_status_request)
+        deadline = self.retransmission.next_deadline()
+        if deadline is not None:
+            deadlines.append(now + deadline - self.retransmission.clock())
+        if not deadlines:
+            return None
+        return max(min(deadlines) - now, 0)
+
+    def _handle_timers(self):
+        now = time.monotonic()
+        if (not self.write_queue.empty() or not self.rewrite_queue.empty()) and (
+                now - self.last_send >= self.message_interval_millis / 1000.):
+            self._toggle = not self._toggle
+            if self.rewrite_queue.empty() or (self._toggle and not self.write_queue.empty()):
+                self.handle_write_queue()
+            else:
+                self.handle_rewrite_queue()
+
+        if self.updating_interval and now >= self._next_status_request:
+            self._next_status_request = now + self.updating_interval
+            self.status_request()
+
+        # cheap unless a resend is due, the engine keeps its deadlines in a heap
+        self.handle_resends()
 
     def handle_resends(self):
-        done = set()
-        t = datetime.datetime.now()
-        for k in self.unacknowledged.keys():
-            if self.unacknowledged[k].retries == 0:
-                done.add(k)
-                logger.info(f"{self.unacknowledged[k]} was never acknowledged, gave up after 5 retries")
-            elif self.unacknowledged[k].next < t:
-                self.unacknowledged[k].next = t + datetime.timedelta(seconds=random.uniform(*RESEND_SECONDS))
-                self.unacknowledged[k].retries -= 1
-                self.rewrite_queue.put(self.unacknowledged[k].message)
-        for d in done:
-            del self.unacknowledged[d]
+        for frame in self.retransmission.due():
+            self.rewrite_queue.put(frame)
+        for frame in self.retransmission.pop_released():
+            self.write_queue.put(frame)
 
 
     def stop(self):
         self.running = False
-        self.serial_connection.close()
+        if self.is_alive() and threading.current_thread() is not self:
+            # the loop closes the port and the recording once it is done with them
+            self._wake_up()
+        else:
+            self.serial_connection.close()
+            if self.recording:
+                self.recorder.close()
 
     def pair(self, timeout=10):
         super(DuofernStickThreaded, self).pair(timeout)
@@ -684,7 +1092,8 @@ class DuofernStickThreaded(DuofernStick, threading.Thread):
         threading.Timer(timeout, self.stop_unpair).start()
 
     def send(self, msg, **kwargs):
-        logger.debug("sending {}".format(msg))
+        logger.debug("sending %s", HexFrame(msg))
         self.write_queue.put_nowait(msg)
-        logger.debug("added {} to write queue".format(msg))
+        logger.debug("added %s to write queue", HexFrame(msg))
+        self._wake_up()
         return
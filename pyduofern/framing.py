@@ -0,0 +1,204 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+FRAME_LENGTH = 22
+
+
+def _starts(*prefixes):
+    """
+    :param prefixes: leading bytes of frames as hex strings, ``..`` matches any byte, e.g. ``"0f..07"``
+    :return: tuple of the bytes following the leading byte, None for any
+    """
+    return tuple(tuple(None if prefix[i:i + 2] == ".." else int(prefix[i:i + 2], 16)
+                       for i in range(2, len(prefix), 2)) for prefix in prefixes)
+
+
+# leading byte of every frame the stick sends -> how the following bytes may look
+frameStarts = {
+    0x0F: _starts("0fff", "0f011322", "0f..07", "0f..0e"),  # status, weather, sensor and button messages
+    0x81: _starts("8100", "8101"),  # acknowledgements
+    0x06: _starts("0601", "0602", "0603"),  # pairing replies
+}
+
+# leading byte of every frame sent to the stick -> how the following bytes may look (None: any). Only frames with
+# a known shape are distinctive enough to resynchronise to.
+commandStarts = {
+    0x81: frameStarts[0x81],  # acknowledgements
+    # initialization, pairing and frames for the actors
+    0x01: None, 0x03: None, 0x04: None, 0x05: None, 0x07: None, 0x08: None, 0x0A: None, 0x0D: None, 0x0E: None,
+    0x10: None, 0x14: None,
+}
+
+
+class FrameAssembler(object):
+    """
+    Cuts the byte stream received from the stick into frames.
+
+    The stream carries no delimiters, a lost byte shifts every later frame. A frame is only taken as aligned if it
+    starts like a frame the stick sends (see ``frameStarts``) and, if the next bytes have arrived already, is followed
+    by something that starts like a frame, too. Otherwise the assembler looks for the nearest offset where a status,
+    acknowledgement or pairing frame starts and drops the bytes in front of it.
+
+    A frame completed by the last bytes of a read is handed out without looking at what follows, holding it back would
+    delay every frame until the next one arrives. So a frame which lost bytes itself still comes out if a read ends
+    right after it. The first frame after a resync however is held back until the start of the following frame
+    confirms it, no misaligned frame comes out after bytes were lost.
+
+    Received bytes are copied once into a preallocated buffer and frames are handed out as ``memoryview`` slices of
+    it, so assembling frames allocates no memory per frame. The few bytes of an incomplete frame are moved to the
+    front of the buffer when the end is reached.
+    """
+
+    def __init__(self, capacity=1024, starts=None):
+        """
+        :param capacity: size of the receive buffer in bytes, at least one frame
+        :param starts: how frames start, ``frameStarts`` (frames sent by the stick) if None
+        """
+        assert capacity >= FRAME_LENGTH, "buffer must hold a frame"
+        self.starts = frameStarts if starts is None else starts
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self.frames = 0
+        self.dropped = 0
+        self.resyncs = 0
+        # the stream was out of step, hold the next frame back until the start of the following one confirms it
+        self._resynced = False
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _plausible(self, offset, strict=False):
+        position = self._start + offset
+        if position >= self._end:
+            return True
+        starts = self.starts.get(self._buffer[position], False)
+        if starts is None:
+            return not strict
+        if starts is False:
+            return False
+        for following in starts:
+            for value in following:
+                position += 1
+                if position < self._end and value is not None and self._buffer[position] != value:
+                    break
+            else:
+                return True
+            position = self._start + offset
+        return False
+
+    def _aligned(self, offset, confirmed):
+        following = offset + FRAME_LENGTH
+        if confirmed and following >= len(self):
+            return False
+        return self._plausible(offset, strict=True) and self._plausible(following)
+
+    def _resync(self, limit, confirmed=False):
+        """
+        :param confirmed: only accept offsets followed by the start of another frame
+        :return: smallest offset below ``limit`` at which an aligned frame starts, None if there is none
+        """
+        for offset in range(1, limit):
+            if self._aligned(offset, confirmed):
+                return offset
+        return None
+
+    def _drop(self, count):
+        self._start += count
+        self.dropped += count
+        if not self._resynced:
+            self.resyncs += 1
+        self._resynced = True
+
+    def _append(self, data):
+        """
+        :return: number of bytes of ``data`` that fit into the buffer
+        """
+        capacity = len(self._buffer)
+        if self._end + len(data) > capacity and self._start:
+            pending = self._end - self._start
+            self._buffer[0:pending] = self._buffer[self._start:self._end]
+            self._start, self._end = 0, pending
+        count = min(len(data), capacity - self._end)
+        self._view[self._end:self._end + count] = data[0:count]
+        self._end += count
+        return count
+
+    def feed(self, data):
+        """
+        :param data: bytes received from the stick
+        :return: iterator over the complete frames as ``memoryview``. A frame is only valid until the next one is
+         taken, copy it with ``bytes(frame)`` to keep it.
+        """
+        data = memoryview(data)
+        while data:
+            data = data[self._append(data):]
+            while len(self) >= FRAME_LENGTH:
+                if not self._plausible(0):
+                    offset = self._resync(len(self))
+                    self._drop(len(self) if offset is None else offset)
+                    continue
+                if self._resynced and len(self) < FRAME_LENGTH + 2:
+                    # wait for the start of the following frame
+                    break
+                if not self._plausible(FRAME_LENGTH):
+                    # either this frame lost bytes or the next one is broken, drop this one only if the stream is in
+                    # step again within it
+                    offset = self._resync(FRAME_LENGTH, confirmed=True)
+                    if offset is None and len(self) <= 2 * FRAME_LENGTH:
+                        # too few bytes to tell which of the two is broken
+                        break
+                    if offset is None and self._resynced:
+                        # the resync went wrong, look further
+                        offset = self._resync(len(self))
+                        offset = len(self) if offset is None else offset
+                    if offset is not None:
+                        self._drop(offset)
+                        continue
+                self._resynced = False
+                start = self._start
+                self._start += FRAME_LENGTH
+                self.frames += 1
+                yield self._view[start:start + FRAME_LENGTH]
+            if len(self) and not self._plausible(0):
+                offset = self._resync(len(self))
+                self._drop(len(self) if offset is None else offset)
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def discard_partial(self):
+        """
+        Drop the bytes of an incomplete frame, e.g. after a gap in the stream. This includes a frame held back after a
+        resync.
+        """
+        self.dropped += len(self)
+        self._start = self._end = 0
+        self._resynced = False
+
+    def stats(self):
+        """
+        :return: dict with the number of ``frames`` assembled, bytes ``dropped`` and ``resyncs``
+        """
+        return {'frames': self.frames, 'dropped': self.dropped, 'resyncs': self.resyncs}
@@ -0,0 +1,251 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+
+import asyncio
+import queue
+from collections import deque
+
+from .duofern import value_command_kind
+
+
+def _frame_bytes(item):
+    if isinstance(item, str):
+        return bytes.fromhex(item)
+    return bytes(item)
+
+
+class OutgoingFrame(bytearray):
+    """
+    Frame to be sent, carrying the ``waiters`` for the reply to it. If a :class:`CoalescingBuffer` replaces the frame
+    by a newer one, the waiters are moved over to the newer frame.
+    """
+    __slots__ = ('waiters',)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.waiters = []
+
+
+# priority classes of outgoing frames, lower is more urgent
+SAFETY = 0  # stop commands and ACKs
+USER = 1  # commands moving or switching actors
+CONFIG = 2  # automatic/mode settings, pairing, stick configuration
+POLL = 3  # status requests
+priorityNames = ("safety", "user", "config", "poll")
+
+_CANCELLED = object()
+
+
+def frame_priority(frame):
+    """
+    :param frame: frame to be sent as ``bytes``
+    :return: priority class of the frame
+    """
+    if frame[0] == 0x81:
+        return SAFETY
+    if frame[0] != 0x0D or len(frame) != 22:
+        return CONFIG
+    if frame[1] == 0xFF and frame[3] == 0x40:
+        return POLL
+    if frame[2] == 0x07:
+        return SAFETY if frame[3] == 0x02 else USER
+    if frame[2] == 0x0E:
+        return USER
+    return CONFIG
+
+
+class CoalescingBuffer(object):
+    """
+    Queue of frames to send, one FIFO per priority class (see :func:`frame_priority`).
+
+    The most urgent non-empty class is served first. To keep a steady stream of urgent frames from starving the
+    others, a class that was passed over ``starvation_limit`` times in a row is served next.
+
+    A command setting a value (``position``, ``level``, ...) replaces a still pending command of the same kind for the
+    same device and channel, the newer frame takes over the place of the older one in the queue. Any other frame for
+    a device (e.g. ``up``) is never replaced and acts as a barrier: value commands enqueued after it are queued behind
+    it instead of replacing one from before. A ``stop`` overtakes the pending commands for its device and channel, so
+    these are dropped and handed to ``superseded_callback``.
+    """
+
+    def __init__(self, starvation_limit=8, superseded_callback=None):
+        """
+        :param superseded_callback: called with every frame dropped in favour of a ``stop``
+        """
+        self.starvation_limit = starvation_limit
+        self.superseded_callback = superseded_callback
+        self._classes = tuple(deque() for _ in priorityNames)
+        self._depth = [0] * len(priorityNames)
+        self._skipped = [0] * len(priorityNames)
+        # (device code, channel) -> {command kind: entry}
+        self._pending = {}
+        self.coalesced = 0
+        self.superseded = 0
+        self.enqueued = [0] * len(priorityNames)
+        self.sent = [0] * len(priorityNames)
+        self.max_depth = [0] * len(priorityNames)
+
+    def put(self, item):
+        """
+        :return: True if ``item`` replaced a pending frame
+        """
+        frame = _frame_bytes(item)
+        priority = frame_priority(frame)
+        target = kind = None
+        if len(frame) == 22 and frame[0] == 0x0D:
+            target = frame[18:21] + frame[1:2]
+            kind = value_command_kind(frame)
+            if kind is None:
+                self._pending.pop(target, None)
+                if priority == SAFETY:
+                    self._supersede(target)
+            else:
+                pending = self._pending.setdefault(target, {})
+                entry = pending.get(kind)
+                if entry is not None:
+                    waiters = getattr(entry[0], 'waiters', None)
+                    if waiters and isinstance(item, OutgoingFrame):
+                        item.waiters[:0] = waiters
+                    entry[0] = item
+                    self.coalesced += 1
+                    return True
+
+        entry = [item, target, kind, priority]
+        if kind is not None:
+            self._pending[target][kind] = entry
+        self._classes[priority].append(entry)
+        self.enqueued[priority] += 1
+        self._depth[priority] += 1
+        if self._depth[priority] > self.max_depth[priority]:
+            self.max_depth[priority] = self._depth[priority]
+        return False
+
+    def _supersede(self, target):
+        for entry in self._classes[USER]:
+            if entry[1] == target and entry[0] is not _CANCELLED:
+                item, entry[0] = entry[0], _CANCELLED
+                self._depth[USER] -= 1
+                self.superseded += 1
+                if self.superseded_callback is not None:
+                    self.superseded_callback(item)
+
+    def _next_class(self):
+        chosen = None
+        for priority, depth in enumerate(self._depth):
+            if depth and (chosen is None or self._skipped[priority] >= self.starvation_limit):
+                chosen = priority
+        for priority, depth in enumerate(self._depth):
+            if depth and priority != chosen:
+                self._skipped[priority] += 1
+        self._skipped[chosen] = 0
+        return chosen
+
+    def get(self):
+        """
+        :raises IndexError: if the buffer is empty
+        """
+        if not len(self):
+            raise IndexError("get from an empty buffer")
+        priority = self._next_class()
+        entries = self._classes[priority]
+        entry = entries.popleft()
+        while entry[0] is _CANCELLED:
+            entry = entries.popleft()
+        item, target, kind, priority = entry
+        self._depth[priority] -= 1
+        self.sent[priority] += 1
+        if kind is not None:
+            pending = self._pending.get(target)
+            if pending is not None and pending.get(kind) is entry:
+                del pending[kind]
+                if not pending:
+                    del self._pending[target]
+        return item
+
+    def depth(self, priority):
+        """
+        :return: number of frames of class ``priority`` waiting
+        """
+        return self._depth[priority]
+
+    def stats(self):
+        """
+        :return: dict of counters per priority class and the number of ``coalesced`` and ``superseded`` frames
+        """
+        stats = {name: {'depth': self._depth[priority], 'max_depth': self.max_depth[priority],
+                        'enqueued': self.enqueued[priority], 'sent': self.sent[priority]}
+                 for priority, name in enumerate(priorityNames)}
+        stats['coalesced'] = self.coalesced
+        stats['superseded'] = self.superseded
+        return stats
+
+    def __len__(self):
+        return sum(self._depth)
+
+
+class CoalescingQueue(queue.Queue):
+    """
+    :class:`queue.Queue` for the threaded stick, backed by a :class:`CoalescingBuffer`.
+    """
+
+    def _init(self, maxsize):
+        self.queue = CoalescingBuffer()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        if self.queue.put(item):
+            self.unfinished_tasks -= 1
+
+    def _get(self):
+        return self.queue.get()
+
+    def stats(self):
+        with self.mutex:
+            return self.queue.stats()
+
+
+class AsyncCoalescingQueue(asyncio.Queue):
+    """
+    :class:`asyncio.Queue` for the asyncio stick, backed by a :class:`CoalescingBuffer`.
+    """
+
+    def __init__(self, superseded_callback=None, **kwargs):
+        self._superseded_callback = superseded_callback
+        super().__init__(**kwargs)
+
+    def _init(self, maxsize):
+        self._queue = CoalescingBuffer(superseded_callback=self._superseded_callback)
+
+    def _put(self, item):
+        if self._queue.put(item):
+            self._unfinished_tasks -= 1
+
+    def _get(self):
+        return self._queue.get()
+
+    def stats(self):
+        return self._queue.stats()
@@ -0,0 +1,416 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import atexit
+import bisect
+import logging
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingSink(object):
+    """
+    Writes the lines of a recording (``sent <frame>``, ``received <frame>``, ``sending_command ...``) from a
+    background thread.
+
+    :meth:`record` only appends to an in-memory buffer, the thread writes the buffer every ``flush_interval`` seconds
+    or as soon as ``buffer_lines`` lines are waiting. Frames are turned into hex by the thread, too. The file is
+    rotated like ``logging.handlers.RotatingFileHandler`` does once it grows beyond ``max_bytes`` or is older than
+    ``max_age`` seconds, keeping ``backup_count`` old files as ``<filename>.1`` (newest) to ``<filename>.<n>``.
+    The buffer is flushed by :meth:`close`, which also runs at interpreter exit.
+
+    With ``format="binary"`` the recording is written by :class:`BinaryRecordingWriter`, timestamped with the time
+    :meth:`record` was called.
+    """
+
+    def __init__(self, filename, max_bytes=None, max_age=None, backup_count=5, flush_interval=0.5, buffer_lines=1000,
+                 clock=time.monotonic, format="text"):
+        """
+        :param filename: file to append the recording to (binary recordings replace it)
+        :param format: ``text`` or ``binary``
+        :param max_bytes: rotate once the file reaches this size, never if None
+        :param max_age: rotate once the file was started this many seconds ago, never if None
+        :param backup_count: number of rotated files to keep
+        :param flush_interval: seconds lines may wait in the buffer
+        :param buffer_lines: write right away once this many lines are waiting
+        :param clock: monotonic clock returning seconds
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.buffer_lines = buffer_lines
+        self.clock = clock
+        assert format in ("text", "binary"), "unknown recording format {}".format(format)
+        self.format = format
+        self.written = 0
+        self._pending = []
+        self._flushed = 0
+        self._queued = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._file = None
+        self._opened = None
+        self._thread = threading.Thread(target=self._run, name="duofern-recording", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, kind, data):
+        """
+        :param kind: ``sent``, ``received`` or ``sending_command``
+        :param data: frame as ``bytes`` (copied, so a ``memoryview`` is fine) or a string written as is
+        """
+        if not isinstance(data, str):
+            data = bytes(data)
+        with self._condition:
+            if self._closed:
+                return
+            self._pending.append((kind, data, self.clock()))
+            self._queued += 1
+            if len(self._pending) >= self.buffer_lines:
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Block until all lines recorded so far are written.
+
+        :return: False if ``timeout`` seconds passed before
+        """
+        with self._condition:
+            target = self._queued
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: self._flushed >= target or not self._thread.is_alive(), timeout)
+
+    def close(self):
+        """
+        Write the remaining lines and stop the thread.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._pending) < self.buffer_lines:
+                    self._condition.wait(self.flush_interval)
+                pending, self._pending = self._pending, []
+                closed = self._closed
+            if pending:
+                try:
+                    self._write(pending)
+                except OSError as exc:  # pragma: no cover
+                    logger.warning("failed writing recording %s: %s", self.filename, exc)
+            with self._condition:
+                self._flushed += len(pending)
+                self._condition.notify_all()
+            if closed:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, pending):
+        if self._file is None:
+            self._open()
+        elif self._should_rotate():
+            self._rotate()
+        if self.format == "binary":
+            for kind, data, timestamp in pending:
+                self._file.record(kind, data, timestamp)
+        else:
+            self._file.write("".join("{} {}\n".format(kind, data if isinstance(data, str) else data.hex())
+                                     for kind, data, _ in pending))
+        self._file.flush()
+        self.written += len(pending)
+
+    def _open(self):
+        if self.format == "binary":
+            self._file = BinaryRecordingWriter(self.filename, clock=self.clock)
+        else:
+            self._file = open(self.filename, "a")
+        self._opened = self.clock()
+
+    def _should_rotate(self):
+        if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+            return True
+        return self.max_age is not None and self.clock() - self._opened >= self.max_age
+
+    def _rotate(self):
+        self._file.close()
+        for number in range(self.backup_count - 1, 0, -1):
+            source = "{}.{}".format(self.filename, number)
+            if os.path.exists(source):
+                os.replace(source, "{}.{}".format(self.filename, number + 1))
+        if self.backup_count:
+            os.replace(self.filename, self.filename + ".1")
+        else:
+            os.remove(self.filename)
+        self._open()
+
+
+# binary recordings: a header, then records of a header (monotonic timestamp, tag, payload length) and the payload,
+# the raw frame or the utf-8 text of a command. Every index_interval records an index record points back to the
+# previous one and carries the timestamp of the record following it. Closing the file appends a footer pointing to the
+# last index record, so a reader finds all index records without scanning the file.
+BINARY_MAGIC = b"DFRC"
+BINARY_VERSION = 1
+_fileHeader = struct.Struct("<4sB3xdd")  # magic, version, wall clock time and monotonic time at start
+_recordHeader = struct.Struct("<dBH")
+_indexPayload = struct.Struct("<qd")  # offset of the previous index record (-1 for none), timestamp
+_footer = struct.Struct("<q4s")  # offset of the last index record, magic
+_FOOTER_MAGIC = b"DFIX"
+
+RECEIVED = 0
+SENT = 1
+COMMAND = 2
+COMMENT = 3  # any other line of a text recording, kept for conversion
+_INDEX = 0xFF
+
+recordTags = {'received': RECEIVED, 'sent': SENT, 'sending_command': COMMAND}
+recordKinds = {tag: kind for kind, tag in recordTags.items()}
+
+Record = namedtuple("Record", ("timestamp", "kind", "data"))
+
+
+class BinaryRecordingWriter(object):
+    """
+    Writes a binary recording, each record holds a monotonic timestamp, the direction and the raw frame.
+    """
+
+    def __init__(self, file, index_interval=1024, clock=time.monotonic):
+        """
+        :param file: path or binary file object opened for writing
+        :param index_interval: records between two index records
+        :param clock: monotonic clock returning seconds, used for records recorded without timestamp
+        """
+        self._own_file = isinstance(file, (str, os.PathLike))
+        self.file = open(file, "wb") if self._own_file else file
+        self.index_interval = index_interval
+        self.clock = clock
+        self._since_index = index_interval
+        self._last_index = -1
+        self.file.write(_fileHeader.pack(BINARY_MAGIC, BINARY_VERSION, time.time(), clock()))
+
+    def record(self, kind, data, timestamp=None):
+        """
+        :param kind: ``sent``, ``received``, ``sending_command`` or one of the tags ``RECEIVED``, ``SENT``,
+         ``COMMAND``, ``COMMENT``
+        :param data: frame as ``bytes`` or text
+        :param timestamp: monotonic time of the record, now if None
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+        tag = recordTags[kind] if isinstance(kind, str) else kind
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self._since_index >= self.index_interval:
+            offset = self.file.tell()
+            self._write(timestamp, _INDEX, _indexPayload.pack(self._last_index, timestamp))
+            self._last_index = offset
+            self._since_index = 0
+        self._write(timestamp, tag, data)
+        self._since_index += 1
+
+    def _write(self, timestamp, tag, payload):
+        self.file.write(_recordHeader.pack(timestamp, tag, len(payload)))
+        self.file.write(payload)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        """
+        Write the footer and close the file if it was opened by the writer.
+        """
+        self.file.write(_footer.pack(self._last_index, _FOOTER_MAGIC))
+        self.file.flush()
+        if self._own_file:
+            self.file.close()
+
+
+class BinaryRecordingReader(object):
+    """
+    Reads a binary recording written by :class:`BinaryRecordingWriter`, record by record.
+
+    Iterating yields :class:`Record` tuples of the monotonic ``timestamp``, the ``kind`` (``sent``, ``received``,
+    ``sending_command`` or None for other lines of converted text recordings) and the ``data`` (frame as ``bytes``,
+    text as ``str``). :meth:`records` starts at a given time, it finds the place by bisecting the index.
+    """
+
+    def __init__(self, file):
+        """
+        :param file: path or binary file object opened for reading
+        """
+        self._own_file = isinstance(file, (str, os.PathLike))
+        self.file = open(file, "rb") if self._own_file else file
+        magic, version, self.wall_clock_start, self.start = _fileHeader.unpack(self.file.read(_fileHeader.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("not a binary duofern recording")
+        self._index = None
+        self._index_times = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._own_file:
+            self.file.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def _read_record(self):
+        """
+        :return: (offset, timestamp, tag, payload), None at the end of the recording
+        """
+        offset = self.file.tell()
+        header = self.file.read(_recordHeader.size)
+        if len(header) < _recordHeader.size:
+            return None
+        timestamp, tag, length = _recordHeader.unpack(header)
+        payload = self.file.read(length)
+        if len(payload) < length:
+            # the footer, or a record cut short by a crash
+            return None
+        return offset, timestamp, tag, payload
+
+    def _scan(self, start):
+        self.file.seek(start)
+        while True:
+            record = self._read_record()
+            if record is None:
+                return
+            yield record
+
+    def records(self, start=None):
+        """
+        :param start: monotonic timestamp of the first record to return, all records if None
+        :return: iterator over the :class:`Record` tuples
+        """
+        offset = _fileHeader.size if start is None else self._offset_before(start)
+        for _, timestamp, tag, payload in self._scan(offset):
+            if tag == _INDEX or (start is not None and timestamp < start):
+                continue
+            if tag in (RECEIVED, SENT):
+                yield Record(timestamp, recordKinds[tag], payload)
+            else:
+                yield Record(timestamp, recordKinds.get(tag), payload.decode("utf-8"))
+
+    def index(self):
+        """
+        :return: list of (timestamp, offset) of the index records, oldest first
+        """
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self):
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        if size >= _fileHeader.size + _footer.size:
+            self.file.seek(size - _footer.size)
+            last, magic = _footer.unpack(self.file.read(_footer.size))
+            if magic == _FOOTER_MAGIC:
+                entries = []
+                while last >= 0:
+                    self.file.seek(last)
+                    _, _, _, payload = self._read_record()
+                    previous, timestamp = _indexPayload.unpack(payload)
+                    entries.append((timestamp, last))
+                    last = previous
+                entries.reverse()
+                return entries
+        # no footer, the recording was not closed
+        return [(timestamp, offset) for offset, timestamp, tag, payload in self._scan(_fileHeader.size)
+                if tag == _INDEX]
+
+    def _offset_before(self, timestamp):
+        index = self.index()
+        if self._index_times is None:
+            self._index_times = [entry[0] for entry in index]
+        # records before an index record are never newer than it, but records at ``timestamp`` may precede the
+        # first index record at ``timestamp``
+        position = bisect.bisect_left(self._index_times, timestamp) - 1
+        if position < 0:
+            return _fileHeader.size
+        return index[position][1]
+
+
+def read_text_recording(path):
+    """
+    :param path: text recording as written by the sticks
+    :return: iterator over (kind, data) with the frames as ``bytes``, other lines with kind None
+    """
+    with open(path) as recording:
+        for line in recording:
+            line = line.rstrip("\n")
+            kind, _, data = line.partition(" ")
+            if kind in ("sent", "received"):
+                try:
+                    yield kind, bytes.fromhex(data)
+                    continue
+                except ValueError:
+                    pass
+            elif kind == "sending_command":
+                yield kind, data
+                continue
+            yield None, line
+
+
+def convert_text_to_binary(text_path, binary_path, interval=0.0):
+    """
+    :param interval: seconds between the timestamps given to the lines, text recordings have none
+    """
+    writer = BinaryRecordingWriter(binary_path, clock=lambda: 0.0)
+    for number, (kind, data) in enumerate(read_text_recording(text_path)):
+        writer.record(COMMENT if kind is None else kind, data, timestamp=number * interval)
+    writer.close()
+
+
+def convert_binary_to_text(binary_path, text_path):
+    with BinaryRecordingReader(binary_path) as reader, open(text_path, "w") as text:
+        for record in reader:
+            if record.kind is None:
+                text.write(record.data + "\n")
+            elif isinstance(record.data, bytes):
+                text.write("{} {}\n".format(record.kind, record.data.hex()))
+            else:
+                text.write("{} {}\n".format(record.kind, record.data))
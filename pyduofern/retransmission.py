@@ -0,0 +1,247 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+
+from .queues import SAFETY, frame_priority
+
+logger = logging.getLogger(__name__)
+
+
+def _key(frame):
+    # system code and device code, echoed by the acknowledgement
+    return bytes(frame[15:21])
+
+
+class _Transmission(object):
+    __slots__ = ('frame', 'key', 'retries', 'delay', 'deadline', 'done')
+
+    def __init__(self, frame, key, retries, delay, deadline):
+        self.frame = frame
+        self.key = key
+        self.retries = retries
+        self.delay = delay
+        self.deadline = deadline
+        self.done = False
+
+
+class RetransmissionEngine(object):
+    """
+    Keeps track of frames sent to the stick until they are acknowledged and decides when to resend them.
+
+    A sent frame is resent ``delay`` seconds later unless a frame starting with ``81`` carrying the same system and
+    device code arrived meanwhile, the delay grows by ``backoff`` with every retry up to ``max_delay``. Every delay is
+    stretched by a random share of up to ``jitter`` so that frames sent together are not resent together. After
+    ``retries`` retries the frame is given up and handed to ``give_up_callback``.
+
+    With ``max_in_flight`` set, no more than this many frames per device wait for their acknowledgement, further
+    frames for the device are held back until :meth:`pop_released` returns them. A ``stop`` is never held back and
+    cancels the frames still waiting or held back for the device, sending them after the ``stop`` would restart the
+    actor.
+
+    The engine does no I/O, the sticks ask it what to send: call :meth:`admit` before writing a new frame,
+    :meth:`sent` after writing it, :meth:`acknowledge` for received acknowledgements and :meth:`due` to get the
+    frames to resend. :meth:`next_deadline` tells when :meth:`due` has something to return.
+
+    Deadlines are kept in a heap, so :meth:`due` and :meth:`next_deadline` only look at frames which are due. Entries
+    of acknowledged frames stay in the heap until they surface or outnumber the live ones.
+    """
+
+    def __init__(self, retries=5, delay=2.0, backoff=1.5, max_delay=15.0, jitter=1.0, max_in_flight=None,
+                 give_up_callback=None, clock=time.monotonic, random=random.random):
+        """
+        :param retries: resends of a frame before giving up
+        :param delay: seconds to wait for the acknowledgement of a frame before resending it the first time
+        :param backoff: factor the delay grows by with every resend
+        :param max_delay: upper limit of the delay
+        :param jitter: every delay is stretched by a random factor between 1 and 1 + ``jitter``
+        :param max_in_flight: frames per device waiting for their acknowledgement, unlimited if None
+        :param give_up_callback: called with the frame when it was not acknowledged after all retries
+        :param clock: monotonic clock returning seconds
+        :param random: source of random numbers between 0 and 1
+        """
+        self.retries = retries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_in_flight = max_in_flight
+        self.give_up_callback = give_up_callback
+        self.clock = clock
+        self.random = random
+        # key -> transmissions waiting for acknowledgement, oldest first
+        self._in_flight = {}
+        # (deadline, sequence number, transmission), the sequence number keeps equal deadlines in order
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._live = 0
+        # key -> frames held back by max_in_flight
+        self._held = {}
+        self._released = []
+        self.acknowledged = 0
+        self.resent = 0
+        self.given_up = 0
+        self.cancelled = 0
+
+    def _deadline(self, now, delay):
+        return now + delay * (1 + self.jitter * self.random())
+
+    def admit(self, frame):
+        """
+        :param frame: new frame about to be written
+        :return: True if the frame may be written now, False if it is held back
+        """
+        if self.max_in_flight is None or frame_priority(frame) == SAFETY:
+            return True
+        key = _key(frame)
+        if len(self._in_flight.get(key, ())) < self.max_in_flight:
+            return True
+        self._held.setdefault(key, deque()).append(frame)
+        return False
+
+    def sent(self, frame):
+        """
+        Start waiting for the acknowledgement of a frame written for the first time.
+        """
+        if frame[0] == 0x81:
+            return
+        key = _key(frame)
+        if frame_priority(frame) == SAFETY:
+            self._cancel(key)
+        transmission = _Transmission(frame, key, self.retries, self.delay, self._deadline(self.clock(), self.delay))
+        self._in_flight.setdefault(key, deque()).append(transmission)
+        self._live += 1
+        self._schedule(transmission)
+
+    def _schedule(self, transmission):
+        heapq.heappush(self._deadlines, (transmission.deadline, next(self._sequence), transmission))
+
+    def _finish(self, transmission):
+        transmission.done = True
+        self._live -= 1
+        if len(self._deadlines) > 2 * self._live + 16:
+            self._deadlines = [entry for entry in self._deadlines if not entry[2].done]
+            heapq.heapify(self._deadlines)
+
+    def _cancel(self, key):
+        cancelled = self._in_flight.pop(key, ())
+        for transmission in cancelled:
+            self._finish(transmission)
+        self.cancelled += len(cancelled) + len(self._held.pop(key, ()))
+
+    def acknowledge(self, frame):
+        """
+        :param frame: received acknowledgement
+        :return: True if it acknowledged a frame waiting for it
+        """
+        key = _key(frame)
+        transmissions = self._in_flight.get(key)
+        if not transmissions:
+            return False
+        self._finish(transmissions.popleft())
+        if not transmissions:
+            del self._in_flight[key]
+        self.acknowledged += 1
+        self._release(key)
+        return True
+
+    def _release(self, key):
+        held = self._held.get(key)
+        if held is None:
+            return
+        free = len(held) if self.max_in_flight is None else self.max_in_flight - len(self._in_flight.get(key, ()))
+        while held and free > 0:
+            self._released.append(held.popleft())
+            free -= 1
+        if not held:
+            del self._held[key]
+
+    def pop_released(self):
+        """
+        :return: list of held back frames which may be written now. Queue them for writing again, :meth:`admit`
+         lets them pass.
+        """
+        released, self._released = self._released, []
+        return released
+
+    def due(self):
+        """
+        :return: list of frames to resend now, frames out of retries are given up
+        """
+        now = self.clock()
+        deadlines = self._deadlines
+        resend = []
+        while deadlines and deadlines[0][0] <= now:
+            transmission = heapq.heappop(deadlines)[2]
+            if transmission.done:
+                continue
+            if transmission.retries == 0:
+                transmissions = self._in_flight[transmission.key]
+                transmissions.remove(transmission)
+                if not transmissions:
+                    del self._in_flight[transmission.key]
+                self._finish(transmission)
+                self._give_up(transmission)
+                self._release(transmission.key)
+                continue
+            transmission.retries -= 1
+            transmission.delay = min(transmission.delay * self.backoff, self.max_delay)
+            transmission.deadline = self._deadline(now, transmission.delay)
+            self._schedule(transmission)
+            resend.append(transmission.frame)
+            self.resent += 1
+        return resend
+
+    def _give_up(self, transmission):
+        self.given_up += 1
+        logger.info("%s was never acknowledged, gave up after %s retries", bytes(transmission.frame).hex(),
+                    self.retries)
+        if self.give_up_callback is not None:
+            self.give_up_callback(transmission.frame)
+
+    def next_deadline(self):
+        """
+        :return: clock time at which :meth:`due` returns the next frame, None if no frame waits for acknowledgement
+        """
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][2].done:
+            heapq.heappop(deadlines)
+        return deadlines[0][0] if deadlines else None
+
+    def stats(self):
+        """
+        :return: dict with the number of frames ``in_flight`` and ``held`` and counters of frames ``acknowledged``,
+         ``resent``, ``given_up`` and ``cancelled``
+        """
+        return {'in_flight': len(self), 'held': sum(len(held) for held in self._held.values()),
+                'acknowledged': self.acknowledged, 'resent': self.resent, 'given_up': self.given_up,
+                'cancelled': self.cancelled}
+
+    def __len__(self):
+        return self._live
@@ -0,0 +1,311 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import heapq
+import itertools
+import logging
+import os
+import random
+import selectors
+import threading
+import time
+import tty
+
+from .framing import FRAME_LENGTH, FrameAssembler, commandStarts
+
+logger = logging.getLogger(__name__)
+
+# status frame format (byte 3 of 0fff0f frames) sent by the actors, keyed by the first two digits of their code
+actorFormats = {
+    "40": 0x21, "41": 0x21, "61": 0x21,
+    "43": 0x22, "46": 0x22, "71": 0x22,
+    "42": 0x23, "47": 0x23, "49": 0x23, "4b": 0x23, "4c": 0x23, "70": 0x23,
+    "4e": 0x24,
+}
+
+
+def _reply(head, frame):
+    """
+    :return: acknowledgement frame ``head`` (hex) carrying system and device code of ``frame``
+    """
+    reply = bytearray(FRAME_LENGTH)
+    reply[0:4] = bytes.fromhex(head)
+    reply[15:21] = frame[15:21]
+    return bytes(reply)
+
+
+class VirtualActor(object):
+    """
+    An actor answering commands and status requests of a :class:`VirtualStick`. Only the position (roller shutters)
+    or the level of each channel (switch actors) is modelled, all other readings stay zero.
+    """
+
+    def __init__(self, code, position=0, version=0x33):
+        """
+        :param code: device code as 6 hex digits, its first two digits select the status frame format
+        :param position: initial position or level of every channel
+        """
+        self.code = code.lower()
+        self.format = actorFormats.get(self.code[0:2], 0x23)
+        self.version = version
+        self.levels = {1: position, 2: position}
+
+    def apply(self, frame):
+        """
+        Carry out the command ``frame`` (a ``0D`` frame) on the actor.
+        """
+        channel = 2 if frame[1] == 2 else 1
+        command = frame[2:4]
+        if command == b"\x07\x01":
+            self.levels[channel] = 0
+        elif command == b"\x07\x03":
+            self.levels[channel] = 100
+        elif command == b"\x07\x07":
+            self.levels[channel] = min(frame[5], 100)
+        elif command == b"\x0e\x03":
+            self.levels[channel] = 100
+        elif command == b"\x0e\x02":
+            self.levels[channel] = 0
+        elif command == b"\x07\x1a":
+            self.levels[channel] = 0 if self.levels[channel] else 100
+
+    def status(self, destination=b"\xff\xff\xff"):
+        """
+        :param destination: bytes 18 to 20 of the frame, ``6f`` + system code when answering a status request
+        :return: the ``0fff0f`` status frame of the actor
+        """
+        frame = bytearray(FRAME_LENGTH)
+        frame[0:4] = bytes((0x0F, 0xFF, 0x0F, self.format))
+        if self.format == 0x22:
+            frame[10] = self.levels[2]
+        frame[11] = self.levels[1]
+        frame[12] = self.version
+        frame[15:18] = bytes.fromhex(self.code)
+        frame[18:21] = destination
+        frame[21] = 0x01
+        return bytes(frame)
+
+
+class VirtualStick(object):
+    """
+    Emulates a DuoFern USB stick with a fleet of :class:`VirtualActor` on a pseudo-terminal, so the sticks of this
+    package (or anything else talking to a serial port) can connect to :attr:`port` instead of real hardware.
+
+    The stick acknowledges every frame except acknowledgements, remembers the system code and the pairs set during
+    initialization, and relays status requests and commands to the actors. Actors answer after a random delay
+    between ``actor_delay[0]`` and ``actor_delay[1]`` seconds. Every radio transmission is lost with probability
+    ``loss``, a lost command is reported as missing acknowledgement (``810108aa``) after ``ack_timeout`` seconds,
+    like the stick does for commands to actors that are out of reach.
+    """
+
+    def __init__(self, actors=(), stick_delay=0.002, actor_delay=(0.02, 0.1), loss=0.0, ack_timeout=0.5, seed=None):
+        """
+        :param actors: :class:`VirtualActor` instances or device codes
+        :param stick_delay: seconds until the stick acknowledges a frame
+        :param seed: seed for delays and losses, to make runs repeatable
+        """
+        self.actors = {}
+        for actor in actors:
+            self.add_actor(actor)
+        self.stick_delay = stick_delay
+        self.actor_delay = actor_delay
+        self.loss = loss
+        self.ack_timeout = ack_timeout
+        self.random = random.Random(seed)
+        self.system_code = None
+        self.pairs = {}
+        self.initialized = False
+        self.received = []
+        self.counters = {'received': 0, 'sent': 0, 'commands': 0, 'status_requests': 0, 'lost': 0}
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._framing = FrameAssembler(starts=commandStarts)
+        self._lock = threading.Lock()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="duofern-simulator", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def add_actor(self, actor, **kwargs):
+        """
+        :param actor: :class:`VirtualActor` or device code, ``kwargs`` are passed to :class:`VirtualActor` for codes
+        :return: the actor
+        """
+        if isinstance(actor, str):
+            actor = VirtualActor(actor, **kwargs)
+        self.actors[actor.code] = actor
+        return actor
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        os.write(self._wakeup_write, b"\0")
+        self._thread.join()
+        for fd in (self._master, self._slave, self._wakeup_read, self._wakeup_write):
+            os.close(fd)
+
+    def emit(self, frame, delay=0):
+        """
+        Send ``frame`` (bytes or hex string) to the connected host after ``delay`` seconds, e.g. the status of an
+        actor that was moved by hand.
+        """
+        if isinstance(frame, str):
+            frame = bytes.fromhex(frame)
+        assert len(frame) == FRAME_LENGTH, "frames are {} bytes".format(FRAME_LENGTH)
+        with self._lock:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._sequence), frame))
+        os.write(self._wakeup_write, b"\0")
+
+    def stats(self):
+        """
+        :return: dict with the number of frames ``received`` and ``sent``, ``commands`` and ``status_requests``
+         relayed to the actors and radio transmissions ``lost``
+        """
+        return dict(self.counters)
+
+    def _transmitted(self):
+        if self.loss and self.random.random() < self.loss:
+            self.counters['lost'] += 1
+            return False
+        return True
+
+    def _actor_delay(self):
+        return self.random.uniform(*self.actor_delay)
+
+    def _handle(self, frame):
+        self.counters['received'] += 1
+        self.received.append(frame)
+        lead = frame[0]
+        if lead == 0x81:
+            # acknowledgement of a frame sent by the stick
+            return
+        if lead == 0x0D and frame[1] == 0xFF and frame[3] == 0x40:
+            self._status_request(frame)
+        elif lead == 0x0D:
+            self._command(frame)
+        else:
+            if lead == 0x0A:
+                self.system_code = frame[2:4].hex()
+            elif lead == 0x03:
+                self.pairs[frame[1]] = frame[2:5].hex()
+            elif lead == 0x10:
+                self.initialized = True
+            self.emit(_reply("81000000", frame), self.stick_delay)
+
+    def _status_request(self, frame):
+        self.counters['status_requests'] += 1
+        reply = bytearray(FRAME_LENGTH)
+        reply[0] = 0x81
+        reply[18:22] = frame[18:22]
+        self.emit(bytes(reply), self.stick_delay)
+        destination = bytes.fromhex("6f" + (self.system_code or "ffff"))
+        for actor in self.actors.values():
+            if self._transmitted():
+                self.emit(actor.status(destination), self.stick_delay + self._actor_delay())
+
+    def _command(self, frame):
+        self.counters['commands'] += 1
+        self.emit(_reply("810100bb", frame), self.stick_delay)
+        actor = self.actors.get(frame[18:21].hex())
+        if actor is None or not self._transmitted():
+            self.emit(_reply("810108aa", frame), self.stick_delay + self.ack_timeout)
+            return
+        actor.apply(frame)
+        delay = self.stick_delay + self._actor_delay()
+        self.emit(_reply("810003cc", frame), delay)
+        if self._transmitted():
+            self.emit(actor.status(), delay)
+
+    def _send_due(self):
+        """
+        :return: seconds until the next frame is due, None if none is scheduled
+        """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._timers:
+                    return None
+                if self._timers[0][0] > now:
+                    return self._timers[0][0] - now
+                frame = heapq.heappop(self._timers)[2]
+            os.write(self._master, frame)
+            self.counters['sent'] += 1
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._master, selectors.EVENT_READ)
+        selector.register(self._wakeup_read, selectors.EVENT_READ)
+        try:
+            while self._running:
+                for key, events in selector.select(self._send_due()):
+                    if key.fd == self._wakeup_read:
+                        os.read(self._wakeup_read, 512)
+                        continue
+                    try:
+                        data = os.read(self._master, 4096)
+                    except OSError:
+                        # nobody has the port open right now
+                        time.sleep(0.01)
+                        continue
+                    for frame in self._framing.feed(data):
+                        self._handle(bytes(frame))
+        finally:
+            selector.close()
+
+
+def main():  # pragma: no cover
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Emulate a DuoFern USB stick on a pseudo-terminal")
+    parser.add_argument("--actors", type=int, default=10, help="number of roller shutter actors")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of losing a radio transmission")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    actors = ["40{:04x}".format(number) for number in range(args.actors)]
+    with VirtualStick(actors, loss=args.loss, seed=args.seed) as stick:
+        print("virtual stick listening on {}".format(stick.port))
+        try:
+            while True:
+                time.sleep(60)
+                print(stick.stats())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,423 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+
+from collections.abc import MutableMapping
+
+_MISSING = object()
+
+# suffixes of the flat keys used by the dict view, e.g. "position_01"
+channelSuffixes = tuple("_{:02x}".format(channel) for channel in range(256))
+
+# readings whose name is not a valid attribute name
+_renamedReadings = {
+    "10minuteAlarm": "alarm10minute",
+    "2000cycleAlarm": "alarm2000cycle",
+}
+
+_attributeNames = {}
+
+
+def _slots(*keys):
+    """
+    :return: attribute names the readings ``keys`` are stored under, usable as ``__slots__``
+    """
+    attributes = []
+    for key in keys:
+        attribute = _renamedReadings.get(key, key.replace("-", "_"))
+        _attributeNames[key] = attribute
+        attributes.append(attribute)
+    return tuple(attributes)
+
+
+class Readings(object):
+    """
+    Readings of one device or channel. Readings known to the device family are stored in slots and can be accessed
+    as attributes (``readings.position``), anything else ends up in a small dict that is only created when needed.
+    Readings that were never set are missing, :meth:`get` returns the default for them.
+
+    After :meth:`store_status` the readings contained in the status frame are only decoded when they are first
+    accessed and then cached until a frame changing them arrives.
+    """
+    __slots__ = ('_extra', '_lazy') + _slots("state", "version", "manualMode", "timeAutomatic", "unpaired", "event",
+                                     "channelchan")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._attributes = _attributes_of(cls)
+
+    def __init__(self):
+        self._extra = None
+        self._lazy = None
+
+    def get(self, key, default=None):
+        attribute = self._attributes.get(key)
+        if attribute is None:
+            value = _MISSING if self._extra is None else self._extra.get(key, _MISSING)
+        else:
+            value = getattr(self, attribute, _MISSING)
+        if value is _MISSING:
+            if self._lazy is None:
+                return default
+            value = self._lazy.decode(key, self)
+            if value is _MISSING:
+                return default
+            self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self._lazy is not None:
+            self._lazy.override(key)
+
+    def _store(self, key, value):
+        attribute = self._attributes.get(key)
+        if attribute is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        else:
+            setattr(self, attribute, value)
+
+    def discard(self, key):
+        """
+        Remove a reading.
+
+        :return: True if the reading was present
+        """
+        attribute = self._attributes.get(key)
+        if attribute is None:
+            if self._extra is None or key not in self._extra:
+                return False
+            del self._extra[key]
+            return True
+        try:
+            delattr(self, attribute)
+        except AttributeError:
+            return False
+        return True
+
+    def clear(self):
+        for attribute in self._attributes.values():
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        self._extra = None
+        self._lazy = None
+
+    def store_status(self, frame, layout, report=False):
+        """
+        Store a status frame without decoding it. Cached readings the frame may have changed are dropped, everything
+        else is kept.
+
+        :param frame: the status frame as ``bytes``
+        :param layout: :class:`~pyduofern.duofern.StatusLayout` of the frame
+        :param report: if True the readings that were invalidated are decoded and compared to their old values
+        :return: dict of readings whose value changed if ``report`` is True, else None
+        """
+        lazy = self._lazy
+        if lazy is None:
+            invalidated = layout.keys
+        elif lazy.layout is not layout:
+            # keep readings of the previous format that the new one does not contain
+            for key in lazy.layout.keys:
+                self.get(key)
+            invalidated = layout.keys
+        else:
+            invalidated = layout.changed(lazy.frame, frame)
+            if lazy.overridden:
+                invalidated = lazy.overridden.union(invalidated)
+
+        old = {key: self.get(key, _MISSING) for key in invalidated} if report else None
+        for key in invalidated:
+            self.discard(key)
+        if lazy is None:
+            self._lazy = LazyStatus(frame, layout)
+        else:
+            lazy.frame = frame
+            lazy.layout = layout
+            lazy.overridden = None
+        if not report:
+            return None
+
+        changes = {}
+        for key, value in old.items():
+            new = self.get(key, _MISSING)
+            if new is not _MISSING and new != value:
+                changes[key] = new
+        return changes
+
+    def items(self):
+        """
+        :return: list of ``(key, value)`` tuples of all present readings
+        """
+        items = []
+        for key, attribute in self._attributes.items():
+            value = getattr(self, attribute, _MISSING)
+            if value is not _MISSING:
+                items.append((key, value))
+        if self._extra:
+            items.extend(self._extra.items())
+        if self._lazy is not None:
+            present = set(key for key, value in items)
+            for key in self._lazy.layout.keys:
+                if key not in present:
+                    value = self.get(key, _MISSING)
+                    if value is not _MISSING:
+                        items.append((key, value))
+        return items
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self.items())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, dict(self.items()))
+
+
+class LazyStatus(object):
+    """
+    The last status frame stored in a :class:`Readings` object.
+    """
+    __slots__ = ('frame', 'layout', 'overridden')
+
+    def __init__(self, frame, layout):
+        self.frame = frame
+        self.layout = layout
+        # readings from the frame that were set by other means since, they are refreshed by the next frame
+        self.overridden = None
+
+    def decode(self, key, readings):
+        getter = self.layout.getters.get(key)
+        if getter is None:
+            getter = self.layout.optional.get(key)
+            if getter is None or readings.get('blindsMode') != "on":
+                return _MISSING
+        return getter(self.frame, readings)
+
+    def override(self, key):
+        if key in self.layout.getters or key in self.layout.optional:
+            if self.overridden is None:
+                self.overridden = set()
+            self.overridden.add(key)
+
+
+def _attributes_of(cls):
+    slots = set()
+    for klass in cls.__mro__:
+        slots.update(getattr(klass, '__slots__', ()))
+    return {key: attribute for key, attribute in _attributeNames.items() if attribute in slots}
+
+
+Readings._attributes = _attributes_of(Readings)
+
+
+class ActorReadings(Readings):
+    """Readings shared by all actors reporting status frames"""
+    __slots__ = _slots("sunAutomatic", "sunMode", "dawnAutomatic", "duskAutomatic")
+
+
+class RollerShutterReadings(ActorReadings):
+    """RolloTron Standard/Comfort and Rohrmotor-Aktor (40, 41, 61)"""
+    __slots__ = _slots("position", "moving", "toggleUpDown", "sunPosition", "ventilatingMode", "ventilatingPosition")
+
+
+class TrollReadings(RollerShutterReadings):
+    """Troll Comfort/Basis, Rohrmotor and other blinds actors (42, 47, 49, 4b, 4c, 70)"""
+    __slots__ = _slots("reversal", "runningTime", "blindsMode", "rainAutomatic", "rainDirection", "rainMode",
+                       "windAutomatic", "windDirection", "windMode", "slatPosition", "defaultSlatPos",
+                       "slatRunTime", "tiltInSunPos", "tiltInVentPos", "tiltAfterMoveLevel", "tiltAfterStopDown",
+                       "motorDeadTime")
+
+
+class SX5Readings(RollerShutterReadings):
+    """SX5 garage door (4e)"""
+    __slots__ = _slots("reversal", "rainAutomatic", "rainDirection", "rainMode", "windAutomatic", "windDirection",
+                       "windMode", "10minuteAlarm", "2000cycleAlarm", "automaticClosing", "openSpeed", "backJump",
+                       "lightCurtain", "obstacle", "block")
+
+
+class SwitchReadings(ActorReadings):
+    """Universalaktor, Steckdosenaktor and Dimmer (43, 46, 48, 71)"""
+    __slots__ = _slots("level", "modeChange", "stairwellFunction", "stairwellTime", "runningTime",
+                       "intermediateMode", "intermediateValue", "saveIntermediateOnStop")
+
+
+class WeatherSensorReadings(Readings):
+    """Umweltsensor (69)"""
+    __slots__ = _slots("brightness", "sunDirection", "sunHeight", "temperature", "isRaining", "wind", "date", "time")
+
+
+class SmokeDetectorReadings(Readings):
+    """Rauchmelder (ab)"""
+    __slots__ = _slots("battery", "batteryLevel")
+
+
+# keyed by the first byte of the device code
+readingsByType = {
+    "40": RollerShutterReadings,
+    "41": RollerShutterReadings,
+    "61": RollerShutterReadings,
+    "42": TrollReadings,
+    "47": TrollReadings,
+    "49": TrollReadings,
+    "4b": TrollReadings,
+    "4c": TrollReadings,
+    "70": TrollReadings,
+    "4e": SX5Readings,
+    "43": SwitchReadings,
+    "46": SwitchReadings,
+    "48": SwitchReadings,
+    "71": SwitchReadings,
+    "69": WeatherSensorReadings,
+    "ab": SmokeDetectorReadings,
+}
+
+
+class DeviceState(MutableMapping):
+    """
+    State of one device: its name, the readings of the device itself and one :class:`Readings` object per channel.
+
+    For existing callers the state still behaves like the dict it used to be, with the keys ``name``, ``channels``
+    and one key per reading, suffixed with ``_xx`` (the channel as two hex digits) for per-channel readings.
+    """
+    __slots__ = ('name', 'code', 'lazy', 'readings', 'channels', '_channels', '_readings_class')
+
+    def __init__(self, code, name, readings_class=None, lazy=False):
+        """
+        :param code: six digit device code
+        :param name: device name
+        :param readings_class: :class:`Readings` subclass to use, by default chosen by the device type
+        :param lazy: store status frames of the device undecoded and decode readings on access
+        """
+        if readings_class is None:
+            readings_class = readingsByType.get(code[0:2].lower(), Readings)
+        self.code = code
+        self.name = name
+        self.lazy = lazy
+        self._readings_class = readings_class
+        self.readings = readings_class()
+        self.channels = {None}
+        self._channels = {}
+
+    def channel(self, channel):
+        """
+        :param channel: channel number or None for the device itself
+        :return: the :class:`Readings` of ``channel``, created if it does not exist yet
+        """
+        if channel is None:
+            return self.readings
+        try:
+            return self._channels[channel]
+        except KeyError:
+            readings = self._channels[channel] = self._readings_class()
+            self.channels.add(channelSuffixes[channel][1:])
+            return readings
+
+    def get_reading(self, key, channel=None, default=None):
+        if channel is None:
+            return self.readings.get(key, default)
+        readings = self._channels.get(channel)
+        if readings is None:
+            return default
+        return readings.get(key, default)
+
+    def set_reading(self, key, value, channel=None):
+        self.channel(channel).set(key, value)
+
+    def del_reading(self, key, channel=None):
+        """
+        :return: True if the reading was present
+        """
+        if channel is None:
+            return self.readings.discard(key)
+        readings = self._channels.get(channel)
+        return readings is not None and readings.discard(key)
+
+    def clear_readings(self):
+        self.readings.clear()
+        self._channels.clear()
+        self.channels = {None}
+
+    # dict view
+
+    @staticmethod
+    def _split(key):
+        if len(key) > 3 and key[-3] == "_":
+            try:
+                return key[:-3], int(key[-2:], 16)
+            except ValueError:
+                pass
+        return key, None
+
+    def __getitem__(self, key):
+        if key == 'name':
+            return self.name
+        if key == 'channels':
+            return self.channels
+        value = self.get_reading(*self._split(key), default=_MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key == 'name':
+            self.name = value
+        elif key == 'channels':
+            self.channels = value
+        else:
+            reading, channel = self._split(key)
+            self.set_reading(reading, value, channel)
+
+    def __delitem__(self, key):
+        if key in ('name', 'channels'):
+            raise KeyError("{} can not be removed".format(key))
+        if not self.del_reading(*self._split(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in ('name', 'channels'):
+            return True
+        return self.get_reading(*self._split(key), default=_MISSING) is not _MISSING
+
+    def __iter__(self):
+        keys = ['name', 'channels']
+        keys.extend(key for key, value in self.readings.items())
+        for channel, readings in self._channels.items():
+            suffix = channelSuffixes[channel]
+            keys.extend(key + suffix for key, value in readings.items())
+        return iter(keys)
+
+    def __len__(self):
+        return 2 + len(self.readings) + sum(len(readings) for readings in self._channels.values())
+
+    def __repr__(self):
+        return "{}({!r}, {})".format(type(self).__name__, self.code, dict(self))
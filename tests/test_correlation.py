@@ -0,0 +1,107 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import asyncio
+
+import pytest
+
+from pyduofern.correlation import ReplyCorrelator
+from pyduofern.exceptions import DuofernTimeoutException
+
+
+def status(device):
+    return bytes.fromhex("0fff0f21" + "00" * 7 + "28330000" + device + "ffffff01")
+
+
+def ack(device, kind="810003cc"):
+    return bytes.fromhex(kind + "00" * 11 + "6fffff" + device + "00")
+
+
+@pytest.mark.asyncio
+async def test_replies_are_matched_by_type_and_code(event_loop):
+    correlator = ReplyCorrelator()
+    first = correlator.expect("0fff0f", "409882")
+    second = correlator.expect("0fff0f", "4376C9")
+    acknowledged = correlator.expect("810003cc", "409882")
+
+    assert not correlator.match(status("400001"))
+    assert not correlator.match(ack("4376c9"))
+    assert correlator.match(status("4376c9"))
+    assert correlator.match(ack("409882"))
+    assert not first.done()
+    assert correlator.match(status("409882"))
+
+    assert await first == status("409882")
+    assert await second == status("4376c9")
+    assert await acknowledged == ack("409882")
+    assert len(correlator) == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_are_answered_in_order(event_loop):
+    correlator = ReplyCorrelator()
+    any_ack = [correlator.expect("81") for _ in range(3)]
+    command = correlator.expect("810003cc", "409882")
+
+    assert correlator.match(ack("409882"))
+    assert correlator.match(ack("000000", kind="81000000"))
+    assert command.done()
+    assert any_ack[0].done() and not any_ack[1].done()
+
+    any_ack[1].cancel()
+    await asyncio.sleep(0)
+    assert correlator.match(ack("000000", kind="81000000"))
+    assert any_ack[2].done()
+    assert len(correlator) == 0
+
+
+@pytest.mark.asyncio
+async def test_any_of_several_replies(event_loop):
+    correlator = ReplyCorrelator()
+    first = correlator.expect(("810003cc", "810108aa"), "409882")
+    second = correlator.expect(("810003cc", "810108aa"), "409882")
+
+    assert correlator.match(ack("409882", kind="810108aa"))
+    assert correlator.match(ack("409882"))
+    assert not correlator.match(ack("409882", kind="810108aa"))
+
+    assert await first == ack("409882", kind="810108aa")
+    assert await second == ack("409882")
+    assert len(correlator) == 0
+
+
+@pytest.mark.asyncio
+async def test_timeout(event_loop):
+    correlator = ReplyCorrelator()
+    slow = correlator.expect("81", timeout=0.01)
+    patient = correlator.expect("81", timeout=10)
+
+    with pytest.raises(DuofernTimeoutException):
+        await slow
+    assert len(correlator) == 1
+    correlator.cancel()
+    await asyncio.sleep(0)
+    assert patient.cancelled()
+    assert len(correlator) == 0
+    assert not correlator.match(ack("409882"))
@@ -0,0 +1,76 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+from pyduofern.dedupe import FrameDeduplicator
+from pyduofern.duofern import Duofern
+
+STATUS = bytes.fromhex("0fff0f210000000000000050000000409b21ffffff01")
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeats_within_window_are_dropped():
+    clock = Clock()
+    deduplicator = FrameDeduplicator(window=0.5, clock=clock)
+
+    assert not deduplicator.is_duplicate(STATUS)
+    clock.now += 0.3
+    assert deduplicator.is_duplicate(STATUS)
+    clock.now += 0.3
+    assert deduplicator.is_duplicate(STATUS)  # the window restarts with every repeat
+    assert not deduplicator.is_duplicate(STATUS[:-1] + b'\x02')
+    clock.now += 1
+    assert not deduplicator.is_duplicate(STATUS)
+
+    assert deduplicator.stats() == {'passed': 3, 'dropped': 2, 'tracked': 1}
+
+
+def test_parser_drops_repeats_before_callbacks():
+    changes = []
+    parser = Duofern(send_hook=lambda message: None, dedupe_window=1,
+                     changes_callback=lambda code, key, value: changes.append(key))
+    parser.deduplicator.clock = Clock()
+
+    parser.parse(STATUS)
+    count = len(changes)
+    assert parser.parse(STATUS) == parser.modules['by_code']['409b21'].name
+    assert len(changes) == count
+    assert parser.deduplicator.dropped == 1
+
+
+def test_parser_keeps_repeated_button_presses():
+    parser = Duofern(send_hook=lambda message: None, dedupe_window=1)
+    parser.deduplicator.clock = Clock()
+    parser.add_device("61aabb")
+    button = bytes.fromhex("0f01070d01000000000000000000ff61aabb00000001")
+
+    parser.parse(button)
+    parser.parse(button)
+    assert parser.deduplicator.stats() == {'passed': 0, 'dropped': 0, 'tracked': 0}
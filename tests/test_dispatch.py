@@ -0,0 +1,55 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+from pyduofern.dispatch import MessageDispatcher
+from pyduofern.duofern import Duofern
+
+
+def frame(hex_prefix):
+    return bytes.fromhex(hex_prefix.ljust(44, "0"))
+
+
+def test_most_specific_prefix_wins():
+    dispatcher = MessageDispatcher(default=lambda message: "default")
+    dispatcher.register("81", lambda message: "81")
+    dispatcher.register("810003cc", lambda message: "ack")
+    dispatcher.register(["0f..07", "0f..0e"], lambda message: "sensor")
+    dispatcher.register("0fff0f", lambda message: "status")
+
+    assert dispatcher.dispatch(frame("810003cc")) == "ack"
+    assert dispatcher.dispatch(frame("810108aa")) == "81"
+    assert dispatcher.dispatch(frame("0f01070d")) == "sensor"
+    assert dispatcher.dispatch(frame("0fff0e03")) == "sensor"
+    assert dispatcher.dispatch(frame("0fff0f21")) == "status"
+    assert dispatcher.dispatch(frame("0fff1323")) == "default"
+
+
+def test_register_handler_on_parser():
+    received = []
+    parser = Duofern(send_hook=lambda message: None)
+    parser.register_handler("0fff1122", lambda message, code: received.append((bytes(message[0:4]), code)))
+
+    parser.parse("0fff112200000000000000000000004098826fffff01")
+
+    assert received == [(b'\x0f\xff\x11\x22', "409882")]
@@ -0,0 +1,116 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import pytest
+
+from pyduofern.definitions import statusFormats
+from pyduofern.duofern import Duofern, capabilities, statusDecoders
+
+
+def make_parser():
+    return Duofern(send_hook=lambda message: None)
+
+
+def test_decoders_compiled_for_all_formats():
+    assert set(statusDecoders) == {int(format, 16) for format in statusFormats}
+
+
+def test_parse_rollotron_status():
+    parser = make_parser()
+    parser.parse("0fff0f210d08640000004134110005409b216fffff01")
+    state = parser.modules['by_code']['409b21']
+    assert state['position'] == 52
+    assert state['ventilatingPosition'] == 100
+    assert state['sunPosition'] == 65
+    assert state['timeAutomatic'] == "on"
+    assert state['manualMode'] == "off"
+    assert state['moving'] == "stop"
+    assert state['version'] == "11"
+
+
+@pytest.mark.parametrize(("blinds", "expected"), [("80", True), ("00", False)])
+def test_parse_troll_blinds_mode(blinds, expected):
+    parser = make_parser()
+    parser.parse("0fff0f23070801010708646433800042aabbffffff01")
+    parser.parse("0fff0f23c70801010708646433" + blinds + "0042aabbffffff01")
+    state = parser.modules['by_code']['42aabb']
+    assert state['state'] == "closed"
+    assert state['blindsMode'] == ("on" if expected else "off")
+    assert ('tiltInVentPos' in state) == expected
+    if expected:
+        assert state['slatRunTime'] == 0x07
+
+
+@pytest.mark.parametrize("convert", [str, bytes.fromhex, lambda frame: memoryview(bytearray.fromhex(frame))])
+def test_parse_accepts_bytes_and_hex(convert):
+    parser = make_parser()
+    assert parser.parse(convert("0fff0f210d08640000004134110005409b216fffff01")) == 0
+    assert parser.modules['by_code']['409b21']['position'] == 52
+
+
+def test_batched_callbacks_only_report_changes():
+    calls = []
+    parser = Duofern(send_hook=lambda message: None, changes_callback=lambda *args: calls.append(args),
+                     batch_changes=True)
+
+    parser.parse("0fff0f210d08640000004134110005409b216fffff01")
+    assert len(calls) == 1
+    code, changes = calls[0]
+    assert code == "409b21"
+    assert changes['position'] == 52
+    assert changes['moving'] == "stop"
+
+    parser.parse("0fff0f210d08640000004134110005409b216fffff01")
+    assert len(calls) == 1
+
+    parser.parse("0fff0f210d08640000004164110005409b216fffff01")
+    assert calls[1] == ("409b21", {'position': 100, 'state': "closed"})
+
+
+def test_capabilities():
+    parser = make_parser()
+    parser.add_device("42aabb")
+
+    assert capabilities("409b21")["position"] == "slider,0,1,100"
+    assert "slatPosition" not in parser.capabilities("42aabb")
+    parser.update_state("42aabb", "blindsMode", "on")
+    assert parser.capabilities("42aabb")["slatPosition"] == "slider,0,1,100"
+    assert capabilities("ffffff") == {}
+    with pytest.raises(TypeError):
+        capabilities("409b21")["position"] = ""
+
+
+def test_set_encodes_frames():
+    sent = []
+    parser = Duofern(send_hook=sent.append)
+    parser.system_code = "ffff"
+    parser.add_device("430001")
+
+    parser.set("430001", "on", channel=2)
+    parser.set("430001", "stairwellTime", 30)
+    parser.set("430001", "getStatus")
+
+    assert sent == [bytes.fromhex("0d020e0300000000000000000000006fffff43000100"),
+                    bytes.fromhex("0d0108140000012c000000000000006fffff43000100"),
+                    bytes.fromhex("0dff0f40000000000000000000000000000043000101")]
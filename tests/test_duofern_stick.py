@@ -23,6 +23,8 @@
 #   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 
 import logging
+import os
+import select
 import tempfile
 import time
 import unittest
@@ -48,6 +50,7 @@ def read_mock(data):
 class TestInitialize(unittest.TestCase):
     def setUp(self):
         self.df = reload(df)
+        self.addCleanup(setattr, self.df.serial, "Serial", self.df.serial.Serial)
         self.df.serial.Serial = Mock()
         # self.df.serial.tools.list_ports.comports()[0].device = "detecteddevice"
         # self.df.serial.Serial.write = write_mock
@@ -74,3 +77,49 @@ class TestInitialize(unittest.TestCase):
         test.serial_connection = Mock()
         test.serial_connection.read = read_mock
         test._initialize()
+
+    def test_stop_closes_recording(self):
+        test = self.df.DuofernStickThreaded(serial_port="bla", system_code="ffff", config_file_json=tempfile.mktemp(),
+                                            recording=True)
+        test.serial_connection = Mock()
+        test.recorder.record("received", bytes.fromhex(self.df.duoACK))
+        test.stop()
+        with open(test.record_filename) as recording:
+            self.assertEqual(recording.read(), "received {}\n".format(self.df.duoACK))
+
+
+@unittest.skipUnless(os.name == "posix", "needs a pty")
+class TestEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.stick = df.DuofernStickThreaded(serial_port=os.ttyname(slave), system_code="ffff",
+                                             config_file_json=tempfile.mktemp())
+        os.close(slave)
+        self.stick._initialize = lambda: None
+        # no status requests, nothing else wakes the reader loop during a test
+        self.stick.updating_interval = 3600
+        self.stick.duofern_parser.add_device("409882")
+        self.stick.start()
+
+    def tearDown(self):
+        self.stick.stop()
+        self.stick.join(1)
+        os.close(self.master)
+
+    def read_frame(self, timeout=1):
+        data = b""
+        while len(data) < 22 and select.select([self.master], [], [], timeout)[0]:
+            data += os.read(self.master, 22 - len(data))
+        return data
+
+    def test_command_is_written_at_once(self):
+        # once the loop acknowledged a frame it waits in the selector again, with nothing due for an hour
+        os.write(self.master, bytes.fromhex("0fff0f210d0864000000413f110000409882ffffff01"))
+        self.assertEqual(self.read_frame(), bytes.fromhex(df.duoACK))
+        self.stick.command("409882", "up")
+        self.assertEqual(self.read_frame()[0:4], bytes.fromhex("0d010701"))
+
+    def test_received_frame_is_acknowledged(self):
+        os.write(self.master, bytes.fromhex("0fff0f210d0864000000413f110000409882ffffff01"))
+        self.assertEqual(self.read_frame(), bytes.fromhex(df.duoACK))
+        self.assertEqual(self.stick.duofern_parser.get_state("409882", "position"), 63)
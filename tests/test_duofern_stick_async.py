@@ -24,8 +24,10 @@
 
 import asyncio
 import logging
+import math
 import os
 import tempfile
+from unittest.mock import Mock
 
 import pytest
 
@@ -33,6 +35,8 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 from pyduofern import DuofernStickAsync, DuofernException, duoACK  # import DuofernStickAsync
+from pyduofern.exceptions import DuofernTimeoutException
+from pyduofern.retransmission import RetransmissionEngine
 
 
 # from pyduofern.duofern_stick import DuofernStickAsync
@@ -77,6 +81,7 @@ async def test_init_against_mocked_stick(event_loop,recording, configfile):
 
     proto.available.add_done_callback(cb)
     await init_
+    proto.close()
 
 
 def test_raises_when_run_without_code():
@@ -101,3 +106,318 @@ def test_raises_when_run_with_long_code():
 
     with pytest.raises(AssertionError):
         proto = DuofernStickAsync(config_file_json=tempfile.mktemp(), recording=False, system_code="faaaf")
+
+
+@pytest.mark.asyncio
+async def test_command_is_queued_with_system_code(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False)
+    proto.duofern_parser.add_device("409882")
+
+    proto.command("409882", "position", 63)
+
+    assert proto.write_queue.get_nowait() == bytes.fromhex("0D010707003f0000000000000000006fffff40988200")
+    proto.close()
+
+
+class TimingTransportMock:
+    def __init__(self, loop):
+        self.loop = loop
+        self.unittesting = True
+        self.writes = []
+        self.frames = []
+
+    def write(self, data):
+        self.writes.append(self.loop.time())
+        self.frames.append(bytes(data))
+
+
+class ControlledClock:
+    """Stands in for the clock of ``loop``, timers only fire once :meth:`advance` moved the time past them."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.now = float(math.ceil(loop.time()))
+        loop.time = lambda: self.now
+
+    async def advance(self, seconds):
+        self.now += seconds
+        await self.run_ready()
+
+    async def run_ready(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+    def restore(self):
+        del self.loop.time
+
+
+@pytest.mark.asyncio
+async def test_send_paces_only_consecutive_frames(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False,
+                              message_interval_millis=250)
+    proto.transport = TimingTransportMock(event_loop)
+    clock = ControlledClock(event_loop)
+    proto._ready.set()
+    await clock.advance(1)
+
+    proto.send(duoACK)
+    proto.send("0D01070100000000000000000000006fffff40988200")
+    await clock.run_ready()
+    # the line was idle, the first frame is written without waiting
+    assert len(proto.transport.frames) == 1
+    await clock.advance(0.125)
+    assert len(proto.transport.frames) == 1
+    await clock.advance(0.125)
+    assert len(proto.transport.frames) == 2
+    clock.restore()
+    proto.close()
+
+
+class ActorTransportMock:
+    def __init__(self, proto, reply):
+        self.proto = proto
+        self.unittesting = True
+        self.reply = reply
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if data[0] == 0x0D and self.reply is not None:
+            device = bytes(data[15:21]).hex()
+            self.proto.data_received(bytes.fromhex("810100bb" + "00" * 11 + device + "00"))
+            self.proto.data_received(bytes.fromhex(self.reply + "00" * 11 + device + "00"))
+
+
+async def mocked_actor(event_loop, reply, **kwargs):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False,
+                              message_interval_millis=0, **kwargs)
+    proto.duofern_parser.add_device("4376c9")
+    proto.transport = ActorTransportMock(proto, reply)
+    proto.initialized = True
+    proto._ready.set()
+    return proto
+
+
+@pytest.mark.parametrize(("reply", "status"), [("810003cc", "ack"), ("810108aa", "nack")])
+@pytest.mark.asyncio
+async def test_command_result(event_loop, reply, status):
+    proto = await mocked_actor(event_loop, reply)
+
+    result = await asyncio.wait_for(proto.command("4376c9", "on", channel=1), 1)
+    proto.close()
+
+    assert result.code == "4376c9"
+    assert result.status == status
+    assert result.acknowledged == (status == "ack")
+    assert 0 <= result.latency < 1
+    assert result.frame[0:4] == bytes.fromhex(reply)
+
+
+@pytest.mark.asyncio
+async def test_command_superseded_by_stop(event_loop):
+    proto = await mocked_actor(event_loop, "810003cc")
+    proto.duofern_parser.add_device("409882")
+
+    moving = proto.command("409882", "position", 30)
+    stopping = proto.command("409882", "stop")
+    result = await asyncio.wait_for(moving, 0.5)
+    assert result.status == "superseded"
+    assert (await asyncio.wait_for(stopping, 1)).status == "ack"
+    proto.close()
+
+    assert [frame[2:4] for frame in proto.transport.written if frame[0] == 0x0D] == [bytes.fromhex("0702")]
+
+
+@pytest.mark.asyncio
+async def test_command_result_timeout(event_loop):
+    proto = await mocked_actor(event_loop, None)
+    proto.command_timeout = 0.1
+
+    result = await asyncio.wait_for(proto.command("4376c9", "on", channel=1), 1)
+    proto.close()
+
+    assert result.status == "timeout"
+    assert result.latency is None
+    assert len(proto.correlator) == 0
+
+
+@pytest.mark.asyncio
+async def test_reconnect_after_close(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=True,
+                              message_interval_millis=0)
+    proto.initialized = True
+    lost, reconnected = TimingTransportMock(event_loop), TimingTransportMock(event_loop)
+    lost.serial = reconnected.serial = Mock()
+    proto.connection_made(lost)
+    proto.connection_lost(None)
+
+    proto.send("0D01070100000000000000000000006fffff40988200")
+    await asyncio.sleep(0.01)
+    proto.connection_made(reconnected)
+    while not reconnected.frames:
+        await asyncio.sleep(0.01)
+    proto.close()
+
+    assert lost.frames == []
+    assert reconnected.frames[0] == bytes.fromhex("0D01070100000000000000000000006fffff40988200")
+
+
+@pytest.mark.asyncio
+async def test_command_result_on_close(event_loop):
+    proto = await mocked_actor(event_loop, None)
+
+    waiting = proto.command("4376c9", "on", channel=1)
+    await asyncio.sleep(0.01)
+    proto.close()
+
+    result = await asyncio.wait_for(waiting, 1)
+    assert result.status == "cancelled"
+    assert len(proto.correlator) == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesced_commands_share_result(event_loop):
+    proto = await mocked_actor(event_loop, "810003cc")
+    proto._ready.clear()
+
+    first = proto.command("4376c9", "level", 10, channel=1)
+    second = proto.command("4376c9", "level", 20, channel=1)
+    proto._ready.set()
+
+    results = await asyncio.wait_for(asyncio.gather(first, second), 1)
+    proto.close()
+
+    assert [result.status for result in results] == ["ack", "ack"]
+
+
+@pytest.mark.asyncio
+async def test_unacknowledged_command_is_resent(event_loop):
+    given_up = []
+    proto = await mocked_actor(event_loop, None, retransmission=RetransmissionEngine(
+        retries=1, delay=0.05, jitter=0, give_up_callback=given_up.append))
+
+    proto.command("4376c9", "on", channel=1)
+    while not given_up:
+        await asyncio.sleep(0.01)
+    proto.close()
+
+    commands = [frame for frame in proto.transport.written if frame[0] == 0x0D]
+    assert commands == [bytes.fromhex("0d010e0300000000000000000000006fffff4376c900")] * 2
+    assert given_up == commands[:1]
+
+
+@pytest.mark.asyncio
+async def test_acknowledgements_bypass_write_queue(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False,
+                              message_interval_millis=100)
+    proto.transport = TimingTransportMock(event_loop)
+    proto.initialized = True
+    proto._ready.set()
+    await asyncio.sleep(0.01)
+
+    ack = bytes.fromhex(duoACK)
+    proto.data_received(bytes.fromhex("0fff0f210d0864000000413f110000409882ffffff01"))
+    assert proto.transport.frames == [ack]
+    proto.send("0D01070100000000000000000000006fffff40988200")
+    proto.data_received(bytes.fromhex("0fff0f210d0864000000413f110000409b21ffffff01"))
+    assert proto.write_queue.qsize() == 1
+    while len(proto.transport.writes) < 3:
+        await asyncio.sleep(0.01)
+    proto.close()
+
+    # the second acknowledgement overtook the frame queued before it
+    assert proto.transport.frames[0:2] == [ack, ack]
+    assert proto.transport.frames[2][0] == 0x0D
+    first, second, third = proto.transport.writes
+    assert second - first >= 0.1
+    assert third - second >= 0.1
+
+
+class ForgetfulTransportMock:
+    """Answers every frame except acknowledgements, ignoring the first ``forget`` of them."""
+
+    def __init__(self, proto, forget):
+        self.proto = proto
+        self.unittesting = True
+        self.forget = forget
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(bytes(data))
+        if data[0] == 0x81:
+            return
+        if self.forget:
+            self.forget -= 1
+            return
+        asyncio.get_event_loop().call_soon(self.proto.data_received, bytearray.fromhex(duoACK))
+
+
+@pytest.mark.asyncio
+async def test_handshake_resends_unanswered_steps(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False,
+                              message_interval_millis=0)
+    proto.config['devices'] = [{'id': "40{:04x}".format(number), 'name': str(number)} for number in range(20)]
+    proto.transport = ForgetfulTransportMock(proto, forget=3)
+    proto.handshake_timeout = 0.05
+    proto._ready.set()
+
+    await asyncio.wait_for(proto.handshake(), 2)
+
+    assert proto.initialized
+    assert proto.transport.frames.count(bytes.fromhex("01" + "00" * 21)) == 4
+    assert len([frame for frame in proto.transport.frames if frame[0] == 0x03]) == 20
+    assert set(proto.handshake_timings) == {"settle", "init", "pairs", "status", "total"}
+    assert "400013" in proto.duofern_parser.modules['by_code']
+    proto.close()
+
+
+@pytest.mark.asyncio
+async def test_handshake_gives_up(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False,
+                              message_interval_millis=0)
+    proto.transport = ForgetfulTransportMock(proto, forget=100)
+    proto.handshake_timeout = 0.01
+    proto.handshake_retries = 2
+    proto._ready.set()
+
+    with pytest.raises(DuofernTimeoutException):
+        await proto.handshake()
+    with pytest.raises(DuofernTimeoutException):
+        await proto.available
+    assert len(proto.transport.frames) == 3
+    assert not proto.initialized
+    proto.close()
+
+
+@pytest.mark.asyncio
+async def test_frames_received_while_waiting_for_a_reply_reach_the_parser(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False)
+    proto.transport = TimingTransportMock(event_loop)
+    proto.duofern_parser.add_device("409882")
+    proto.initialized = True
+    proto._ready.set()
+
+    reply = proto.request(bytes.fromhex("0DFF0F400000000000000000000000000000FFFFFF01"))
+    proto.data_received(bytearray.fromhex("0fff0f210d0864000000413f110000409882ffffff01"))
+    assert not reply.done()
+    assert proto.duofern_parser.modules['by_code']['409882'].get_reading('position', default=None) == 63
+
+    proto.data_received(bytearray.fromhex("810000000000000000000000000000000000ffffff01"))
+    assert await reply == bytes.fromhex("810000000000000000000000000000000000ffffff01")
+    proto.close()
+
+
+@pytest.mark.asyncio
+async def test_frames_received_during_handshake_are_dropped(event_loop):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False)
+    proto.transport = TimingTransportMock(event_loop)
+    proto.duofern_parser.add_device("409882")
+    proto._ready.set()
+
+    reply = proto.request(bytes.fromhex("0DFF0F400000000000000000000000000000FFFFFF01"))
+    proto.data_received(bytearray.fromhex("0fff0f210d0864000000413f110000409882ffffff01"))
+    assert proto.duofern_parser.modules['by_code']['409882'].get_reading('position', default=None) is None
+
+    proto.data_received(bytearray.fromhex("810000000000000000000000000000000000ffffff01"))
+    assert await reply == bytes.fromhex("810000000000000000000000000000000000ffffff01")
+    proto.close()
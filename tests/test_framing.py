@@ -0,0 +1,172 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import tempfile
+
+import pytest
+
+from pyduofern import DuofernStickAsync
+from pyduofern.framing import FrameAssembler
+
+
+def feed(assembler, data):
+    return [bytes(frame) for frame in assembler.feed(data)]
+
+STATUS = bytes.fromhex("0fff0f210d0864000000413f110000409882ffffff01")
+ACK = bytes.fromhex("810003cc00000000000000000000006fffff40988200")
+PAIRED = bytes.fromhex("06020100000000000000000000000540988200000000")
+WEATHER = bytes.fromhex("0f011322020301000a8000400bb8000000690001ff01")
+BUTTON = bytes.fromhex("0f01070d01000000000000000000ff61aabb00000001")
+
+
+def test_frames_split_across_reads():
+    assembler = FrameAssembler()
+    stream = STATUS + ACK + PAIRED
+    frames = []
+    for start in range(0, len(stream), 5):
+        frames += feed(assembler, stream[start:start + 5])
+    assert frames == [STATUS, ACK, PAIRED]
+    assert assembler.stats() == {'frames': 3, 'dropped': 0, 'resyncs': 0}
+
+
+def test_lost_leading_byte():
+    assembler = FrameAssembler()
+    assert feed(assembler, STATUS[1:] + ACK + STATUS) == [ACK, STATUS]
+    assert assembler.stats() == {'frames': 2, 'dropped': 21, 'resyncs': 1}
+
+
+def test_lost_byte_inside_frame():
+    assembler = FrameAssembler()
+    broken = STATUS[:10] + STATUS[11:]
+    assert feed(assembler, broken + ACK + PAIRED) == [ACK, PAIRED]
+    assert assembler.dropped == 21
+
+
+@pytest.mark.parametrize("chunk", [1, 5, 7, 22, 40])
+@pytest.mark.parametrize("lost", [1, 3, 5])
+def test_resync_with_chunked_reads(chunk, lost):
+    frames = [STATUS if number % 2 else ACK for number in range(30)]
+    stream = b"".join(frames)
+    stream = stream[:224] + stream[224 + lost:]
+    assembler = FrameAssembler()
+    received = []
+    for start in range(0, len(stream), chunk):
+        received += feed(assembler, stream[start:start + chunk])
+
+    assert received[0:10] == frames[0:10]
+    assert received[-18:] == frames[-18:]
+    # the frame which lost bytes comes out broken if a read ended right after it, the frames after it never do
+    assert all(frame in (STATUS, ACK) for frame in received[11:])
+    assert assembler.resyncs == 1
+
+
+@pytest.mark.parametrize("lost", [1, 3, 5])
+def test_resync_with_reads_on_frame_boundaries(lost):
+    frames = [STATUS if number % 2 else ACK for number in range(10)]
+    frames[4] = frames[4][:3] + frames[4][3 + lost:]
+    assembler = FrameAssembler()
+    received = []
+    for frame in frames:
+        received += feed(assembler, frame)
+
+    assert received[0:4] == frames[0:4]
+    assert received[-4:] == frames[-4:]
+    assert all(frame in (STATUS, ACK) for frame in received)
+
+
+def test_garbage_between_frames():
+    assembler = FrameAssembler()
+    assert feed(assembler, STATUS + b"\x00\xff\x42" + ACK + STATUS) == [STATUS, ACK, STATUS]
+    assert assembler.dropped == 3
+
+
+def test_frame_after_resync_waits_for_the_next_one():
+    assembler = FrameAssembler()
+    assert feed(assembler, STATUS + b"\x00\xff\x42" + ACK) == [STATUS]
+    assert feed(assembler, STATUS[0:2]) == [ACK]
+    assert feed(assembler, STATUS[2:]) == [STATUS]
+
+
+def test_broken_next_frame_keeps_current_one():
+    assembler = FrameAssembler()
+    assert feed(assembler, STATUS + ACK[1:] + PAIRED + ACK) == [STATUS, PAIRED, ACK]
+
+
+def test_discard_partial():
+    assembler = FrameAssembler()
+    assert feed(assembler, STATUS[:7]) == []
+    assembler.discard_partial()
+    assert feed(assembler, ACK) == [ACK]
+    assert assembler.dropped == 7
+
+
+def test_frames_are_views_into_a_fixed_buffer():
+    assembler = FrameAssembler(capacity=50)
+    frames = []
+    for _ in range(10):
+        for frame in assembler.feed(STATUS[:11]):
+            frames.append(frame == STATUS)
+        for frame in assembler.feed(STATUS[11:] + ACK[:3]):
+            assert isinstance(frame, memoryview)
+            frames.append(frame == STATUS)
+        for frame in assembler.feed(ACK[3:]):
+            frames.append(frame == ACK)
+    assert frames == [True] * 20
+    assert len(assembler) == 0
+
+
+def test_data_larger_than_buffer():
+    assembler = FrameAssembler(capacity=30)
+    assert feed(assembler, (STATUS + ACK) * 5) == [STATUS, ACK] * 5
+
+
+@pytest.mark.parametrize("frame", [WEATHER, BUTTON])
+def test_weather_and_button_frames(frame):
+    assembler = FrameAssembler()
+    assert feed(assembler, frame) == [frame]
+    assert feed(assembler, STATUS[1:] + frame + ACK) == [frame, ACK]
+    assert assembler.resyncs == 1
+
+
+class TransportMock:
+    unittesting = True
+
+    def write(self, data):
+        pass
+
+
+@pytest.mark.parametrize("frame", [WEATHER, BUTTON])
+@pytest.mark.asyncio
+async def test_weather_and_button_frames_reach_the_parser(event_loop, frame):
+    proto = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False)
+    proto.transport = TransportMock()
+    proto.initialized = True
+    received = []
+    proto.process_message = lambda message: received.append(bytes(message))
+
+    proto.data_received(frame)
+    proto.close()
+
+    assert received == [frame]
+    assert proto.framing.dropped == 0
@@ -0,0 +1,156 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import asyncio
+
+import pytest
+
+from pyduofern.duofern import Duofern
+from pyduofern.queues import AsyncCoalescingQueue, CoalescingBuffer, CoalescingQueue, CONFIG, POLL, SAFETY, USER, \
+    frame_priority
+
+
+def command(*args, **kwargs):
+    sent = []
+    parser = Duofern(send_hook=sent.append)
+    for code in ("409b21", "430001"):
+        parser.add_device(code)
+    parser.set(*args, **kwargs)
+    return sent[0]
+
+
+def drain(buffer):
+    frames = []
+    while len(buffer):
+        frames.append(buffer.get())
+    return frames
+
+
+def test_value_commands_coalesce():
+    buffer = CoalescingBuffer()
+    buffer.put(command("409b21", "position", 10))
+    buffer.put(command("430001", "position", 10))
+    buffer.put(command("409b21", "sunPosition", 10))
+    buffer.put(command("409b21", "position", 20))
+    buffer.put(command("409b21", "position", 30))
+
+    assert drain(buffer) == [command("409b21", "position", 30), command("430001", "position", 10),
+                             command("409b21", "sunPosition", 10)]
+    assert buffer.coalesced == 2
+
+
+def test_channels_are_separate():
+    buffer = CoalescingBuffer()
+    buffer.put(command("430001", "level", 10, channel=1))
+    buffer.put(command("430001", "level", 20, channel=2))
+    assert len(buffer) == 2
+
+
+def test_up_is_a_barrier():
+    buffer = CoalescingBuffer()
+    buffer.put(command("409b21", "position", 10))
+    buffer.put(command("409b21", "up"))
+    buffer.put(command("409b21", "position", 20))
+    buffer.put(command("409b21", "position", 30))
+
+    assert drain(buffer) == [command("409b21", "position", 10), command("409b21", "up"),
+                             command("409b21", "position", 30)]
+
+
+def test_stop_supersedes_pending_commands():
+    superseded = []
+    buffer = CoalescingBuffer(superseded_callback=superseded.append)
+    buffer.put(command("409b21", "position", 10))
+    buffer.put(command("430001", "on"))
+    buffer.put(command("409b21", "stop"))
+    buffer.put(command("409b21", "position", 20))
+
+    assert drain(buffer) == [command("409b21", "stop"), command("430001", "on"), command("409b21", "position", 20)]
+    assert buffer.superseded == 1
+    assert superseded == [command("409b21", "position", 10)]
+
+
+def test_frame_priority():
+    assert frame_priority(command("409b21", "stop")) == SAFETY
+    assert frame_priority(bytes.fromhex("81000000000000000000000000000000000000000000")) == SAFETY
+    assert frame_priority(command("409b21", "down")) == USER
+    assert frame_priority(command("430001", "off")) == USER
+    assert frame_priority(command("409b21", "sunAutomatic", "on")) == CONFIG
+    assert frame_priority(command("409b21", "remotePair")) == CONFIG
+    assert frame_priority(command("409b21", "getStatus")) == POLL
+
+
+def test_priority_order_and_stats():
+    buffer = CoalescingBuffer()
+    buffer.put(command("409b21", "getStatus"))
+    buffer.put(command("409b21", "sunAutomatic", "on"))
+    buffer.put(command("409b21", "down"))
+    buffer.put(command("430001", "stop"))
+
+    assert buffer.depth(USER) == 1
+    assert drain(buffer) == [command("430001", "stop"), command("409b21", "down"),
+                             command("409b21", "sunAutomatic", "on"), command("409b21", "getStatus")]
+    stats = buffer.stats()
+    assert stats["poll"] == {"depth": 0, "max_depth": 1, "enqueued": 1, "sent": 1}
+
+
+def test_polls_are_not_starved():
+    buffer = CoalescingBuffer(starvation_limit=2)
+    buffer.put(command("409b21", "getStatus"))
+    frames = []
+    for _ in range(3):
+        buffer.put(command("409b21", "down"))
+        frames.append(buffer.get())
+    assert frames[2] == command("409b21", "getStatus")
+
+
+def test_sent_frame_is_not_replaced():
+    buffer = CoalescingBuffer()
+    buffer.put(command("409b21", "position", 10))
+    assert buffer.get() == command("409b21", "position", 10)
+    buffer.put(command("409b21", "position", 20))
+    assert len(buffer) == 1
+
+
+def test_threaded_queue():
+    write_queue = CoalescingQueue()
+    write_queue.put_nowait("81000000000000000000000000000000000000000000")
+    write_queue.put_nowait(command("409b21", "position", 10))
+    write_queue.put_nowait(command("409b21", "position", 20))
+
+    assert write_queue.qsize() == 2
+    assert write_queue.get(block=False) == "81000000000000000000000000000000000000000000"
+    assert write_queue.get(block=False) == command("409b21", "position", 20)
+    assert write_queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_async_queue():
+    write_queue = AsyncCoalescingQueue()
+    write_queue.put_nowait(command("409b21", "position", 10))
+    write_queue.put_nowait(command("409b21", "position", 20))
+
+    assert write_queue.qsize() == 1
+    assert await asyncio.wait_for(write_queue.get(), 1) == command("409b21", "position", 20)
+    assert write_queue.empty()
@@ -0,0 +1,158 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import os
+import tempfile
+from unittest.mock import patch
+
+from pyduofern.recording import BinaryRecordingReader, BinaryRecordingWriter, Record, RecordingSink, \
+    convert_binary_to_text, convert_text_to_binary
+
+FRAME = bytes.fromhex("0fff0f210d0864000000413f110000409882ffffff01")
+
+
+def test_lines_are_written_in_background():
+    filename = tempfile.mktemp()
+    sink = RecordingSink(filename, flush_interval=10)
+    sink.record("received", memoryview(FRAME))
+    sink.record("sending_command", "('409882', 'up') {}")
+    assert sink.flush(5)
+    with open(filename) as recording:
+        assert recording.read() == "received {}\nsending_command ('409882', 'up') {{}}\n".format(FRAME.hex())
+    sink.close()
+
+
+def test_close_flushes():
+    filename = tempfile.mktemp()
+    sink = RecordingSink(filename, flush_interval=10)
+    for _ in range(3):
+        sink.record("sent", FRAME)
+    sink.close()
+    sink.record("sent", FRAME)
+    with open(filename) as recording:
+        assert len(recording.readlines()) == 3
+
+
+def test_close_unregisters_exit_hook():
+    with patch("pyduofern.recording.atexit") as hooks:
+        sink = RecordingSink(tempfile.mktemp())
+        hooks.register.assert_called_once_with(sink.close)
+        sink.close()
+        sink.close()
+    hooks.unregister.assert_called_once_with(sink.close)
+
+
+def test_rotation_by_size():
+    filename = tempfile.mktemp()
+    sink = RecordingSink(filename, max_bytes=100, backup_count=2, flush_interval=10)
+    for _ in range(4):
+        sink.record("sent", FRAME)
+        sink.record("sent", FRAME)
+        sink.flush(5)
+    sink.close()
+    assert os.path.exists(filename + ".1")
+    assert os.path.exists(filename + ".2")
+    assert not os.path.exists(filename + ".3")
+    with open(filename) as recording:
+        assert len(recording.readlines()) == 2
+
+
+def test_rotation_by_age():
+    now = [0]
+    filename = tempfile.mktemp()
+    sink = RecordingSink(filename, max_age=60, flush_interval=10, clock=lambda: now[0])
+    sink.record("sent", FRAME)
+    sink.flush(5)
+    now[0] = 61
+    sink.record("received", FRAME)
+    sink.close()
+    with open(filename + ".1") as recording:
+        assert recording.read().startswith("sent")
+    with open(filename) as recording:
+        assert recording.read().startswith("received")
+
+
+def write_binary(filename, count, close=True):
+    writer = BinaryRecordingWriter(filename, index_interval=10)
+    for number in range(count):
+        writer.record("received" if number % 2 else "sent", FRAME, timestamp=float(number))
+    writer.record("sending_command", "('409882', 'up') {}", timestamp=float(count))
+    if close:
+        writer.close()
+    else:
+        writer.flush()
+    return writer
+
+
+def test_binary_recording():
+    filename = tempfile.mktemp()
+    write_binary(filename, 100)
+    with BinaryRecordingReader(filename) as reader:
+        records = list(reader)
+        assert len(records) == 101
+        assert records[1] == Record(1.0, "received", FRAME)
+        assert records[-1] == Record(100.0, "sending_command", "('409882', 'up') {}")
+        assert [offset for timestamp, offset in reader.index()][0:1] == [24]
+        assert len(reader.index()) == 11
+        assert [record.timestamp for record in reader.records(start=42.5)][0:2] == [43.0, 44.0]
+    assert os.path.getsize(filename) < 101 * 35 + 11 * 27 + 40
+
+
+def test_binary_recording_without_footer():
+    filename = tempfile.mktemp()
+    write_binary(filename, 30, close=False)
+    with BinaryRecordingReader(filename) as reader:
+        assert len(reader.index()) == 4
+        assert next(reader.records(start=25)).timestamp == 25.0
+
+
+def test_seek_to_repeated_timestamps():
+    filename = tempfile.mktemp()
+    writer = BinaryRecordingWriter(filename, index_interval=4)
+    for number in range(10):
+        writer.record("received", FRAME, timestamp=1.0 if number < 2 else 5.0)
+    writer.close()
+    with BinaryRecordingReader(filename) as reader:
+        assert len(list(reader.records(start=5.0))) == 8
+        assert len(list(reader.records(start=0.0))) == 10
+        assert list(reader.records(start=5.5)) == []
+
+
+def test_convert_replay():
+    replay = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'replaydata', 'duofern_record_80op8dbi')
+    binary = tempfile.mktemp()
+    text = tempfile.mktemp()
+    convert_text_to_binary(replay, binary, interval=0.1)
+    convert_binary_to_text(binary, text)
+    with open(replay) as original, open(text) as converted:
+        assert converted.read() == original.read().lower()
+
+
+def test_sink_binary_format():
+    filename = tempfile.mktemp()
+    sink = RecordingSink(filename, format="binary", clock=lambda: 5.0)
+    sink.record("received", FRAME)
+    sink.close()
+    with BinaryRecordingReader(filename) as reader:
+        assert list(reader) == [Record(5.0, "received", FRAME)]
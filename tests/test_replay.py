@@ -176,4 +176,4 @@ async def test_init_against_mocked_stick(event_loop, replayfile):
     await feedback_loop()
     proto.transport.receiveloop.cancel()
 
-    proto.send_loop.cancel()
+    proto.close()
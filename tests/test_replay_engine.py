@@ -0,0 +1,95 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+from pyduofern.duofern import Duofern
+from pyduofern.duofern_stick import DuofernStickAsync
+from pyduofern.recording import Record
+from pyduofern.replay import Replay, load_records
+
+REPLAY = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'replaydata', 'duofern_record_1578298202.5071442')
+STATUS = bytes.fromhex("0fff0f2207080101070800643300004376c9ffffff01")
+
+
+def parser(*codes):
+    duofern = Duofern(send_hook=lambda frame: None)
+    duofern.system_code = "ffff"
+    for code in codes:
+        duofern.add_device(code)
+    return duofern
+
+
+def test_replay_into_parser():
+    duofern = parser()
+    report = Replay.from_file(REPLAY).run(duofern)
+
+    assert report.errors == []
+    assert report.mismatches == []
+    assert report.commands == 4
+    assert report.sent == 4
+    assert report.frames == len([record for record in load_records(REPLAY) if record.kind == "received"])
+    assert report.frames_per_second > 0
+    assert "4376c9" in duofern.modules['by_code']
+
+
+def test_mismatch_is_reported():
+    records = [Record(0, "sending_command", "('4376c9', 'on') {'channel': 1}"),
+               Record(0, "sent", bytes.fromhex("0D010E0200000000000000000000006fffff4376c900"))]
+    report = Replay(records).run(parser("4376c9"))
+
+    assert report.mismatches == [(1, bytes.fromhex("0D010E0200000000000000000000006fffff4376c900"),
+                                  bytes.fromhex("0D010E0300000000000000000000006fffff4376c900"))]
+
+
+def test_missing_frame_is_reported():
+    records = [Record(0, "sending_command", "('4376c9', 'on') {'channel': 1}"), Record(0, "received", STATUS)]
+    report = Replay(records).run(parser("4376c9"))
+
+    assert report.mismatches == [(0, None, bytes.fromhex("0D010E0300000000000000000000006fffff4376c900"))]
+
+
+def test_accelerated_playback():
+    records = [Record(timestamp, "received", STATUS) for timestamp in (10.0, 10.5, 11.0)]
+    start = time.monotonic()
+    report = Replay(records, speed=10).run(parser())
+
+    assert 0.1 <= time.monotonic() - start < 0.5
+    assert report.frames == 3
+
+
+@pytest.mark.asyncio
+async def test_replay_into_async_stick(event_loop):
+    stick = DuofernStickAsync(event_loop, system_code="ffff", config_file_json=tempfile.mktemp(), recording=False)
+    report = await Replay.from_file(REPLAY, speed=100).run_async(stick)
+    stick.close()
+
+    assert report.errors == []
+    assert report.mismatches == []
+    assert stick.write_queue.empty()
@@ -0,0 +1,117 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+from pyduofern.retransmission import RetransmissionEngine
+
+
+def frame(device, command="0701"):
+    return bytes.fromhex("0d01" + command + "00" * 11 + "6fffff" + device + "00")
+
+
+def ack(device):
+    return bytes.fromhex("810003cc" + "00" * 11 + "6fffff" + device + "00")
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def engine(**kwargs):
+    clock = Clock()
+    return RetransmissionEngine(clock=clock, random=lambda: 0.5, **kwargs), clock
+
+
+def test_acknowledged_frame_is_not_resent():
+    retransmission, clock = engine()
+    retransmission.sent(frame("409882"))
+    assert retransmission.acknowledge(ack("409882"))
+    assert not retransmission.acknowledge(ack("409882"))
+    clock.now = 100
+    assert retransmission.due() == []
+    assert len(retransmission) == 0
+
+
+def test_backoff_and_give_up():
+    given_up = []
+    retransmission, clock = engine(retries=2, delay=2, backoff=2, jitter=0.5, give_up_callback=given_up.append)
+    retransmission.sent(frame("409882"))
+    assert retransmission.next_deadline() == 2.5
+
+    clock.now = 2.4
+    assert retransmission.due() == []
+    clock.now = 2.5
+    assert retransmission.due() == [frame("409882")]
+    assert retransmission.next_deadline() == 2.5 + 5
+    clock.now = 7.5
+    assert retransmission.due() == [frame("409882")]
+    clock.now = 100
+    assert retransmission.due() == []
+    assert given_up == [frame("409882")]
+    assert retransmission.stats() == {'in_flight': 0, 'held': 0, 'acknowledged': 0, 'resent': 2, 'given_up': 1,
+                                      'cancelled': 0}
+
+
+def test_in_flight_limit_per_device():
+    retransmission, clock = engine(max_in_flight=1)
+    assert retransmission.admit(frame("409882"))
+    retransmission.sent(frame("409882"))
+    assert retransmission.admit(frame("409b21"))
+    assert not retransmission.admit(frame("409882", "0703"))
+    assert retransmission.pop_released() == []
+
+    retransmission.acknowledge(ack("409882"))
+    assert retransmission.pop_released() == [frame("409882", "0703")]
+    assert retransmission.admit(frame("409882", "0703"))
+
+
+def test_stop_cancels_waiting_frames():
+    retransmission, clock = engine(max_in_flight=1)
+    retransmission.sent(frame("409882", "0703"))
+    assert not retransmission.admit(frame("409882", "0701"))
+    assert retransmission.admit(frame("409882", "0702"))
+    retransmission.sent(frame("409882", "0702"))
+
+    clock.now = 100
+    assert retransmission.due() == [frame("409882", "0702")]
+    assert retransmission.pop_released() == []
+    assert retransmission.cancelled == 2
+
+
+def test_due_frames_in_deadline_order():
+    retransmission, clock = engine(retries=1, jitter=0)
+    retransmission.sent(frame("409882"))
+    clock.now = 1
+    retransmission.sent(frame("409b21"))
+    retransmission.sent(frame("408e94"))
+    retransmission.acknowledge(ack("409b21"))
+
+    assert retransmission.next_deadline() == 2
+    clock.now = 3
+    assert retransmission.due() == [frame("409882"), frame("408e94")]
+    assert retransmission.next_deadline() == 3 + 3
+    assert len(retransmission) == 2
@@ -0,0 +1,121 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import pytest
+
+from pyduofern.duofern_stick import DuofernStickAsync, DuofernStickThreaded
+from pyduofern.simulator import VirtualActor, VirtualStick
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs a pty")
+
+
+def config_file(*codes):
+    filename = tempfile.mktemp()
+    with open(filename, "w") as config:
+        json.dump({'devices': [{'id': code, 'name': code} for code in codes]}, config)
+    return filename
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_actor_status_frames():
+    assert VirtualActor("409882", position=40).status() == \
+           bytes.fromhex("0fff0f210000000000000028330000409882ffffff01")
+    actor = VirtualActor("4376c9")
+    actor.apply(bytes.fromhex("0D020E0300000000000000000000006fffff4376c900"))
+    assert actor.status()[3] == 0x22
+    assert actor.levels == {1: 0, 2: 100}
+
+
+def test_threaded_stick():
+    with VirtualStick(["409882", "4376c9"], seed=1) as virtual:
+        stick = DuofernStickThreaded(serial_port=virtual.port, system_code="ffff",
+                                     config_file_json=config_file("409882", "4376c9"), recording=False)
+        stick.updating_interval = 0
+        stick.start()
+        try:
+            assert wait_for(lambda: virtual.initialized)
+            assert virtual.system_code == "ffff"
+            assert virtual.pairs == {0: "409882", 1: "4376c9"}
+
+            states = stick.duofern_parser.modules['by_code']
+            assert wait_for(lambda: states['409882'].get_reading('position', default=None) == 0)
+            stick.command("409882", "down")
+            assert wait_for(lambda: states['409882'].get_reading('position', default=None) == 100)
+        finally:
+            stick.stop()
+            stick.join(1)
+        assert virtual.stats()['commands'] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_stick(event_loop):
+    import serial_asyncio
+
+    fleet = ["409882"] + ["40{:04x}".format(number) for number in range(50)]
+    virtual = VirtualStick(fleet, ack_timeout=0.1, seed=1)
+    virtual.start()
+    try:
+        transport, stick = await serial_asyncio.create_serial_connection(
+            event_loop, lambda: DuofernStickAsync(event_loop, system_code="ffff", config_file_json=config_file(*fleet),
+                                                  recording=False, message_interval_millis=5),
+            virtual.port, baudrate=115200)
+        await asyncio.wait_for(stick.handshake(), 5)
+        assert len(virtual.pairs) == 51
+        assert set(stick.handshake_timings) == {"settle", "init", "pairs", "status", "total"}
+        assert len([frame for frame in virtual.received if frame[0] == 0x03]) == 51
+
+        result = await asyncio.wait_for(stick.command("409882", "position", 30), 2)
+        assert result.status == "ack"
+        assert virtual.actors["409882"].levels[1] == 30
+
+        stick.duofern_parser.add_device("420001")
+        result = await asyncio.wait_for(stick.command("420001", "up"), 2)
+        assert result.status == "nack"
+
+        stick.close()
+        transport.close()
+    finally:
+        virtual.stop()
+
+
+def test_loss():
+    with VirtualStick(["409882"], loss=1.0, ack_timeout=0.05, seed=1) as virtual:
+        with open(virtual.port, "r+b", buffering=0) as port:
+            port.write(bytes.fromhex("0D01070300000000000000000000006fffff40988200"))
+            replies = port.read(22) + port.read(22)
+    assert replies[0:4] == bytes.fromhex("810100bb")
+    assert replies[22:26] == bytes.fromhex("810108aa")
+    assert virtual.stats()['lost'] == 1
@@ -0,0 +1,129 @@
+# coding=utf-8
+#   python interface for dufoern usb stick
+#   Copyright (C) 2017 Paul Görgen
+#   Rough python re-write of the FHEM duofern modules by telekatz, also licensed under GPLv2
+#   This re-write contains only negligible amounts of original code
+#   apart from some comments to facilitate translation of the not-yet
+#   translated parts of the original software. Modification dates are
+#   documented as submits to the git repository of this code, currently
+#   maintained at https://github.com/gluap/pyduofern.git
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+import pytest
+
+from pyduofern.duofern import Duofern
+from pyduofern.state import DeviceState, Readings, RollerShutterReadings, SX5Readings, TrollReadings
+
+
+def test_family_selected_by_code():
+    assert type(DeviceState("409b21", 0).readings) is RollerShutterReadings
+    assert type(DeviceState("4b0001", 0).readings) is TrollReadings
+    assert type(DeviceState("4E0001", 0).readings) is SX5Readings
+    assert type(DeviceState("730001", 0).readings) is Readings
+
+
+def test_readings_use_slots():
+    readings = RollerShutterReadings()
+    readings.set("position", 42)
+    readings.set("somethingNew", 1)
+    assert readings.position == 42
+    assert readings.get("somethingNew") == 1
+    assert not hasattr(readings, "__dict__")
+
+    sx5 = SX5Readings()
+    sx5.set("10minuteAlarm", "on")
+    assert sx5.alarm10minute == "on"
+
+
+def test_dict_view():
+    state = DeviceState("409b21", "kitchen")
+    state.set_reading("position", 10)
+    state.set_reading("position", 20, channel=1)
+
+    assert state['name'] == "kitchen"
+    assert state['channels'] == {None, "01"}
+    assert state['position'] == 10
+    assert state['position_01'] == 20
+    assert state.channel(1).position == 20
+    assert "moving" not in state
+    assert set(state) == {'name', 'channels', 'position', 'position_01'}
+
+    state['moving_01'] = "up"
+    assert state.get_reading("moving", 1) == "up"
+    del state['position']
+    assert "position" not in state
+    with pytest.raises(KeyError):
+        del state['position']
+    with pytest.raises(KeyError):
+        state['position']
+
+    state.clear_readings()
+    assert dict(state) == {'name': "kitchen", 'channels': {None}}
+
+
+def test_set_reads_channel_state():
+    sent = []
+    parser = Duofern(send_hook=sent.append)
+    parser.add_device("430001")
+    parser.update_state("430001", "position", 50, channel=2)
+
+    parser.set("430001", "up", channel=2)
+    assert parser.get_state("430001", "moving", channel=2) == "up"
+    assert parser.get_state("430001", "moving") is None
+
+    parser.set("430001", "clear")
+    assert parser.get_state("430001", "position", channel=2) is None
+
+
+def status_frame(position, ventilating=0x10, code="409b21"):
+    return bytes.fromhex("0fff0f21") + bytes((0, 0, ventilating, 0, 0, 0, 0, position, 0x20, 0, 0)) + \
+        bytes.fromhex(code + "ffffff01")
+
+
+def test_lazy_status_decoded_on_access():
+    parser = Duofern(send_hook=lambda message: None, lazy_status=True)
+    parser.parse(status_frame(100))
+    readings = parser.modules['by_code']['409b21'].readings
+
+    assert not hasattr(readings, "position")
+    assert parser.get_state("409b21", "state") == "closed"
+    assert readings.position == 100
+    assert not hasattr(readings, "ventilatingPosition")
+
+    parser.parse(status_frame(40))
+    assert not hasattr(readings, "position")
+    assert parser.get_state("409b21", "position") == 40
+    assert parser.modules['by_code']['409b21']['ventilatingPosition'] == 0x10
+
+
+def test_lazy_status_reports_changes_only():
+    changes = []
+    parser = Duofern(send_hook=lambda message: None, lazy_status=True, batch_changes=True,
+                     changes_callback=lambda code, changed: changes.append(changed))
+    parser.parse(status_frame(100))
+    assert changes[-1]['position'] == 100
+    changes.clear()
+
+    parser.parse(status_frame(100))
+    assert changes == []
+
+    parser.parse(status_frame(100, ventilating=0x20))
+    assert changes == [{'ventilatingPosition': 0x20}]
+
+    parser.set("409b21", "up")
+    assert parser.get_state("409b21", "moving") == "up"
+    parser.parse(status_frame(100, ventilating=0x20))
+    assert parser.get_state("409b21", "moving") == "stop"